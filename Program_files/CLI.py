@@ -1,10 +1,14 @@
 import cmd
+import os
+import re
 import time
 from CustomStyle import CustomStyle
 from mo_sql_parsing import parse
 from prompt_toolkit.lexers import PygmentsLexer
 from executor import execute_query
-from create_database import Database
+from insert_parser import parse_insert_values
+from prepared_statement import PreparedStatement, parse_arguments
+from create_database import CATALOG_FILE, Database
 from prettytable import PrettyTable
 from prompt_toolkit import PromptSession, HTML
 from prompt_toolkit.styles import Style, style_from_pygments_cls
@@ -18,6 +22,11 @@ from rich.markup import escape
 bright_green_style = "#00FF00"  # Bright green color
 deep_red_style = "#FF0000"  # Deep red color
 
+# every database is stored in a directory of its own under this directory
+DATABASES_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, "Databases"
+)
+
 
 class DatabaseCLI(cmd.Cmd):
     prompt = "(base-cli)$ "
@@ -39,6 +48,7 @@ class DatabaseCLI(cmd.Cmd):
             "Print_Tables",
             "Print_Schemas",
             "List_Databases",
+            "Cache_Stats",
             "SQL_command",
             "clear",
             "help",
@@ -50,6 +60,20 @@ class DatabaseCLI(cmd.Cmd):
             "DROP",
             "GROUP",
             "BY",
+            "INDEX",
+            "ON",
+            "SAVE",
+            "RESTORE",
+            "TO",
+            "PREPARE",
+            "EXECUTE",
+            "DEALLOCATE",
+            "MATERIALIZED",
+            "VIEW",
+            "AS",
+            "BEGIN",
+            "COMMIT",
+            "ROLLBACK",
         ]
         self.completer = WordCompleter(
             self.commands, ignore_case=True, match_middle=False
@@ -61,7 +85,7 @@ class DatabaseCLI(cmd.Cmd):
             style=style_from_pygments_cls(CustomStyle),
         )
         self.prompt_style = Style.from_dict({"prompt": "ansiblue"})
-        self.databases = {}
+        self.databases = self.open_Databases()
         self.current_database = None  # Current database in use
 
     def update_AutoComplete(self, table_nm, add_or_remove):
@@ -106,6 +130,24 @@ class DatabaseCLI(cmd.Cmd):
                 continue
             except EOFError:
                 break
+        self.close_Databases()
+
+    def open_Databases(self):
+        # reopen the databases saved by previous sessions, their tables are not read
+        # until they are used
+        databases = {}
+        if not os.path.isdir(DATABASES_DIRECTORY):
+            return databases
+        for database_name in sorted(os.listdir(DATABASES_DIRECTORY)):
+            directory = os.path.join(DATABASES_DIRECTORY, database_name)
+            if os.path.exists(os.path.join(directory, CATALOG_FILE)):
+                databases[database_name] = Database(directory)
+        return databases
+
+    def close_Databases(self):
+        # write the changes that are not saved yet
+        for database in self.databases.values():
+            database.close()
 
     def databases_exist(self):
         return bool(self.databases)
@@ -123,16 +165,24 @@ class DatabaseCLI(cmd.Cmd):
             if command.startswith("create database"):
                 database_name = line.split()[2]
                 self.create_Database(database_name)
+            elif command.startswith("save database"):
+                self.save_Database(line)
+            elif command.startswith("restore database"):
+                self.restore_Database(line)
             elif command.startswith("use"):
                 database_name = line.split()[1]
                 self.use_Database(database_name)
+            elif re.match(r"create\s+materialized\s+view\b", command):
+                self.create_View(line)
+            elif re.match(r"drop\s+materialized\s+view\b", command):
+                view_name = line.split()[3].rstrip(";")
+                self.drop_View(view_name)
             elif command.startswith("create table"):
                 self.create_Table(line)
             elif command.startswith("load data"):
                 self.load_Data(line)
             elif command.startswith("insert into"):
-                parsed_command = parse(line)
-                self.insert_into(parsed_command)
+                self.insert_into(line)
             elif command.startswith("delete from"):
                 parsed_command = parse(line)
                 self.delete_from(parsed_command)
@@ -142,6 +192,26 @@ class DatabaseCLI(cmd.Cmd):
             elif command.startswith("drop table"):
                 parsed_command = parse(line)
                 self.drop_Table(parsed_command)
+            elif command.startswith("create index"):
+                parsed_command = parse(line)
+                self.create_Index(parsed_command)
+            elif command.startswith("drop index"):
+                parsed_command = parse(line)
+                self.drop_Index(parsed_command)
+            elif command.startswith("prepare"):
+                self.prepare_Statement(line)
+            elif command.startswith("execute"):
+                self.execute_Statement(line)
+            elif command.startswith("deallocate"):
+                self.deallocate_Statement(line)
+            elif re.fullmatch(
+                r"(begin(\s+transaction|\s+work)?|start\s+transaction)\s*;?", command
+            ):
+                self.begin_Transaction()
+            elif re.fullmatch(r"commit(\s+transaction|\s+work)?\s*;?", command):
+                self.commit_Transaction()
+            elif re.fullmatch(r"rollback(\s+transaction|\s+work)?\s*;?", command):
+                self.rollback_Transaction()
             elif command.startswith("exit"):
                 self.do_Exit()
             else:
@@ -176,30 +246,32 @@ class DatabaseCLI(cmd.Cmd):
         else:
             return super().onecmd(line)
 
-    def insert_into(self, parsed_command):
+    def insert_into(self, line):
         if self.current_database is None:
             self.console.print("No database selected.", style=deep_red_style)
             return
 
         try:
-            table_name = parsed_command.get("insert")
-            values = parsed_command.get(
-                "query",
-            )
-
-            # Assuming values is a list of tuples or a single tuple
-            if not values:
-                self.console.print(
-                    "No values provided for insertion", style=deep_red_style
-                )
-                return
-
-            # Call the insert method of the current database
-            self.current_database.insert(table_name, values)
-            self.console.print(
-                f"Data inserted into table {table_name} successfully.",
-                style=bright_green_style,
-            )
+            # a VALUES list of literals, e.g. a batch of thousands of rows, is read without
+            # the SQL parser, any other INSERT statement is parsed
+            values = parse_insert_values(line)
+            if values is not None:
+                table_name, columns, rows = values
+                message = self.current_database.insert_rows(table_name, rows, columns)
+            else:
+                parsed_command = parse(line)
+                table_name = parsed_command.get("insert")
+                query = parsed_command.get("query", parsed_command.get("values"))
+                if not query:
+                    self.console.print(
+                        "No values provided for insertion", style=deep_red_style
+                    )
+                    return
+                columns = parsed_command.get("columns")
+                if isinstance(columns, str):
+                    columns = [columns]
+                message = self.current_database.insert(table_name, query, columns)
+            self.console.print(f"{message}", style=bright_green_style)
 
         except Exception as e:
             self.console.print(
@@ -291,7 +363,9 @@ class DatabaseCLI(cmd.Cmd):
                 style=deep_red_style,
             )
         else:
-            self.databases[database_name] = Database()
+            self.databases[database_name] = Database(
+                os.path.join(DATABASES_DIRECTORY, database_name)
+            )
             self.current_database = self.databases[database_name]
             self.prompt = f"({database_name}-cli)> "
             self.console.print(
@@ -299,6 +373,58 @@ class DatabaseCLI(cmd.Cmd):
                 style=bright_green_style,
             )
 
+    def save_Database(self, arg):
+        """Save a database to a snapshot file: SAVE DATABASE <database_name> TO <path>"""
+        parts = arg.split()
+        if (
+            len(parts) != 5
+            or parts[0].lower() + parts[1].lower() != "savedatabase"
+            or parts[3].lower() != "to"
+        ):
+            self.console.print(f"Invalid command: {arg}", style=deep_red_style)
+            return
+        database_name, path = parts[2], parts[4]
+        if database_name not in self.databases:
+            self.console.print(
+                f"No database found with the name '{database_name}'.",
+                style=deep_red_style,
+            )
+            return
+        self.databases[database_name].save_snapshot(path)
+        self.console.print(
+            f"Database '{database_name}' saved to {path}.", style=bright_green_style
+        )
+
+    def restore_Database(self, arg):
+        """Create a database from a snapshot file: RESTORE DATABASE <database_name> FROM <path>"""
+        parts = arg.split()
+        if (
+            len(parts) != 5
+            or parts[0].lower() + parts[1].lower() != "restoredatabase"
+            or parts[3].lower() != "from"
+        ):
+            self.console.print(f"Invalid command: {arg}", style=deep_red_style)
+            return
+        database_name, path = parts[2], parts[4]
+        if database_name in self.databases:
+            self.console.print(
+                f"A database with the name '{database_name}' already exists.",
+                style=deep_red_style,
+            )
+            return
+        database = Database.restore_snapshot(
+            path, os.path.join(DATABASES_DIRECTORY, database_name)
+        )
+        self.databases[database_name] = database
+        self.current_database = database
+        for table_name in database.tables:
+            self.update_AutoComplete(table_name, "add")
+        self.prompt = f"({database_name}-cli)> "
+        self.console.print(
+            f"Database '{database_name}' restored from {path}.",
+            style=bright_green_style,
+        )
+
     def use_Database(self, database_name):
         """Switch to an existing database: USE database_name;"""
 
@@ -358,8 +484,35 @@ class DatabaseCLI(cmd.Cmd):
         except Exception as e:
             self.console.print(f"An error occurred: {e}", style=deep_red_style)
 
+    def create_View(self, arg):
+        """Create a materialized view: CREATE MATERIALIZED VIEW <view_name> AS SELECT ... GROUP BY ..."""
+        if self.current_database is None:
+            self.console.print("No database in use.", style=deep_red_style)
+            return
+        match = re.fullmatch(
+            r"\s*create\s+materialized\s+view\s+(\w+)\s+as\s+(.+?)\s*;?\s*",
+            arg,
+            re.I | re.S,
+        )
+        if match is None:
+            self.console.print(f"Invalid command: {arg}", style=deep_red_style)
+            return
+        view_name, query = match.groups()
+        try:
+            self.current_database.create_materialized_view(view_name, query)
+            self.update_AutoComplete(view_name, "add")
+            self.console.print(
+                f"Materialized view {view_name} created successfully.",
+                style=bright_green_style,
+            )
+        except Exception as e:
+            self.console.print(
+                f"An error occurred while trying to create view {view_name}: {e}",
+                style=deep_red_style,
+            )
+
     def load_Data(self, arg):
-        """Load data into a table from a CSV file: LOAD DATA <table_name> <csv_file_path>"""
+        """Load data into a table from a CSV file: LOAD DATA <table_name> <csv_file_path> [PARALLEL <processes>]"""
         if self.current_database is None:
             self.console.print(
                 "No database in use. Try creating one first", style=deep_red_style
@@ -376,34 +529,27 @@ class DatabaseCLI(cmd.Cmd):
             arg = input()
         try:
             parts = arg.split()
-            if len(parts) == 4:
-                part1, part2, table_name, csv_path = parts
-                if part1.lower() + part2.lower() != "loaddata":
-                    self.console.print(f"Invalid command: {arg}", style=deep_red_style)
-                    return
-                if table_name not in self.current_database.tables:
-                    self.console.print(
-                        f"Table {table_name} does not exist.", style=deep_red_style
-                    )
-                    return
-                self.current_database.load_from_csv(table_name, csv_path)
+            if len(parts) > 2 and parts[0].lower() + parts[1].lower() == "loaddata":
+                parts = parts[2:]
+            # parse and convert the file in this many processes
+            parallel = 1
+            if len(parts) == 4 and parts[2].lower() == "parallel":
+                parallel = int(parts[3])
+                parts = parts[:2]
+            if len(parts) != 2:
+                self.console.print(f"Invalid command: {arg}", style=deep_red_style)
+                return
+            table_name, csv_path = parts
+            if table_name not in self.current_database.tables:
                 self.console.print(
-                    f"Data loaded into table {table_name} from {csv_path}.",
-                    style=bright_green_style,
+                    f"Table {table_name} does not exist.", style=deep_red_style
                 )
-            else:
-                if len(parts) == 2:
-                    table_name, csv_path = parts
-                    if table_name not in self.current_database.tables:
-                        self.console.print(
-                            f"Table {table_name} does not exist.", style=deep_red_style
-                        )
-                        return
-                    self.current_database.load_from_csv(table_name, csv_path)
-                    self.console.print(
-                        f"Data loaded into table {table_name} from {csv_path}.",
-                        style=bright_green_style,
-                    )
+                return
+            self.current_database.load_from_csv(table_name, csv_path, parallel)
+            self.console.print(
+                f"Data loaded into table {table_name} from {csv_path}.",
+                style=bright_green_style,
+            )
         except ValueError as e:
             self.console.print(f"An error occurred: {e}", style=deep_red_style)
 
@@ -419,6 +565,12 @@ class DatabaseCLI(cmd.Cmd):
                     f"Table {table_name} does not exist.", style=deep_red_style
                 )
                 return
+            if table_name in self.current_database.views:
+                self.console.print(
+                    f"{table_name} is a materialized view, drop it with DROP MATERIALIZED VIEW.",
+                    style=deep_red_style,
+                )
+                return
 
             confirmation_msg = HTML(
                 f"Are you sure you want to drop table <ansired>{table_name}</ansired>? (y/n)\n"
@@ -445,6 +597,91 @@ class DatabaseCLI(cmd.Cmd):
                 style=deep_red_style,
             )
 
+    def drop_View(self, view_name):
+        """Drop a materialized view: DROP MATERIALIZED VIEW <view_name>"""
+        if self.current_database is None:
+            self.console.print("No database in use.", style=deep_red_style)
+            return
+
+        try:
+            if view_name not in self.current_database.views:
+                self.console.print(
+                    f"Materialized view {view_name} does not exist.",
+                    style=deep_red_style,
+                )
+                return
+
+            confirmation_msg = HTML(
+                f"Are you sure you want to drop materialized view <ansired>{view_name}</ansired>? (y/n)\n"
+            )
+            answer = self.session.prompt(confirmation_msg)
+
+            if answer.lower() == "y":
+                self.update_AutoComplete(view_name, "remove")
+                self.current_database.drop_materialized_view(view_name)
+                self.console.print(
+                    f"Materialized view {view_name} dropped successfully.",
+                    style=bright_green_style,
+                )
+            else:
+                self.console.print(
+                    f"Materialized view {view_name} not dropped.", style=deep_red_style
+                )
+
+        except Exception as e:
+            self.console.print(
+                f"An error occurred while trying to drop view: {e}",
+                style=deep_red_style,
+            )
+
+    def create_Index(self, parsed_command):
+        """Create a secondary index: CREATE INDEX index_name ON table_name (column_name)"""
+        if self.current_database is None:
+            self.console.print("No database in use.", style=deep_red_style)
+            return
+
+        try:
+            index_name = self.current_database.create_index(
+                parsed_command["create index"]
+            )
+            self.console.print(
+                f"Index {index_name} created successfully.",
+                style=bright_green_style,
+            )
+        except Exception as e:
+            self.console.print(
+                f"An error occurred while trying to create index: {e}",
+                style=deep_red_style,
+            )
+
+    def drop_Index(self, parsed_command):
+        """Drop a secondary index: DROP INDEX index_name"""
+        if self.current_database is None:
+            self.console.print("No database in use.", style=deep_red_style)
+            return
+
+        try:
+            drop_clause = parsed_command.get("drop")
+            index_name = drop_clause.get("index")
+            if drop_clause.get("if_exists") and (
+                self.current_database.find_index(index_name) is None
+            ):
+                self.console.print(
+                    f"Index {index_name} does not exist.", style=deep_red_style
+                )
+                return
+
+            self.current_database.drop_index(index_name)
+            self.console.print(
+                f"Index {index_name} dropped successfully.",
+                style=bright_green_style,
+            )
+        except Exception as e:
+            self.console.print(
+                f"An error occurred while trying to drop index: {e}",
+                style=deep_red_style,
+            )
+
     def run_Query(self, line):
         """Run a query on the database: QUERY your_sql_query;"""
         if self.current_database is None:
@@ -465,32 +702,155 @@ class DatabaseCLI(cmd.Cmd):
             before = time.time()
             results = execute_query(f"""{line}""", self.current_database)
             after = time.time()
+            self.print_Results(results, after - before)
+
+        except Exception as e:
+            self.console.print(
+                f"An error occurred while trying to run query: {e}",
+                style=deep_red_style,
+            )
 
-            if results:
-                table = PrettyTable()
-                table.field_names = results.columns
-                table.hrules = 1
+    def print_Results(self, results, elapsed):
+        if results:
+            table = PrettyTable()
+            table.field_names = results.columns
+            table.hrules = 1
 
-                for row in results.rows:
-                    table.add_row(row)
+            for row in results.rows:
+                table.add_row(row)
 
-                # ANSI Blue color start code
-                blue_start = "\033[94m"
-                # ANSI color reset code
-                reset = "\033[0m"
+            # ANSI Blue color start code
+            blue_start = "\033[94m"
+            # ANSI color reset code
+            reset = "\033[0m"
+
+            # Print the table with blue color
+            print(blue_start + str(table) + reset)
+            print(f"Query finished in: {elapsed:.5f}s")
+            self.console.print(
+                "\nQuery executed successfully.", style=bright_green_style
+            )
+        else:
+            self.console.print("No data returned.", style=deep_red_style)
 
-                # Print the table with blue color
-                print(blue_start + str(table) + reset)
-                print(f"Query finished in: {after - before:.5f}s")
+    def prepare_Statement(self, arg):
+        """Prepare a SELECT or INSERT statement with ? parameters: PREPARE <name> AS <statement>"""
+        if self.current_database is None:
+            self.console.print("No database in use.", style=deep_red_style)
+            return
+        match = re.fullmatch(
+            r"\s*prepare\s+(\w+)\s+as\s+(.+?)\s*;?\s*", arg, re.I | re.S
+        )
+        if match is None:
+            self.console.print(f"Invalid command: {arg}", style=deep_red_style)
+            return
+        name, statement = match.groups()
+        try:
+            self.current_database.prepared_statements[name] = PreparedStatement(
+                self.current_database, statement
+            )
+            self.console.print(
+                f"Statement {name} prepared successfully.", style=bright_green_style
+            )
+        except Exception as e:
+            self.console.print(
+                f"An error occurred while trying to prepare {name}: {e}",
+                style=deep_red_style,
+            )
+
+    def execute_Statement(self, arg):
+        """Execute a prepared statement: EXECUTE <name> [(value, value, ...)]"""
+        if self.current_database is None:
+            self.console.print("No database in use.", style=deep_red_style)
+            return
+        match = re.fullmatch(
+            r"\s*execute\s+(\w+)\s*(?:\((.*)\))?\s*;?\s*", arg, re.I | re.S
+        )
+        if match is None:
+            self.console.print(f"Invalid command: {arg}", style=deep_red_style)
+            return
+        name, arguments = match.groups()
+        statement = self.current_database.prepared_statements.get(name)
+        if statement is None:
+            self.console.print(
+                f"No prepared statement found with the name '{name}'.",
+                style=deep_red_style,
+            )
+            return
+        try:
+            before = time.time()
+            results = statement.execute(*parse_arguments(arguments or ""))
+            after = time.time()
+            if statement.query_plan is None:
                 self.console.print(
-                    "\nQuery executed successfully.", style=bright_green_style
+                    f"Data inserted into table {statement.table_name} successfully.",
+                    style=bright_green_style,
                 )
             else:
-                self.console.print("No data returned.", style=deep_red_style)
+                self.print_Results(results, after - before)
+        except Exception as e:
+            self.console.print(
+                f"An error occurred while trying to execute {name}: {e}",
+                style=deep_red_style,
+            )
 
+    def deallocate_Statement(self, arg):
+        """Remove a prepared statement: DEALLOCATE <name>"""
+        if self.current_database is None:
+            self.console.print("No database in use.", style=deep_red_style)
+            return
+        parts = arg.split()
+        name = parts[-1].rstrip(";") if len(parts) == 2 else None
+        if name not in self.current_database.prepared_statements:
+            self.console.print(
+                f"No prepared statement found with the name '{name}'.",
+                style=deep_red_style,
+            )
+            return
+        del self.current_database.prepared_statements[name]
+        self.console.print(
+            f"Statement {name} deallocated successfully.", style=bright_green_style
+        )
+
+    def begin_Transaction(self):
+        """Start a transaction: BEGIN; the changes of the next statements are applied by COMMIT or discarded by ROLLBACK"""
+        if self.current_database is None:
+            self.console.print("No database in use.", style=deep_red_style)
+            return
+        try:
+            self.current_database.begin()
+            self.console.print("Transaction started.", style=bright_green_style)
         except Exception as e:
             self.console.print(
-                f"An error occurred while trying to run query: {e}",
+                f"An error occurred while trying to start a transaction: {e}",
+                style=deep_red_style,
+            )
+
+    def commit_Transaction(self):
+        """Apply the changes of the transaction: COMMIT;"""
+        if self.current_database is None:
+            self.console.print("No database in use.", style=deep_red_style)
+            return
+        try:
+            message = self.current_database.commit()
+            self.console.print(f"{message}", style=bright_green_style)
+        except Exception as e:
+            self.console.print(
+                f"An error occurred while trying to commit: {e}",
+                style=deep_red_style,
+            )
+
+    def rollback_Transaction(self):
+        """Discard the changes of the transaction: ROLLBACK;"""
+        if self.current_database is None:
+            self.console.print("No database in use.", style=deep_red_style)
+            return
+        try:
+            message = self.current_database.rollback()
+            self.console.print(f"{message}", style=bright_green_style)
+        except Exception as e:
+            self.console.print(
+                f"An error occurred while trying to roll back: {e}",
                 style=deep_red_style,
             )
 
@@ -560,6 +920,21 @@ class DatabaseCLI(cmd.Cmd):
             for db_name in self.databases:
                 self.console.print(f"- {escape(db_name)}")
 
+    def do_Cache_Stats(self, line):
+        """Print the hits and misses of the plan and result caches of the current database"""
+        if self.current_database is None:
+            self.console.print("No database in use.", style=deep_red_style)
+            return
+        table = PrettyTable()
+        table.field_names = ["Cache", "Entries", "Hits", "Misses"]
+        for cache_name, cache in (
+            ("plans", self.current_database.plan_cache),
+            ("results", self.current_database.result_cache),
+        ):
+            if cache is not None:
+                table.add_row([cache_name, len(cache), cache.hits, cache.misses])
+        print(table)
+
     def do_Exit(self, arg):
         """Exit the CLI"""
         exit_msg_style = "ansired"  # ANSI red for the prompt
@@ -598,11 +973,17 @@ class DatabaseCLI(cmd.Cmd):
     def do_help(self, arg):
         # Filter out commands when no database is created or in use
         if not self.databases_exist():
-            excluded_commands = ["Print_Tables", "Print_Schemas", "List_Databases"]
+            excluded_commands = [
+                "Print_Tables",
+                "Print_Schemas",
+                "List_Databases",
+                "Cache_Stats",
+            ]
         elif not self.current_database:
             excluded_commands = [
                 "Print_Tables",
                 "Print_Schemas",
+                "Cache_Stats",
             ]
         else:
             excluded_commands = []
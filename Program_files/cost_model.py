@@ -0,0 +1,175 @@
+import math
+
+from sqlglot import exp
+
+# costs are counted in rows processed by the interpreter: hashing a row costs more than
+# reading it, while comparisons inside a B-tree lookup or a sort run in C and cost less
+HASH_COST = 2
+COMPARISON_COST = 0.1
+# selectivity of a condition the statistics cannot estimate
+DEFAULT_SELECTIVITY = 1 / 3
+# estimated size of a join side that is not a base table, e.g. a subquery
+UNKNOWN_ROWS = 1000
+
+# comparisons mapped to the comparison obtained by swapping their operands
+FLIPPED_COMPARISONS = {
+    exp.EQ: exp.EQ,
+    exp.NEQ: exp.NEQ,
+    exp.GT: exp.LT,
+    exp.GTE: exp.LTE,
+    exp.LT: exp.GT,
+    exp.LTE: exp.GTE,
+}
+
+
+class CostModel:
+    """
+    Estimates the size of scans and joins from the statistics catalog, and the cost of the join
+    algorithms of the query engine. The cost of a join does not include scanning its sides.
+
+    Statistics are looked up by the table and column names used by the executor, see
+    executor_statistics in executor.py.
+    """
+
+    def __init__(self, statistics=None):
+        # {table name: (TableStatistics, {executor column name: column name})}
+        self.statistics = statistics or {}
+
+    def table_rows(self, table_name):
+        if table_name not in self.statistics:
+            return UNKNOWN_ROWS
+        return self.statistics[table_name][0].row_count
+
+    def scan_rows(self, table_name, condition=None):
+        # estimated number of rows of a table satisfying condition
+        return self.table_rows(table_name) * self.selectivity(condition, table_name)
+
+    def distinct(self, table_name, column):
+        # estimated number of distinct values of a column, None if it is not known
+        if table_name not in self.statistics:
+            return None
+        statistics, columns = self.statistics[table_name]
+        if column not in columns:
+            return None
+        return statistics.distinct(columns[column])
+
+    def has_nulls(self, table_name, column):
+        if table_name not in self.statistics:
+            return True
+        statistics, columns = self.statistics[table_name]
+        if column not in columns:
+            return True
+        return statistics.columns[columns[column]].nulls > 0
+
+    def is_sorted(self, table_name, column):
+        # True if the rows of the table are stored in the order of the column
+        if table_name not in self.statistics:
+            return False
+        statistics, columns = self.statistics[table_name]
+        return column in columns and statistics.is_sorted(columns[column])
+
+    def selectivity(self, condition, table_name):
+        # estimated share of the rows of a table satisfying condition
+        if condition is None:
+            return 1
+        if isinstance(condition, exp.Paren):
+            return self.selectivity(condition.this, table_name)
+        if isinstance(condition, exp.And):
+            return self.selectivity(condition.this, table_name) * self.selectivity(
+                condition.expression, table_name
+            )
+        if isinstance(condition, exp.Or):
+            left = self.selectivity(condition.this, table_name)
+            right = self.selectivity(condition.expression, table_name)
+            return left + right - left * right
+        if isinstance(condition, exp.Not):
+            return 1 - self.selectivity(condition.this, table_name)
+        if isinstance(condition, exp.Between):
+            low = self.selectivity(
+                exp.GTE(this=condition.this, expression=condition.args["low"]),
+                table_name,
+            )
+            high = self.selectivity(
+                exp.LTE(this=condition.this, expression=condition.args["high"]),
+                table_name,
+            )
+            return max(low + high - 1, 0)
+        if type(condition) in FLIPPED_COMPARISONS:
+            return self._comparison_selectivity(condition, table_name)
+        return DEFAULT_SELECTIVITY
+
+    def _comparison_selectivity(self, condition, table_name):
+        comparison, column, value = (
+            type(condition),
+            condition.this,
+            condition.expression,
+        )
+        # e.x. 5 < a is the same as a > 5
+        if not isinstance(column, exp.Column):
+            comparison, column, value = FLIPPED_COMPARISONS[comparison], value, column
+        if not isinstance(column, exp.Column):
+            return DEFAULT_SELECTIVITY
+
+        distinct = self.distinct(table_name, column.name)
+        if comparison is exp.EQ:
+            return 1 / distinct if distinct else DEFAULT_SELECTIVITY
+        if comparison is exp.NEQ:
+            return 1 - 1 / distinct if distinct else 1 - DEFAULT_SELECTIVITY
+
+        value = _number(value)
+        statistics, columns = self.statistics.get(table_name, (None, {}))
+        if value is None or column.name not in columns:
+            return DEFAULT_SELECTIVITY
+        low, high = statistics.bounds(columns[column.name])
+        if not isinstance(low, (int, float)) or not isinstance(high, (int, float)):
+            return DEFAULT_SELECTIVITY
+        if low == high:
+            below = 1 if value > low else 0
+        else:
+            # assume the values are spread uniformly between the bounds
+            below = min(max((value - low) / (high - low), 0), 1)
+        return below if comparison in (exp.LT, exp.LTE) else 1 - below
+
+    @staticmethod
+    def join_rows(left_rows, right_rows, left_distinct=None, right_distinct=None):
+        # estimated size of an equi-join: every value of the side with fewer distinct
+        # values is assumed to match a value of the other side
+        distinct = max(left_distinct or 1, right_distinct or 1)
+        return left_rows * right_rows / distinct
+
+    @staticmethod
+    def sort_cost(rows):
+        # the sort key is evaluated once per row, then the keys are compared
+        return rows * (1 + COMPARISON_COST * math.log2(rows + 2))
+
+    @staticmethod
+    def nested_loop_cost(left_rows, right_rows):
+        return left_rows * right_rows
+
+    @staticmethod
+    def hash_join_cost(left_rows, right_rows):
+        return HASH_COST * (left_rows + right_rows)
+
+    @staticmethod
+    def index_join_cost(outer_rows, indexed_rows):
+        # every row of the outer side probes the B-tree of the indexed side, which is never
+        # scanned
+        return outer_rows * (1 + COMPARISON_COST * math.log2(indexed_rows + 2))
+
+    @classmethod
+    def merge_join_cost(cls, left_rows, right_rows, left_sorted, right_sorted):
+        cost = left_rows + right_rows
+        if not left_sorted:
+            cost += cls.sort_cost(left_rows)
+        if not right_sorted:
+            cost += cls.sort_cost(right_rows)
+        return cost
+
+
+def _number(expression):
+    if isinstance(expression, exp.Neg):
+        value = _number(expression.this)
+        return -value if value is not None else None
+    if isinstance(expression, exp.Literal) and expression.is_number:
+        return float(expression.this)
+    return None
@@ -1,42 +1,189 @@
 import csv
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial, wraps
+from itertools import islice
+from operator import gt
 from BTrees.OOBTree import OOBTree
-from decimal import Decimal, getcontext
+from csv_loader import (
+    LOAD_BATCH_SIZE,
+    LOAD_BUFFER_SIZE,
+    PARALLEL_CHUNK_SIZE,
+    ColumnConverter,
+    convert_batch,
+    convert_chunk,
+    read_batches,
+    split_chunks,
+)
+from executor import execute_query, execute_view_query
+from index_lookup import lookup_row_ids
+from materialized_view import ROW_ID, MaterializedView
+from mo_sql_parsing import format as format_sql
 from prettytable import PrettyTable
+from query_cache import PLAN_CACHE_SIZE, RESULT_CACHE_SIZE, LRUCache
+from read_view import ReadView
+from row_expression import compile_condition, compile_expression
+from secondary_index import SecondaryIndex
+from snapshot import read_snapshot, write_snapshot
+from stored_tree import StoredTree, save_tree
+from table_storage import ColumnarTable
+from table_statistics import TableStatistics
+from transaction import Transaction
+from write_ahead_log import WriteAheadLog
+
+# file of a file-backed database describing its tables, see Database.flush
+CATALOG_FILE = "catalog.json"
+# write-ahead log of a file-backed database, see WriteAheadLog
+LOG_FILE = "wal.log"
+# size of the write-ahead log in bytes above which a statement triggers a checkpoint
+CHECKPOINT_LOG_SIZE = 16 << 20
+# a table is compacted once deleted rows make up this share of its rows, and at least
+# COMPACTION_MIN_ROWS of them, see Database._compact_table
+COMPACTION_RATIO = 0.5
+COMPACTION_MIN_ROWS = 1024
+
+
+def statement(method):
+    # the statements changing a database run one at a time, and the queries read the
+    # changes of a statement once it returns, see ReadView
+    @wraps(method)
+    def run(self, *args, **kwargs):
+        with self.write_lock:
+            self.statement_depth += 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.statement_depth -= 1
+                if self.statement_depth == 0:
+                    self._publish()
+
+    return run
 
 
 class Database:
-    def __init__(self):
+    def __init__(self, directory=None, result_cache_size=RESULT_CACHE_SIZE):
         self.tables = {}
         self.indexing_structures = {}
         self.table_schemas = {}
-
+        # multiset of whole-row fingerprints for O(1) duplicate row checks
+        # only kept for tables without a primary key index, see _find_duplicate
+        self.row_fingerprints = {}
+        # secondary indexes created with CREATE INDEX
+        # key: table name, value: dictionary of index name to SecondaryIndex
+        self.secondary_indexes = {}
+        # statistics catalog used by the cost model of the query engine
+        # key: table name, value: TableStatistics
+        self.statistics = {}
+        # directory of a file-backed database, None for an in-memory database
+        self.directory = directory
+        # tables changed since they were last written to the directory
+        self.dirty_tables = set()
+        # files of the tables in the directory
+        # key: table name, value: (generation, description returned by ColumnarTable.save)
+        self.table_files = {}
+        # changes made since the last flush, None for an in-memory database
+        self.wal = None
+        # incremented by every change of the tables or indexes, which makes the cached query
+        # plans stale
+        self.schema_version = 0
+        # key: (normalized SQL, schema version), value: QueryPlan, see execute_query
+        self.plan_cache = LRUCache(PLAN_CACHE_SIZE)
+        # incremented by every change of the rows of a table
+        # key: table name, value: version
+        self.table_versions = Counter()
+        # results of the last SELECT queries, None if results are not cached
+        # key: (normalized SQL, versions of the referenced tables), value: result
+        self.result_cache = (
+            LRUCache(result_cache_size) if result_cache_size > 0 else None
+        )
+        # statements prepared with PREPARE
+        # key: statement name, value: PreparedStatement
+        self.prepared_statements = {}
+        # views created with CREATE MATERIALIZED VIEW, stored in self.tables like tables
+        # key: view name, value: MaterializedView
+        self.views = {}
+        # held by the running statement, see statement
+        self.write_lock = threading.RLock()
+        self.statement_depth = 0
+        # version of the last statement that returned, and the tables as of that version:
+        # (version, {table name: (ColumnarTable, number of rows)}), see ReadView
+        self.commit_version = 0
+        self.committed = (0, {})
+        # the open ReadViews, key: view, value: the version it reads
+        self.read_views = {}
+        self.read_view_lock = threading.Lock()
+        # the Transaction opened by BEGIN, which holds write_lock until it ends
+        self.transaction = None
+        if directory is not None:
+            self._open_files()
+        self._publish()
+
+    @statement
     def create_table(self, table_definition) -> str:
         now = time.time()
 
+        self._check_no_transaction()
         table_name = table_definition["name"]
         if table_name in self.tables:
             raise ValueError(f"Table {table_name} already exists!")
 
-        # Create an empty table that will be populated when LOAD DATA is read
-        self.tables[table_name] = []
-
         schema = self._create_schema(table_definition)
         print(f"Schema for {table_name}: {schema}")
-        self.table_schemas[table_name] = schema
+        self._add_table(table_name, schema)
+        self.flush()
 
         print(f"Table created in: {time.time() - now:.5f}s")
 
         return table_name
 
+    def _add_table(self, table_name, schema):
+        self.table_schemas[table_name] = schema
+
+        # Create an empty table that will be populated when LOAD DATA is read
+        self.tables[table_name] = ColumnarTable(schema)
+        self.secondary_indexes[table_name] = {}
+        self.statistics[table_name] = TableStatistics(self.tables[table_name])
+        if table_name not in self.indexing_structures:
+            self.row_fingerprints[table_name] = Counter()
+        self._table_changed(table_name)
+        self._schema_changed()
+
+    @statement
+    def create_materialized_view(self, view_name, sql):
+        # create a view holding the result of an aggregate query, see MaterializedView
+        now = time.time()
+
+        self._check_no_transaction()
+        if view_name in self.tables:
+            raise ValueError(f"Table {view_name} already exists!")
+        view = MaterializedView(view_name, sql, self)
+        self._add_table(view_name, view.schema)
+        self.views[view_name] = view
+        self._refresh_view(view)
+        self.flush()
+
+        print(f"Materialized view created in: {time.time() - now:.5f}s")
+
+        return view_name
+
     def _create_schema(self, table_definition):
         schema = {}
 
         # First, add columns to the schema
         self._parse_columns(table_definition, schema)
 
-        # if no constraints are specified, return early
+        # if no constraints are specified, only an inline primary key can be indexed
         if "constraint" not in table_definition:
+            if self._count_primary_key(schema) > 0:
+                self.indexing_structures[table_definition["name"]] = OOBTree()
             return schema
 
         # Next, add primary key and foreign key constraints
@@ -59,9 +206,9 @@ class Database:
         primary_key_count = self._count_primary_key(schema)
         if primary_key_count == 0:
             raise ValueError("No primary key specified!")
-        # if key is a single attribute primary key, then add an entry to the indexing structure
-        elif primary_key_count == 1:
-            self.indexing_structures[table_definition["name"]] = OOBTree()
+        # add an entry to the indexing structure, keyed by the primary key value for a single
+        # attribute primary key and by the tuple of key values for a multi-attribute key
+        self.indexing_structures[table_definition["name"]] = OOBTree()
 
         return schema
 
@@ -127,118 +274,494 @@ class Database:
                 count += 1
         return count
 
-    def load_from_csv(self, table_name, csv_filename):
-        now = time.time()
+    def primary_key_columns(self, table_name):
+        # primary key columns in the order they are defined in the table
+        schema = self.table_schemas[table_name]
+        return [column for column in schema if "primary_key" in schema[column]]
+
+    def primary_key_value(self, table_name, row):
+        # key of row in the indexing structure: the value of a single attribute primary key
+        # or the tuple of values of a multi-attribute primary key
+        columns = self.primary_key_columns(table_name)
+        if len(columns) == 1:
+            return row[columns[0]]
+        return tuple(row[column] for column in columns)
+
+    def _primary_key_values(self, table_name, columns):
+        # primary_key_value of every row of a batch given as {column: list of values}
+        key_columns = self.primary_key_columns(table_name)
+        if len(key_columns) == 1:
+            return columns[key_columns[0]]
+        return list(zip(*(columns[column] for column in key_columns)))
+
+    def _row_fingerprint(self, table_name, row):
+        # a row fingerprint is the tuple of its values in schema order
+        return tuple(row[column] for column in self.table_schemas[table_name])
+
+    def _add_fingerprint(self, table_name, row):
+        if table_name not in self.row_fingerprints:
+            return
+        self.row_fingerprints[table_name][self._row_fingerprint(table_name, row)] += 1
+
+    def _remove_fingerprint(self, table_name, row):
+        if table_name not in self.row_fingerprints:
+            return
+        fingerprints = self.row_fingerprints[table_name]
+        fingerprint = self._row_fingerprint(table_name, row)
+        fingerprints[fingerprint] -= 1
+        if fingerprints[fingerprint] <= 0:
+            del fingerprints[fingerprint]
+
+    def _find_duplicate(self, table_name, row):
+        # return a description of the conflict if row cannot be added to the table
+        if table_name in self.indexing_structures:
+            # a duplicate row always has a duplicate primary key, so the index finds the
+            # only row that can conflict and comparing against it replaces the fingerprint
+            primary_key_value = self.primary_key_value(table_name, row)
+            row_id = self.indexing_structures[table_name].get(primary_key_value)
+            if row_id is None:
+                return None
+            if self.tables[table_name].row(row_id) == row:
+                return f"Duplicate row: {row}"
+            return f"Duplicate primary key: {primary_key_value}"
+
+        if self._row_fingerprint(table_name, row) in self.row_fingerprints[table_name]:
+            return f"Duplicate row: {row}"
+        return None
+
+    def _add_row(self, table_name, row):
+        self._log("insert", table_name, row)
+        row_id = self.tables[table_name].append(row)
+        # if indexing structure exists, then map the primary key to the new row id
+        if table_name in self.indexing_structures:
+            primary_key_value = self.primary_key_value(table_name, row)
+            self.indexing_structures[table_name].insert(primary_key_value, row_id)
+        for index in self.secondary_indexes[table_name].values():
+            index.insert(row[index.column], row_id)
+        self._add_fingerprint(table_name, row)
+        self.statistics[table_name].add(row)
+        self._table_changed(table_name)
+        self._maintain_views(table_name, [row_id], 1)
+        return row_id
+
+    def _update_rows(self, table_name, changes):
+        # set columns of rows to new values, changes: list of (row id, {column: new value})
+        self._log("update", table_name, changes)
+        table = self.tables[table_name]
+        self._table_changed(table_name)
+        columns = set()
+        for _, values in changes:
+            columns.update(values)
+        # the views reading a changed column subtract the old rows and add the new ones
+        # with a single query each
+        views = self._views_reading(table_name, columns)
+        row_ids = [row_id for row_id, _ in changes]
+        self._maintain_views(table_name, row_ids, -1, views)
 
+        schema = self.table_schemas[table_name]
+        statistics = self.statistics[table_name]
+        indexes = {
+            column: [
+                index
+                for index in self.secondary_indexes[table_name].values()
+                if index.column == column
+            ]
+            for column in columns
+        }
+        fingerprints = table_name in self.row_fingerprints
+        # whole rows are only read for the duplicate checks and to re-key the index
+        tree = self.indexing_structures.get(table_name)
+        if not any("primary_key" in schema[column] for column in columns):
+            tree = None
+        for row_id, values in changes:
+            if tree is not None:
+                old_key = self.primary_key_value(table_name, table.row(row_id))
+            if fingerprints:
+                self._remove_fingerprint(table_name, table.row(row_id))
+            for column, value in values.items():
+                old_value = table.value(row_id, column)
+                statistics.update(column, old_value, value)
+                for index in indexes[column]:
+                    index.remove(old_value, row_id)
+                    index.insert(value, row_id)
+                table.set_value(row_id, column, value)
+            if fingerprints:
+                self._add_fingerprint(table_name, table.row(row_id))
+            if tree is not None:
+                new_key = self.primary_key_value(table_name, table.row(row_id))
+                # when the keys of several rows are shifted, e.g. SET id = id + 1, the old
+                # key may already belong to a row updated before this one
+                if old_key != new_key:
+                    if tree.get(old_key) == row_id:
+                        del tree[old_key]
+                    tree[new_key] = row_id
+        self._maintain_views(table_name, row_ids, 1, views)
+
+    def _views_reading(self, table_name, columns):
+        return [
+            view
+            for view in self.views.values()
+            if any(view.reads(table_name, column) for column in columns)
+        ]
+
+    def _clear_table(self, table_name):
+        self._log("clear", table_name)
+        self._replace_table(table_name, ColumnarTable(self.table_schemas[table_name]))
+        if table_name in self.row_fingerprints:
+            self.row_fingerprints[table_name].clear()
+        if table_name in self.indexing_structures:
+            self.indexing_structures[table_name].clear()
+        for index in self.secondary_indexes[table_name].values():
+            index.clear()
+        self.statistics[table_name].clear()
+        self._table_changed(table_name)
+        for view in self.views.values():
+            if table_name in view.table_names:
+                self._refresh_view(view)
+
+    def _log(self, operation, table_name, *arguments):
+        # record a change in the write-ahead log before it is applied
+        self._changing(table_name)
+        # the changes of a view are not logged, replaying the changes of its tables redoes them
+        if self.wal is not None and table_name not in self.views:
+            self.wal.append((operation, table_name, *arguments))
+
+    def _commit(self):
+        # make the changes of a statement durable
+        if self.wal is None:
+            return
+        self.wal.commit()
+        if len(self.wal) > CHECKPOINT_LOG_SIZE:
+            self.flush()
+
+    def _replay(self, record):
+        operation, table_name, *arguments = record
+        if operation == "insert":
+            self._add_row(table_name, *arguments)
+        elif operation == "extend":
+            self._add_columns(table_name, *arguments)
+        elif operation == "update":
+            self._update_rows(table_name, *arguments)
+        elif operation == "delete":
+            self._remove_row(table_name, *arguments)
+        elif operation == "clear":
+            self._clear_table(table_name)
+        else:
+            raise ValueError(f"Invalid log record: {record}")
+
+    def _remove_row(self, table_name, row_id, maintain_views=True):
+        self._log("delete", table_name, row_id)
+        table = self.tables[table_name]
+        self._table_changed(table_name)
+        if maintain_views:
+            self._maintain_views(table_name, [row_id], -1)
+        row = table.row(row_id)
+        if table_name in self.indexing_structures:
+            primary_key_value = self.primary_key_value(table_name, row)
+            self.indexing_structures[table_name].pop(primary_key_value)
+        for index in self.secondary_indexes[table_name].values():
+            index.remove(row[index.column], row_id)
+        self._remove_fingerprint(table_name, row)
+        self.statistics[table_name].remove(row)
+        table.delete(row_id)
+
+    def _remove_rows(self, table_name, row_ids):
+        # the views subtract all the rows with a single query before any of them is removed
+        self._maintain_views(table_name, row_ids, -1)
+        for row_id in row_ids:
+            self._remove_row(table_name, row_id, maintain_views=False)
+
+    def _matching_rows(self, table_name, where_clause):
+        # row ids of the rows satisfying a WHERE clause, which the primary key index or a
+        # secondary index narrows down when it covers a comparison of the clause
+        condition = compile_condition(
+            where_clause, table_name, self.table_schemas[table_name]
+        )
+        table = self._statement_table(table_name)
+        row_ids = lookup_row_ids(where_clause, self, table_name)
+        if row_ids is None:
+            row_ids = table.row_ids()
+        elif self.transaction is not None:
+            row_ids = table.candidates(row_ids)
+        try:
+            return condition(table, row_ids)
+        except TypeError as e:
+            raise ValueError(f"Invalid where clause: {where_clause}. {e}") from e
+
+    def _statement_table(self, table_name):
+        # the rows a statement reads and changes: those of the table, or those of the open
+        # transaction, which only the thread holding write_lock runs statements of
+        if self.transaction is not None:
+            return self.transaction.delta(table_name)
+        return self.tables[table_name]
+
+    def _compact_table(self, table_name):
+        # drop the deleted rows of a table from its column buffers and renumber the row ids
+        # held by its indexes and, for a view, by its groups
+        table, new_ids = self.tables[table_name].compact()
+        self._replace_table(table_name, table)
+        if table_name in self.indexing_structures:
+            tree = self.indexing_structures[table_name]
+            tree.update([(key, new_ids[row_id]) for key, row_id in tree.items()])
+        for index in self.secondary_indexes[table_name].values():
+            index.renumber(new_ids)
+        if table_name in self.views:
+            for group in self.views[table_name].groups.values():
+                if group[ROW_ID] is not None:
+                    group[ROW_ID] = new_ids[group[ROW_ID]]
+        self.dirty_tables.add(table_name)
+
+    def _changing(self, table_name):
+        if self.transaction is not None:
+            # the statements of a transaction change its deltas, see _statement_table
+            raise ValueError("Commit or roll back the open transaction first!")
+        # tag a table with the version of the running statement before it is changed, so
+        # that the queries reading it meanwhile read the rows of their own version
+        self.tables[table_name].version = self.commit_version + 1
+
+    def _replace_table(self, table_name, table):
+        # the queries reading the previous table keep reading it as it is, see ReadView
+        table.version = self.commit_version + 1
+        self.tables[table_name] = table
+        self.statistics[table_name].table = table
+
+    def _needs_compaction(self, table_name):
+        # the deltas of an open transaction refer to the rows by their row id
+        if self.transaction is not None:
+            return False
+        table = self.tables[table_name]
+        return (
+            len(table.deleted) >= COMPACTION_MIN_ROWS
+            and len(table.deleted) >= COMPACTION_RATIO * table.size
+        )
+
+    def _compact_if_needed(self, table_name):
+        if not self._needs_compaction(table_name):
+            return
+        # the write-ahead log refers to rows by their row id, so the tables of a file-backed
+        # database are only compacted by a checkpoint, which empties the log
+        if self.directory is None:
+            self._compact_table(table_name)
+        else:
+            self.flush()
+
+    def _maintain_views(self, table_name, row_ids, sign, views=None):
+        # add (sign 1) or subtract (sign -1) rows of a table to the views reading it, while
+        # the rows are in the table
+        if not row_ids:
+            return
+        for view in self.views.values() if views is None else views:
+            if table_name not in view.table_names:
+                continue
+            rows = execute_view_query(
+                view.plan, self, view.table_names, table_name, row_ids
+            ).rows
+            if rows:
+                self._write_view_rows(view, view.apply(rows, sign))
+
+    def _refresh_view(self, view):
+        # compute a view from all the rows of its tables
+        self._clear_table(view.name)
+        view.groups.clear()
+        view.ensure_group()
+        view.apply(execute_view_query(view.plan, self, view.table_names).rows, 1)
+        self._write_view_rows(view, list(view.groups))
+
+    def _write_view_rows(self, view, keys):
+        # bring the rows of the given groups of a view up to date with their state
+        table = self.tables[view.name]
+        for key in keys:
+            group = view.groups[key]
+            row_id = group[ROW_ID]
+            if view.is_empty(key):
+                if row_id is not None:
+                    self._remove_row(view.name, row_id)
+                del view.groups[key]
+            elif row_id is None:
+                group[ROW_ID] = self._add_row(view.name, view.row(key))
+            else:
+                values = {
+                    column: value
+                    for column, value in view.row(key).items()
+                    if table.value(row_id, column) != value
+                }
+                if values:
+                    self._update_rows(view.name, [(row_id, values)])
+        # the state of the view changed even if none of its rows did
+        self.dirty_tables.add(view.name)
+
+    def _check_table(self, table_name):
         if table_name not in self.tables:
             raise ValueError(f"Table {table_name} does not exist!")
+        if table_name in self.views:
+            raise ValueError(
+                f"{table_name} is a materialized view, it is only changed by changing its tables"
+            )
+
+    @statement
+    def load_from_csv(self, table_name, csv_filename, parallel=1):
+        now = time.time()
+
+        self._check_no_transaction()
+        self._check_table(table_name)
 
         if table_name not in self.table_schemas:
             raise ValueError(f"Schema for {table_name} does not exist!")
 
-        with open(
-            csv_filename, "r", encoding="utf-8"
-        ) as file:  # Added encoding specification
-            reader = csv.DictReader(file)
-            expected_columns = set(self.table_schemas[table_name].keys())
-            csv_columns = set(reader.fieldnames)
+        # a file smaller than a chunk is not worth starting the worker processes for
+        if parallel > 1 and os.path.getsize(csv_filename) > PARALLEL_CHUNK_SIZE:
+            # the worker processes read the rows after the header by byte offset
+            with open(csv_filename, "rb") as file:
+                header_line = file.readline()
+                data_start = file.tell()
+            header = next(csv.reader([header_line.decode("utf-8")]), None)
+
+            if self._check_csv_header(table_name, csv_filename, header):
+                self._populate_table_in_parallel(
+                    csv_filename, data_start, header, table_name, parallel
+                )
+        else:
+            with open(
+                csv_filename,
+                "r",
+                encoding="utf-8",
+                newline="",
+                buffering=LOAD_BUFFER_SIZE,
+            ) as file:  # Added encoding specification
+                reader = csv.reader(file)
+                header = next(reader, None)
+
+                if self._check_csv_header(table_name, csv_filename, header):
+                    self._populate_table_from_csv(reader, header, table_name)
+        self.flush()
 
-            if not csv_columns:
-                print(f"CSV file seems to be empty or without headers: {csv_filename}")
-                return
+        print(f"Table loaded in: {time.time() - now:.5f}s")
 
-            if csv_columns != expected_columns:
-                print(f"Expected columns: {expected_columns}")
-                print(f"CSV columns: {csv_columns}")
-                raise ValueError(
-                    f"CSV columns do not match table columns for {table_name}!"
-                )
+    def _check_csv_header(self, table_name, csv_filename, header):
+        if not header:
+            print(f"CSV file seems to be empty or without headers: {csv_filename}")
+            return False
 
-            self._populate_table_from_csv(reader, table_name)
+        expected_columns = set(self.table_schemas[table_name].keys())
+        csv_columns = set(header)
 
-        print(f"Table loaded in: {time.time() - now:.5f}s")
+        if csv_columns != expected_columns:
+            print(f"Expected columns: {expected_columns}")
+            print(f"CSV columns: {csv_columns}")
+            raise ValueError(
+                f"CSV columns do not match table columns for {table_name}!"
+            )
+        return True
 
-    def _populate_table_from_csv(self, reader, table_name):
-        table = self.tables[table_name]
+    def _populate_table_from_csv(self, reader, header, table_name):
         schema = self.table_schemas[table_name]
+        # compile the type conversion of every column once
+        converters = {
+            column: ColumnConverter.from_schema(schema[column]) for column in header
+        }
+
+        # convert and append the rows in batches, one column at a time
+        for rows in read_batches(reader, LOAD_BATCH_SIZE):
+            columns, errors = convert_batch(rows, header, converters)
+            self._report_conversion_errors(errors)
+            self._add_columns(table_name, columns)
+
+    def _populate_table_in_parallel(
+        self, csv_filename, data_start, header, table_name, processes
+    ):
+        chunks = split_chunks(csv_filename, data_start, processes)
+        convert = partial(
+            convert_chunk, csv_filename, header, self.table_schemas[table_name]
+        )
+        # the worker processes parse and convert the chunks, which are added to the table
+        # in file order so that the first of duplicate rows is kept, like a serial load
+        with ProcessPoolExecutor(processes) as pool:
+            for columns, errors in pool.map(convert, chunks):
+                self._report_conversion_errors(errors)
+                self._add_columns(table_name, columns)
+
+    def _report_conversion_errors(self, errors):
+        # ignore the rows that cannot be converted to the correct type
+        for row, error in errors:
+            print(f"Error converting row {row}. Skipping...: {error}")
+
+    def _add_columns(self, table_name, columns):
+        # bulk version of _find_duplicate and _add_row for a batch of rows given as
+        # {column: list of values}
+        self._changing(table_name)
+        if table_name in self.indexing_structures:
+            keys = self._primary_key_values(table_name, columns)
+            existing = self.indexing_structures[table_name]
+        else:
+            keys = list(
+                zip(*(columns[column] for column in self.table_schemas[table_name]))
+            )
+            existing = self.row_fingerprints[table_name]
+
+        # ignore the rows that already exist in the table or earlier in the batch
+        # or that have a duplicate primary key
+        if len(set(keys)) != len(keys) or self._contains_any(existing, keys):
+            positions = self._unique_positions(table_name, columns, keys, existing)
+            columns = {
+                column: [values[position] for position in positions]
+                for column, values in columns.items()
+            }
+            keys = [keys[position] for position in positions]
 
-        for row in reader:
-            # Convert types as per the schema before appending
-            try:
-                converted_row = {
-                    column: self._convert_type(
-                        row[column],
-                        schema[column]["type"],
-                        schema[column].get("nullable", True),
-                        schema[column].get("primary_key", False),
-                    )
-                    for column in row
-                }
-            # ignore the new row if it cannot be converted to the correct type
-            except ValueError as e:
-                print(f"Error converting row {row}. Skipping...: {e}")
+        row_ids = self.tables[table_name].extend(columns)
+        if table_name in self.indexing_structures:
+            # inserting the keys in order fills the B-tree one bucket after the other
+            if any(map(gt, keys, islice(keys, 1, None))):
+                existing.update(sorted(zip(keys, row_ids)))
+            else:
+                existing.update(list(zip(keys, row_ids)))
+        else:
+            existing.update(keys)
+        for index in self.secondary_indexes[table_name].values():
+            for value, row_id in zip(columns[index.column], row_ids):
+                index.insert(value, row_id)
+        self.statistics[table_name].extend(columns, len(row_ids))
+        self._table_changed(table_name)
+        self._maintain_views(table_name, list(row_ids), 1)
+
+    @staticmethod
+    def _contains_any(existing, keys):
+        if not existing or not keys:
+            return False
+        # keys beyond the range of the index, e.g. the next rows of a file sorted by the
+        # primary key, cannot be in it
+        if not isinstance(existing, Counter) and (
+            min(keys) > existing.maxKey() or max(keys) < existing.minKey()
+        ):
+            return False
+        return any(map(existing.__contains__, keys))
+
+    def _unique_positions(self, table_name, columns, keys, existing):
+        # positions of the rows of a batch that can be added to the table, see _find_duplicate
+        positions = {}
+        for position, key in enumerate(keys):
+            if key not in positions and key not in existing:
+                positions[key] = position
                 continue
 
-            # ignore the new row if it already exists in the table
-            if converted_row in table:
-                print(f"Duplicate row: {converted_row}. Skipping...")
-                continue
-            # if indexing structure exists, then add the row to the indexing structure
-            if table_name in self.indexing_structures:
-                indexing_structure = self.indexing_structures[table_name]
-                # Extract the primary key column and its value
-                primary_key_column = next(
-                    column
-                    for column in converted_row
-                    if "primary_key" in schema[column]
-                )
-                primary_key_value = converted_row[primary_key_column]
-                # ignore the new row with a duplicate primary key
-                if primary_key_value in indexing_structure:
-                    print(f"Duplicate primary key: {primary_key_value}. Skipping...")
-                    continue
-                # Add converted_row to the indexing structure
-                indexing_structure.insert(primary_key_value, converted_row)
+            row = {column: values[position] for column, values in columns.items()}
+            if key in positions:
+                other_row = {
+                    column: values[positions[key]] for column, values in columns.items()
+                }
+            elif table_name in self.indexing_structures:
+                other_row = self.tables[table_name].row(existing[key])
+            else:
+                other_row = row
 
-            # Add converted_row to the table
-            table.append(converted_row)
+            if other_row == row:
+                print(f"Duplicate row: {row}. Skipping...")
+            else:
+                print(f"Duplicate primary key: {key}. Skipping...")
+        return list(positions.values())
 
     def _convert_type(self, value, data_type, nullable, primary_key):
-        # Handle null values
-        if value == "" or (isinstance(value, str) and value.isspace()):
-            # if NOT NULL is not set and column is not a primary key, then return None
-            if nullable and not primary_key:
-                return None
-            else:
-                raise ValueError(
-                    f"Column cannot be null. Failed to convert to {data_type}"
-                )
-        # Handle integer type
-        if data_type == "int":
-            return int(value)
-        # Handle floating point type
-        elif data_type == "float":
-            return float(value)
-        # Handle boolean type
-        elif data_type == "varchar":
-            return str(value)
-        elif data_type == "boolean":
-            if value in ("true", "1", "t", "y", "yes"):
-                return True
-            elif value in ("false", "0", "f", "n", "no"):
-                return False
-            else:
-                raise ValueError(f"Invalid boolean value: {value}")
-        # Handle decimal type with precision and scale
-        elif isinstance(data_type, dict) and "decimal" in data_type:
-            precision, scale = data_type["decimal"]
-            getcontext().prec = precision
-            # Handle decimal type with precision and scale
-            results = Decimal(value).quantize(Decimal("1." + "0" * scale))
-            return float(results)
-        # Handle other data types that are strings
-        else:
-            return str(value)
+        return ColumnConverter(data_type, nullable, primary_key)(value)
 
     def print_table(self, table_name):
         if table_name not in self.tables:
@@ -264,18 +787,153 @@ class Database:
         # Print the table in blue color
         print(blue_start + str(table) + reset)
 
-    def insert(self, table_name, values):
+    @statement
+    def insert(self, table_name, query, columns=None):
+        # insert the rows of the parsed VALUES or SELECT of an INSERT statement, into the
+        # given columns if the statement has a column list
+        if isinstance(query, list):
+            # some VALUES lists are parsed as a list of rows instead of a query, with a
+            # {column: value} per row if the statement has a column list
+            rows = query
+            if isinstance(query[0], dict):
+                columns = columns or list(query[0])
+                rows = [[row.get(column) for column in columns] for row in query]
+            return self.insert_rows(
+                table_name, self._values_rows(table_name, rows), columns
+            )
+        if not isinstance(query, dict):
+            raise ValueError(f"Invalid values: {query}")
+        selects = query.get("union_all", [query])
+        if any(
+            not isinstance(select, dict) or set(select) != {"select"}
+            for select in selects
+        ):
+            # INSERT INTO t SELECT ... inserts the result of the query
+            return self.insert_select(table_name, format_sql(query), columns)
+        rows = []
+        for select in selects:
+            values = select["select"]
+            values = values if isinstance(values, list) else [values]
+            rows.append([value["value"] for value in values])
+        return self.insert_rows(
+            table_name, self._values_rows(table_name, rows), columns
+        )
+
+    def _values_rows(self, table_name, rows):
+        # the values of the rows of a VALUES list, which are literals or constant expressions
+        # such as -1 or 2 * 3 but cannot refer to columns
+        return [
+            [
+                (
+                    compile_expression(value, table_name, ())(None, None)
+                    if isinstance(value, dict)
+                    else value
+                )
+                for value in row
+            ]
+            for row in rows
+        ]
+
+    @statement
+    def insert_select(self, table_name, sql, columns=None):
+        # INSERT INTO table_name SELECT ...: the whole result of the query is computed before
+        # any row is inserted, so the query can read the table itself
+        self._check_table(table_name)
+        result = execute_query(sql, self)
+        return self.insert_rows(table_name, result.rows, columns)
+
+    @statement
+    def insert_rows(self, table_name, rows, columns=None):
+        """
+        Insert a batch of rows given as lists of values in the order of columns, by default
+        all the columns of the table. Columns left out are NULL.
+
+        The values are converted one column at a time, the whole batch is checked against
+        the index for duplicates at once and its keys are added to the index in a single
+        bulk update. A duplicate row or primary key rejects the whole batch.
+        """
         now = time.time()
 
-        if "select" not in values:
-            raise ValueError(
-                f"Invalid values: {values}. Currently supported format: INSERT INTO EMPLOYEE VALUES (1, 'John', 150.00, 5)"
+        self._check_table(table_name)
+        schema = self.table_schemas[table_name]
+        columns = list(schema) if columns is None else columns
+        for column in columns:
+            if column not in schema:
+                raise ValueError(
+                    f"Column {column} does not exist in table {table_name}!"
+                )
+        if len(set(columns)) != len(columns):
+            raise ValueError(f"Duplicate column in {columns}")
+        rows = [list(row) for row in rows]
+        for row in rows:
+            if len(row) != len(columns):
+                raise ValueError(
+                    f"Number of values does not match number of columns: {row}"
+                )
+        if not rows:
+            return "0 row(s) successfully inserted!"
+
+        given = dict(zip(columns, zip(*rows)))
+        nulls = (None,) * len(rows)
+        batch = {
+            column: list(
+                map(
+                    ColumnConverter.from_schema(column_schema), given.get(column, nulls)
+                )
             )
-        values = values["select"]
+            for column, column_schema in schema.items()
+        }
+        if self.transaction is not None:
+            # the duplicates are found by COMMIT, among the rows as of the end of the
+            # transaction
+            self.transaction.delta(table_name).extend(batch)
+        else:
+            duplicate = self._find_batch_duplicate(table_name, batch)
+            if duplicate:
+                raise ValueError(duplicate)
 
-        if table_name not in self.tables:
-            raise ValueError(f"Table {table_name} does not exist!")
-        table = self.tables[table_name]
+            self._log("extend", table_name, batch)
+            self._add_columns(table_name, batch)
+            self._commit()
+
+        print(f"Rows inserted in: {time.time() - now:.5f}s")
+        return f"{len(rows)} row(s) successfully inserted!"
+
+    def _find_batch_duplicate(self, table_name, columns):
+        # bulk version of _find_duplicate for a batch of rows given as {column: list of
+        # values}, which also conflicts with the earlier rows of the batch
+        if table_name in self.indexing_structures:
+            keys = self._primary_key_values(table_name, columns)
+            existing = self.indexing_structures[table_name]
+        else:
+            keys = list(
+                zip(*(columns[column] for column in self.table_schemas[table_name]))
+            )
+            existing = self.row_fingerprints[table_name]
+        if len(set(keys)) == len(keys) and not self._contains_any(existing, keys):
+            return None
+
+        positions = {}
+        for position, key in enumerate(keys):
+            row = {column: values[position] for column, values in columns.items()}
+            if key in existing:
+                return self._find_duplicate(table_name, row)
+            if key in positions:
+                other_row = {
+                    column: values[positions[key]] for column, values in columns.items()
+                }
+                if other_row == row:
+                    return f"Duplicate row: {row}"
+                return f"Duplicate primary key: {key}"
+            positions[key] = position
+        return None
+
+    @statement
+    def insert_values(self, table_name, values):
+        # insert a row given as the list of its values in the order of the columns
+        now = time.time()
+
+        self._check_table(table_name)
         new_row = {}
         column_names = list(self.table_schemas[table_name].keys())
 
@@ -287,7 +945,6 @@ class Database:
 
         # iterate through values and match it with the schema to create a new row
         for index, value in enumerate(values):
-            value = value["value"]
             # extract column name at index from schema
             column_name = column_names[index]
 
@@ -300,169 +957,748 @@ class Database:
                 column_schema.get("primary_key", False),
             )
 
-            # find the primary key value
-            if "primary_key" in column_schema:
-                primary_key_value = new_row[column_name]
-
-        # if new_row already exists in the table, then raise error
-        if new_row in table:
-            raise ValueError(f"Duplicate row: {new_row}")
-
-        # if indexing structure exists, then add the row to the indexing structure
-        if table_name in self.indexing_structures:
-            indexing_structure = self.indexing_structures[table_name]
-            # ignore the new row with a duplicate primary key
-            if primary_key_value in indexing_structure:
-                raise ValueError(f"Duplicate primary key: {primary_key_value}")
-            # Add new_row to the indexing structure
-            indexing_structure.insert(primary_key_value, new_row)
+        if self.transaction is not None:
+            self.transaction.delta(table_name).extend(
+                {column: [value] for column, value in new_row.items()}
+            )
+        else:
+            # if new_row already exists in the table or has a duplicate primary key, then raise error
+            duplicate = self._find_duplicate(table_name, new_row)
+            if duplicate:
+                raise ValueError(duplicate)
 
-        # add new_row to the table
-        table.append(new_row)
+            # add new_row to the table and the indexing structure
+            self._add_row(table_name, new_row)
+            self._commit()
 
         print(f"Row inserted in: {time.time() - now:.5f}s")
 
+    @statement
     def delete(self, table_name, where_clause):
         now = time.time()
 
-        if table_name not in self.tables:
-            raise ValueError(f"Table {table_name} does not exist!")
-        table = self.tables[table_name]
+        self._check_table(table_name)
+        table = self._statement_table(table_name)
 
         # if table is empty, then return early
         if not table:
             return "Table is empty!"
         # if where_clause is None, then delete all rows in the table
-        if where_clause is None:
-            self.tables[table_name] = []
-            if table_name in self.indexing_structures:
-                self.indexing_structures[table_name].clear()
+        if where_clause is None and self.transaction is None:
+            self._clear_table(table_name)
+            self._commit()
 
             print(f"Table cleared in: {time.time() - now:.5f}s")
             return "All rows successfully deleted!"
 
-        if "eq" not in where_clause:
-            raise ValueError(
-                f"Invalid where clause: {where_clause}. Currently supported format: DELETE FROM EMPLOYEE WHERE dept = 5"
-            )
-
-        column_name, matching_value = self.parse_where(where_clause)
-
-        # find row in tables[table_name] that matches the column name and matching value
-        i = 0
-        while i < len(table):
-            row = table[i]
-            if row[column_name] == matching_value:
-                # if indexing structure exists, then remove the row from the indexing structure
-                if table_name in self.indexing_structures:
-                    # extract primary key column name and value
-                    primary_key_column = next(
-                        column
-                        for column in row
-                        if "primary_key" in self.table_schemas[table_name][column]
-                    )
-                    primary_key_value = row[primary_key_column]
-
-                    self.indexing_structures[table_name].pop(primary_key_value)
-
-                # remove the row from the collection
-                table.pop(i)
-            else:
-                i += 1
+        # e.x. DELETE FROM EMPLOYEE WHERE id BETWEEN 10 AND 20 OR dept IN (5, 6)
+        if where_clause is None:
+            row_ids = list(table.row_ids())
+        else:
+            row_ids = self._matching_rows(table_name, where_clause)
+        if self.transaction is not None:
+            self.transaction.delta(table_name).delete(row_ids)
+        else:
+            # remove the rows from the collection and the indexing structures
+            self._remove_rows(table_name, row_ids)
+            self._commit()
+            self._compact_if_needed(table_name)
 
         print(f"Row deleted in: {time.time() - now:.5f}s")
-        return f"Row with {column_name} = {matching_value} successfully deleted!"
+        return f"{len(row_ids)} row(s) successfully deleted!"
 
+    @statement
     def update(self, table_name, assignments, where_clause):
         now = time.time()
 
-        if table_name not in self.tables:
-            raise ValueError(f"Table {table_name} does not exist!")
-        table = self.tables[table_name]
+        self._check_table(table_name)
+        table = self._statement_table(table_name)
 
         # if table is empty, then return early
         if not table:
             return "Table is empty!"
 
         # if assignments is not a dictionary, then raise error
-        if not isinstance(assignments, dict) or assignments.items() is None:
+        if not isinstance(assignments, dict) or not assignments:
             raise ValueError(
-                f"Invalid SET: {assignments}. Currently supported format: UPDATE EMPLOYEE SET salary = 150.00 WHERE name = 'John'"
+                f"Invalid SET: {assignments}. Currently supported format: UPDATE EMPLOYEE SET salary = salary * 1.1, dept = 5 WHERE name = 'John'"
             )
-
-        # Extract column and matching value using items()
-        for key, value in assignments.items():
-            set_column = key
-            # flatten and extract matching value
-            if isinstance(value, dict):
-                # if value does not contain "literal" key, then raise error
-                if "literal" not in value:
-                    raise ValueError(
-                        f"Invalid assignments: {assignments}. Currently supported format: UPDATE EMPLOYEE SET salary = 150.00 WHERE name = 'John'"
-                    )
-                value = value["literal"]
-            set_value = value
+        schema = self.table_schemas[table_name]
+        expressions = {}
+        for column, value in assignments.items():
+            if column not in schema:
+                raise ValueError(
+                    f"Column {column} does not exist in table {table_name}!"
+                )
+            expressions[column] = compile_expression(value, table_name, schema)
 
         # if where_clause is None, then update all rows in the table
         if where_clause is None:
-            for row in table:
-                row[set_column] = set_value
+            row_ids = list(table.row_ids())
+        else:
+            row_ids = self._matching_rows(table_name, where_clause)
 
-            print(f"Table updated in: {time.time() - now:.5f}s")
-            return f"All rows successfully updated!"
+        # every SET expression reads the rows as they were before the update, so the new
+        # values are computed one column at a time before any row is changed
+        new_values = {}
+        for column, evaluate in expressions.items():
+            convert = ColumnConverter.from_schema(schema[column])
+            try:
+                new_values[column] = [
+                    convert(evaluate(table, row_id)) for row_id in row_ids
+                ]
+            except (TypeError, ZeroDivisionError) as e:
+                raise ValueError(f"Invalid SET: {assignments}. {e}") from e
+        # the primary keys of a transaction are checked by COMMIT
+        if self.transaction is None:
+            self._check_primary_keys(table_name, row_ids, new_values)
+
+        changes = []
+        for position, row_id in enumerate(row_ids):
+            values = {
+                column: values[position]
+                for column, values in new_values.items()
+                if table.value(row_id, column) != values[position]
+            }
+            if values:
+                changes.append((row_id, values))
+        if self.transaction is not None:
+            self.transaction.delta(table_name).update(changes)
+        else:
+            self._update_rows(table_name, changes)
+            self._commit()
 
-        if "eq" not in where_clause:
+        print(f"Row updated in: {time.time() - now:.5f}s")
+        return f"{len(row_ids)} row(s) successfully updated!"
+
+    def _check_primary_keys(self, table_name, row_ids, new_values):
+        # raise an error if setting the new values of the rows would give two rows the same
+        # primary key, before any row is changed
+        primary_key_columns = self.primary_key_columns(table_name)
+        if table_name not in self.indexing_structures or not any(
+            column in new_values for column in primary_key_columns
+        ):
+            return
+        table = self.tables[table_name]
+        tree = self.indexing_structures[table_name]
+        updated = set(row_ids)
+        keys = set()
+        for position, row_id in enumerate(row_ids):
+            row = {
+                column: (
+                    new_values[column][position]
+                    if column in new_values
+                    else table.value(row_id, column)
+                )
+                for column in primary_key_columns
+            }
+            key = self.primary_key_value(table_name, row)
+            # the key may belong to a row whose key is changed by the same update
+            owner = tree.get(key)
+            if key in keys or (owner is not None and owner not in updated):
+                raise ValueError(f"Duplicate primary key: {key}")
+            keys.add(key)
+
+    def begin(self):
+        """
+        Open a transaction: until commit or rollback, INSERT, UPDATE and DELETE change the
+        rows of the transaction (see Transaction) instead of the tables, and the queries of
+        the calling thread read them. The statements of the other threads wait for the
+        transaction to end, while their queries keep reading the committed rows.
+
+        The transaction is ended by the thread that opened it.
+        """
+        if self.current_transaction() is not None:
+            raise ValueError("A transaction is already open!")
+        self.write_lock.acquire()
+        self.transaction = Transaction(self)
+        return self.transaction
+
+    def _check_no_transaction(self):
+        # the tables, views and indexes are created and dropped, and CSV files loaded,
+        # outside of transactions, which ROLLBACK could not undo
+        if self.current_transaction() is not None:
+            raise ValueError("Commit or roll back the open transaction first!")
+
+    def current_transaction(self):
+        # the transaction of the calling thread, if it opened one
+        transaction = self.transaction
+        if transaction is not None and transaction.thread == threading.get_ident():
+            return transaction
+        return None
+
+    def commit(self):
+        """
+        Apply the changes of the open transaction. The rows of every changed table are
+        checked for duplicates once, as of the end of the transaction, and the table is then
+        changed by a single batch of deletes, one of updates and one of inserts, each with
+        its index updates. A duplicate rolls the whole transaction back. The changes are
+        written to the write-ahead log as one commit, and the queries read all of them at
+        once.
+        """
+        transaction = self.current_transaction()
+        if transaction is None:
+            raise ValueError("No transaction is open!")
+        self.transaction = None
+        try:
+            return self._apply_transaction(transaction)
+        finally:
+            self.write_lock.release()
+
+    def rollback(self):
+        # the changes of a transaction are only in its deltas
+        if self.current_transaction() is None:
+            raise ValueError("No transaction is open!")
+        self.transaction = None
+        self.write_lock.release()
+        return "Transaction rolled back!"
+
+    @statement
+    def _apply_transaction(self, transaction):
+        now = time.time()
+
+        deltas = {
+            table_name: delta
+            for table_name, delta in transaction.deltas.items()
+            if delta.changed()
+        }
+        for table_name, delta in deltas.items():
+            if self.tables.get(table_name) is not delta.table:
+                raise ValueError(
+                    f"Table {table_name} was dropped during the transaction. Transaction rolled back!"
+                )
+            duplicate = self._find_transaction_duplicate(table_name, delta)
+            if duplicate:
+                raise ValueError(f"{duplicate}. Transaction rolled back!")
+
+        counts = Counter()
+        for table_name, delta in deltas.items():
+            # the rows are deleted first and updated next, which frees the primary keys
+            # that the updated and inserted rows take
+            row_ids = delta.deleted_rows()
+            if row_ids and len(row_ids) == len(delta.table):
+                self._clear_table(table_name)
+            elif row_ids:
+                self._remove_rows(table_name, row_ids)
+            changes = delta.updated_rows()
+            if changes:
+                self._update_rows(table_name, changes)
+            batch = delta.inserted_columns()
+            rows = len(next(iter(batch.values())))
+            if rows:
+                self._log("extend", table_name, batch)
+                self._add_columns(table_name, batch)
+            counts.update(deleted=len(row_ids), updated=len(changes), inserted=rows)
+        self._commit()
+        for table_name, delta in deltas.items():
+            if delta.removed:
+                self._compact_if_needed(table_name)
+
+        print(f"Transaction committed in: {time.time() - now:.5f}s")
+        return (
+            f"Transaction committed: {counts['inserted']} row(s) inserted, "
+            f"{counts['updated']} updated, {counts['deleted']} deleted!"
+        )
+
+    def _find_transaction_duplicate(self, table_name, delta):
+        # bulk version of _find_duplicate and _check_primary_keys for the rows of a table as
+        # of the end of a transaction: the updated and inserted rows conflict with each
+        # other and with the rows of the table they leave as they are
+        if table_name in self.indexing_structures:
+            tree = self.indexing_structures[table_name]
+            primary_key_columns = self.primary_key_columns(table_name)
+            # the rows whose primary key changed, which free their previous key
+            rekeyed = {
+                row_id
+                for row_id, values in delta.updated_rows()
+                if any(column in values for column in primary_key_columns)
+            }
+            freed = rekeyed.union(delta.deleted_rows())
+            keys = {}
+            for row_id in [*rekeyed, *range(delta.start, delta.size)]:
+                if row_id in delta.removed:
+                    continue
+                row = delta.row(row_id)
+                key = self.primary_key_value(table_name, row)
+                owner = keys.get(key)
+                if owner is None:
+                    owner = tree.get(key)
+                    if owner in freed:
+                        owner = None
+                if owner is not None:
+                    if delta.row(owner) == row:
+                        return f"Duplicate row: {row}"
+                    return f"Duplicate primary key: {key}"
+                keys[key] = row_id
+            return None
+
+        # the duplicate rows are only found among the inserted rows, as by the statements
+        fingerprints = self.row_fingerprints[table_name]
+        changed = Counter()
+        for row_id in delta.deleted_rows():
+            changed[self._row_fingerprint(table_name, delta.table.row(row_id))] -= 1
+        for row_id, _ in delta.updated_rows():
+            changed[self._row_fingerprint(table_name, delta.table.row(row_id))] -= 1
+            changed[self._row_fingerprint(table_name, delta.row(row_id))] += 1
+        inserted = set()
+        for row_id in range(delta.start, delta.size):
+            if row_id in delta.removed:
+                continue
+            row = delta.row(row_id)
+            fingerprint = self._row_fingerprint(table_name, row)
+            if (
+                fingerprint in inserted
+                or fingerprints[fingerprint] + changed[fingerprint] > 0
+            ):
+                return f"Duplicate row: {row}"
+            inserted.add(fingerprint)
+        return None
+
+    @statement
+    def drop_table(self, table_name):
+        now = time.time()
+
+        self._check_no_transaction()
+        if table_name in self.views:
             raise ValueError(
-                f"Invalid where clause: {where_clause}. Currently supported format: UPDATE EMPLOYEE SET salary = 150.00 WHERE name = 'John'"
+                f"{table_name} is a materialized view, drop it with DROP MATERIALIZED VIEW"
             )
+        self._drop_table(table_name)
 
-        column_name, matching_value = self.parse_where(where_clause)
+        print(f"Table dropped in: {time.time() - now:.5f}s")
 
-        # find row in tables[table_name] that matches the column name and matching value
-        for row in table:
-            if row[column_name] == matching_value:
-                row[set_column] = set_value
+    @statement
+    def drop_materialized_view(self, view_name):
+        now = time.time()
 
-                # if indexing structure exists, then update the row in the indexing structure
-                if table_name in self.indexing_structures:
-                    # extract primary key column name and value
-                    primary_key_column = next(
-                        column
-                        for column in row
-                        if "primary_key" in self.table_schemas[table_name][column]
-                    )
-                    primary_key_value = row[primary_key_column]
+        self._check_no_transaction()
+        if view_name not in self.views:
+            raise ValueError(f"Materialized view {view_name} does not exist!")
+        self._drop_table(view_name)
 
-                    self.indexing_structures[table_name][primary_key_value][
-                        set_column
-                    ] = set_value
+        print(f"Materialized view dropped in: {time.time() - now:.5f}s")
 
-        print(f"Row updated in: {time.time() - now:.5f}s")
-        return f"Successfully updated row with {set_column} = {set_value}"
-
-    def parse_where(self, where_clause):
-        # Only support equality condition for now
-        equality_condition = where_clause["eq"]
-        # extract column name from equality condition array
-        column_name = equality_condition[0]
-        # flatten and extract matching value from equality condition array
-        if isinstance(equality_condition[1], dict):
-            # if value does not contain "literal" key, then raise error
-            if "literal" not in equality_condition[1]:
+    def _drop_table(self, table_name):
+        # drop a table or a view along with its indexes and statistics
+        for view in self.views.values():
+            if table_name in view.table_names:
                 raise ValueError(
-                    f"Invalid where clause: {where_clause}. Currently supported type: string literal and number"
+                    f"Table {table_name} is read by materialized view {view.name}, drop the view first!"
                 )
-            equality_condition[1] = equality_condition[1]["literal"]
-        matching_value = equality_condition[1]
+        self.views.pop(table_name, None)
+        del self.tables[table_name]
+        del self.table_schemas[table_name]
+        self.row_fingerprints.pop(table_name, None)
+        del self.secondary_indexes[table_name]
+        del self.statistics[table_name]
+        if table_name in self.indexing_structures:
+            del self.indexing_structures[table_name]
+        self.dirty_tables.discard(table_name)
+        # the version is kept, so that a table created again with the same name does not
+        # match the cached results of the dropped one
+        self.table_versions[table_name] += 1
+        self._schema_changed()
+        self.flush()
+
+    @statement
+    def create_index(self, index_definition):
+        now = time.time()
 
-        return column_name, matching_value
+        self._check_no_transaction()
+        index_name = index_definition["name"]
+        table_name = index_definition["table"]
+        columns = index_definition["columns"]
 
-    def drop_table(self, table_name):
+        if table_name not in self.tables:
+            raise ValueError(f"Table {table_name} does not exist!")
+        if self.find_index(index_name) is not None:
+            raise ValueError(f"Index {index_name} already exists!")
+        # only single column indexes are supported, e.g. CREATE INDEX idx ON t (column)
+        if isinstance(columns, list):
+            if len(columns) != 1:
+                raise ValueError(
+                    f"Invalid index columns: {columns}. Currently supported format: CREATE INDEX idx ON EMPLOYEE (dept)"
+                )
+            columns = columns[0]
+        if columns not in self.table_schemas[table_name]:
+            raise ValueError(f"Column {columns} does not exist in {table_name}!")
+
+        index = SecondaryIndex(index_name, table_name, columns)
+        index.build(self.tables[table_name])
+        self.secondary_indexes[table_name][index_name] = index
+        self.dirty_tables.add(table_name)
+        self._schema_changed()
+        self.flush()
+
+        print(f"Index created in: {time.time() - now:.5f}s")
+        return index_name
+
+    @statement
+    def drop_index(self, index_name):
         now = time.time()
 
-        del self.tables[table_name]
-        del self.table_schemas[table_name]
+        self._check_no_transaction()
+        index = self.find_index(index_name)
+        if index is None:
+            raise ValueError(f"Index {index_name} does not exist!")
+        del self.secondary_indexes[index.table_name][index_name]
+        self.dirty_tables.add(index.table_name)
+        self._schema_changed()
+        self.flush()
+
+        print(f"Index dropped in: {time.time() - now:.5f}s")
+
+    def read_view(self):
+        # the committed version of the database for a query, to be closed once it is read
+        return ReadView(self)
+
+    def _publish(self):
+        # the version of the statement that returns becomes the committed one, which the
+        # queries starting from now on read
+        self.commit_version += 1
+        self.committed = (
+            self.commit_version,
+            {
+                table_name: (table, table.size)
+                for table_name, table in self.tables.items()
+            },
+        )
+        self._discard_history()
+
+    def collect_garbage(self, blocking=True):
+        """
+        Discard the previous values of the rows that no open ReadView reads any more, those
+        of the changes made up to the oldest version still read. Every statement collects
+        when it returns, and so does a view when it is closed, unless a statement is running:
+        a view does not wait for it. The tables replaced by a compaction or emptied by DELETE
+        without WHERE are freed with the last view reading them.
+        """
+        if not self.write_lock.acquire(blocking=blocking):
+            return
+        try:
+            self._discard_history()
+        finally:
+            self.write_lock.release()
+
+    def _discard_history(self):
+        with self.read_view_lock:
+            oldest = min(self.read_views.values(), default=self.commit_version)
+        for table in self.tables.values():
+            if table.history:
+                table.discard_history(oldest)
+
+    def _table_changed(self, table_name):
+        self.dirty_tables.add(table_name)
+        # the cached results of the queries reading the table are stale
+        self.table_versions[table_name] += 1
+
+    def _schema_changed(self):
+        self.schema_version += 1
+        # the plans of the previous versions can no longer be used
+        self.plan_cache.clear()
+
+    def find_index(self, index_name):
+        # index names are unique across the database, like in PostgreSQL
+        for indexes in self.secondary_indexes.values():
+            if index_name in indexes:
+                return indexes[index_name]
+        return None
+
+    @statement
+    def flush(self):
+        """
+        Write the tables changed since the last flush and the catalog to the directory of a
+        file-backed database. Does nothing for an in-memory database.
+
+        Every table is stored in its own directory, tables/<table name>.<generation>, with
+        its column files (see ColumnarTable.save), its primary key index or row fingerprints
+        and its secondary indexes. A changed table is written to a new generation and the
+        catalog, which holds the schemas, statistics and generation of every table, replaces
+        the previous one only once every table is written. A crash during a flush therefore
+        leaves the database as of the previous flush.
+
+        A flush is a checkpoint: the catalog records the sequence number of the last commit
+        of the write-ahead log it includes, and the log is emptied.
+        """
+        if self.directory is None:
+            return
+        if self.wal is not None:
+            self.wal.commit()
+
+        # row ids only change at a checkpoint, see _compact_if_needed
+        for table_name in list(self.dirty_tables):
+            if self._needs_compaction(table_name):
+                self._compact_table(table_name)
+
+        for table_name in self.dirty_tables:
+            generation = self.table_files.get(table_name, (0, None))[0] + 1
+            path = self._table_directory(table_name, generation)
+            # left over by a flush that did not complete
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path)
+            storage = self._write_table(table_name, path)
+            self.table_files[table_name] = (generation, storage)
+        self.dirty_tables.clear()
+
+        catalog = {
+            "log_sequence": self.wal.sequence if self.wal is not None else 0,
+            "tables": {},
+        }
+        for table_name in self.table_schemas:
+            generation, storage = self.table_files[table_name]
+            catalog["tables"][table_name] = self._catalog_entry(table_name, storage)
+            catalog["tables"][table_name]["generation"] = generation
+        catalog_path = os.path.join(self.directory, CATALOG_FILE)
+        with open(catalog_path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(catalog, file)
+        os.replace(catalog_path + ".tmp", catalog_path)
+        if self.wal is not None:
+            self.wal.truncate()
+
+        # remove the previous generations and the dropped tables
+        for table_name in list(self.table_files):
+            if table_name not in self.tables:
+                del self.table_files[table_name]
+        current = {
+            f"{table_name}.{generation}"
+            for table_name, (generation, _) in self.table_files.items()
+        }
+        for entry in os.listdir(os.path.join(self.directory, "tables")):
+            if entry not in current:
+                shutil.rmtree(
+                    os.path.join(self.directory, "tables", entry), ignore_errors=True
+                )
+
+    def _write_table(self, table_name, path):
+        # write the files of a table to an empty directory, returns the description of
+        # its column files
+        storage = self.tables[table_name].save(path)
         if table_name in self.indexing_structures:
-            del self.indexing_structures[table_name]
+            save_tree(
+                self.indexing_structures[table_name],
+                os.path.join(path, "primary.index"),
+            )
+        else:
+            with open(os.path.join(path, "fingerprints"), "wb") as file:
+                pickle.dump(
+                    self.row_fingerprints[table_name], file, pickle.HIGHEST_PROTOCOL
+                )
+        for index_name, index in self.secondary_indexes[table_name].items():
+            save_tree(index.tree, os.path.join(path, f"{index_name}.index"))
+        if table_name in self.views:
+            with open(os.path.join(path, "view.state"), "wb") as file:
+                pickle.dump(
+                    self.views[table_name].groups, file, pickle.HIGHEST_PROTOCOL
+                )
+        return storage
+
+    def _catalog_entry(self, table_name, storage):
+        entry = {
+            "schema": self.table_schemas[table_name],
+            "storage": storage,
+            "indexes": {
+                index_name: index.column
+                for index_name, index in self.secondary_indexes[table_name].items()
+            },
+            "statistics": self.statistics[table_name].dump(),
+        }
+        if table_name in self.views:
+            entry["view"] = self.views[table_name].sql
+        return entry
+
+    @statement
+    def save_snapshot(self, path):
+        """
+        Save the tables, indexes and statistics of the database to a snapshot file, see
+        write_snapshot. A file-backed database is flushed first and its table files are
+        packed as they are; the tables of an in-memory database are written to a temporary
+        directory first.
+        """
+        now = time.time()
+        self.flush()
+        with tempfile.TemporaryDirectory() as scratch:
+            catalog = {"tables": {}}
+            table_directories = {}
+            for table_name in self.table_schemas:
+                if self.directory is None:
+                    table_directory = os.path.join(scratch, table_name)
+                    os.makedirs(table_directory)
+                    storage = self._write_table(table_name, table_directory)
+                else:
+                    generation, storage = self.table_files[table_name]
+                    table_directory = self._table_directory(table_name, generation)
+                catalog["tables"][table_name] = self._catalog_entry(table_name, storage)
+                table_directories[table_name] = table_directory
+            write_snapshot(path, catalog, table_directories)
+
+        print(f"Database saved in: {time.time() - now:.5f}s")
+
+    @classmethod
+    def restore_snapshot(cls, path, directory):
+        """
+        Create a file-backed database in directory from a snapshot written by save_snapshot.
+        The table files are copied from the snapshot and opened like the files of any other
+        database, so no value is converted and no index is built again.
+        """
+        now = time.time()
+        if os.path.exists(os.path.join(directory, CATALOG_FILE)):
+            raise ValueError(f"A database already exists in {directory}")
+        created = not os.path.exists(directory)
+        # left over by a restore that did not complete
+        cls._remove_restored_files(directory)
+
+        try:
+            catalog = read_snapshot(
+                path,
+                lambda table_name: os.path.join(directory, "tables", f"{table_name}.1"),
+            )
+            for table_name, entry in catalog["tables"].items():
+                cls._check_catalog_entry(path, table_name, entry)
+                entry["generation"] = 1
+            catalog["log_sequence"] = 0
+            # the catalog is written last, so a database is only opened once it is complete
+            catalog_path = os.path.join(directory, CATALOG_FILE)
+            with open(catalog_path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(catalog, file)
+            os.replace(catalog_path + ".tmp", catalog_path)
+            database = cls(directory)
+        except Exception as e:
+            # a directory left with a catalog would be opened as a database
+            if created:
+                shutil.rmtree(directory, ignore_errors=True)
+            else:
+                cls._remove_restored_files(directory)
+            if isinstance(e, ValueError):
+                raise
+            raise ValueError(f"Snapshot {path} cannot be restored: {e!r}") from e
+
+        print(f"Database restored in: {time.time() - now:.5f}s")
+        return database
+
+    @staticmethod
+    def _remove_restored_files(directory):
+        shutil.rmtree(os.path.join(directory, "tables"), ignore_errors=True)
+        for file_name in (CATALOG_FILE, CATALOG_FILE + ".tmp", LOG_FILE):
+            if os.path.exists(os.path.join(directory, file_name)):
+                os.remove(os.path.join(directory, file_name))
+
+    @staticmethod
+    def _check_catalog_entry(path, table_name, entry):
+        # the catalog entry of a table of a snapshot holds what _open_files reads
+        schema = entry.get("schema")
+        storage = entry.get("storage")
+        indexes = entry.get("indexes")
+        statistics = entry.get("statistics")
+        valid = (
+            isinstance(schema, dict)
+            and schema
+            and all(
+                isinstance(definition, dict) and "type" in definition
+                for definition in schema.values()
+            )
+            and isinstance(storage, dict)
+            and isinstance(storage.get("size"), int)
+            and storage["size"] >= 0
+            and isinstance(storage.get("columns"), list)
+            and len(storage["columns"]) == len(schema)
+            and all(
+                column_format in ("array", "strings", "pickle")
+                for column_format in storage["columns"]
+            )
+            and isinstance(indexes, dict)
+            and all(
+                isinstance(index_name, str)
+                and re.fullmatch(r"\w+", index_name)
+                and column in schema
+                for index_name, column in indexes.items()
+            )
+            and isinstance(statistics, dict)
+            and isinstance(statistics.get("row_count"), int)
+            and isinstance(statistics.get("modifications"), int)
+            and isinstance(statistics.get("columns"), dict)
+            and all(
+                column in schema and isinstance(column_statistics, dict)
+                for column, column_statistics in statistics["columns"].items()
+            )
+            and isinstance(entry.get("view", ""), str)
+        )
+        if not valid:
+            raise ValueError(f"Snapshot {path} is damaged: {table_name}")
+
+    @statement
+    def close(self):
+        # roll back a transaction left open and write the pending changes of a file-backed
+        # database
+        if self.transaction is not None:
+            self.rollback()
+        self.flush()
+        if self.wal is not None:
+            self.wal.close()
+            self.wal = None
+
+    def _open_files(self):
+        # open the tables of a file-backed database, their columns are read on demand
+        now = time.time()
 
-        print(f"Table dropped in: {time.time() - now:.5f}s")
+        os.makedirs(os.path.join(self.directory, "tables"), exist_ok=True)
+        catalog_path = os.path.join(self.directory, CATALOG_FILE)
+        wal = WriteAheadLog(os.path.join(self.directory, LOG_FILE))
+        if not os.path.exists(catalog_path):
+            # a new database
+            self.flush()
+            self.wal = wal
+            return
+        with open(catalog_path, "r", encoding="utf-8") as file:
+            catalog = json.load(file)
+
+        for table_name, entry in catalog["tables"].items():
+            schema = entry["schema"]
+            path = self._table_directory(table_name, entry["generation"])
+            self.table_schemas[table_name] = schema
+            self.tables[table_name] = ColumnarTable.open(schema, path, entry["storage"])
+            # the indexes are loaded when they are first used
+            if self._count_primary_key(schema) > 0:
+                self.indexing_structures[table_name] = StoredTree(
+                    os.path.join(path, "primary.index")
+                )
+            else:
+                with open(os.path.join(path, "fingerprints"), "rb") as file:
+                    self.row_fingerprints[table_name] = pickle.load(file)
+            self.secondary_indexes[table_name] = {}
+            for index_name, column in entry["indexes"].items():
+                index = SecondaryIndex(index_name, table_name, column)
+                index.tree = StoredTree(os.path.join(path, f"{index_name}.index"))
+                self.secondary_indexes[table_name][index_name] = index
+            self.statistics[table_name] = TableStatistics.restore(
+                self.tables[table_name], entry["statistics"]
+            )
+            self.table_files[table_name] = (entry["generation"], entry["storage"])
+
+        # the views are planned once all the tables they read are open
+        for table_name, entry in catalog["tables"].items():
+            if "view" not in entry:
+                continue
+            view = MaterializedView(table_name, entry["view"], self)
+            path = self._table_directory(table_name, entry["generation"])
+            with open(os.path.join(path, "view.state"), "rb") as file:
+                view.groups = pickle.load(file)
+            self.views[table_name] = view
+
+        # redo the changes committed since the last checkpoint, which are still in the log
+        checkpoint = catalog.get("log_sequence", 0)
+        replayed = 0
+        for sequence, records in wal.read():
+            if sequence <= checkpoint:
+                continue
+            for record in records:
+                self._replay(record)
+            replayed += len(records)
+        wal.sequence = max(wal.sequence, checkpoint)
+        self.wal = wal
+        if replayed:
+            print(f"Replayed {replayed} changes from the write-ahead log")
+
+        print(f"Database opened in: {time.time() - now:.5f}s")
+
+    def _table_directory(self, table_name, generation):
+        return os.path.join(self.directory, "tables", f"{table_name}.{generation}")
@@ -0,0 +1,211 @@
+import csv
+import io
+import os
+from decimal import Context, Decimal, InvalidOperation
+from itertools import islice
+
+# number of CSV rows read, converted and appended to a table at once by LOAD DATA
+LOAD_BATCH_SIZE = 50000
+# size of the read buffer of the CSV file
+LOAD_BUFFER_SIZE = 1 << 20
+# size of the byte ranges converted by the worker processes of a parallel LOAD DATA
+PARALLEL_CHUNK_SIZE = 4 << 20
+
+BOOLEAN_VALUES = {
+    "true": True,
+    "1": True,
+    "t": True,
+    "y": True,
+    "yes": True,
+    "false": False,
+    "0": False,
+    "f": False,
+    "n": False,
+    "no": False,
+}
+
+
+class ColumnConverter:
+    """
+    Converts values to the type of a column. The conversion is compiled once from the column
+    schema, so loading a column does not look up the schema for every value.
+
+    None, empty and whitespace values are NULL: they become None if the column is nullable
+    and not part of the primary key, and raise a ValueError otherwise.
+    """
+
+    def __init__(self, data_type, nullable=True, primary_key=False):
+        self.data_type = data_type
+        self.null_allowed = nullable and not primary_key
+        self.parse = _value_parser(data_type)
+
+    @classmethod
+    def from_schema(cls, column_schema):
+        return cls(
+            column_schema["type"],
+            column_schema.get("nullable", True),
+            column_schema.get("primary_key", False),
+        )
+
+    def __call__(self, value):
+        if value is None or value == "" or (isinstance(value, str) and value.isspace()):
+            if self.null_allowed:
+                return None
+            raise ValueError(
+                f"Column cannot be null. Failed to convert to {self.data_type}"
+            )
+        return self.parse(value)
+
+    def convert_column(self, values):
+        # convert the strings of a CSV column, raises ValueError if any value is invalid
+        if self.parse is str:
+            if "" not in values and not any(map(str.isspace, values)):
+                return list(values)
+        else:
+            try:
+                # every parser rejects empty and whitespace strings, so a column without
+                # NULLs is converted in a single pass
+                return list(map(self.parse, values))
+            except ValueError:
+                pass
+        if not self.null_allowed:
+            return list(map(self, values))
+        parse = self.parse
+        return [
+            None if not value or value.isspace() else parse(value) for value in values
+        ]
+
+
+def _value_parser(data_type):
+    if data_type == "int":
+        return int
+    elif data_type == "float":
+        return float
+    elif data_type == "boolean":
+        return _parse_boolean
+    elif isinstance(data_type, dict) and "decimal" in data_type:
+        precision, scale = data_type["decimal"]
+        return _decimal_parser(precision, scale)
+    # varchar and every other data type are stored as strings
+    return str
+
+
+def _parse_boolean(value):
+    if isinstance(value, bool):
+        # e.g. a bound parameter of a prepared statement
+        return value
+    try:
+        return BOOLEAN_VALUES[value]
+    except (KeyError, TypeError):
+        raise ValueError(f"Invalid boolean value: {value}")
+
+
+def _decimal_parser(precision, scale):
+    quantum = Decimal("1." + "0" * scale)
+    # a context of the column's own, the precision of the global decimal context is left alone
+    context = Context(prec=precision)
+
+    def parse(value):
+        try:
+            return float(Decimal(value).quantize(quantum, context=context))
+        except InvalidOperation:
+            raise ValueError(
+                f"Invalid value for DECIMAL({precision}, {scale}): {value}"
+            )
+
+    return parse
+
+
+def read_batches(reader, size=LOAD_BATCH_SIZE):
+    # split the rows of a csv.reader into lists of at most size rows
+    while True:
+        rows = list(islice(reader, size))
+        if not rows:
+            return
+        yield rows
+
+
+def convert_batch(rows, header, converters):
+    """
+    Convert a batch of CSV rows into {column: list of values}, one column at a time.
+
+    Returns the columns and the rows that cannot be converted, as (row, error) pairs where the
+    row is a dictionary of its CSV values. Blank lines are skipped.
+    """
+    if set(map(len, rows)) == {len(header)}:
+        try:
+            return {
+                column: converters[column].convert_column(values)
+                for column, values in zip(header, zip(*rows))
+            }, []
+        except ValueError:
+            pass
+
+    # some rows are invalid, so convert row by row to find and skip them
+    converted, errors = [], []
+    for row in rows:
+        if not row:
+            continue
+        if len(row) != len(header):
+            errors.append(
+                (
+                    dict(zip(header, row)),
+                    f"Expected {len(header)} values, found {len(row)}",
+                )
+            )
+            continue
+        try:
+            converted.append(
+                [converters[column](value) for column, value in zip(header, row)]
+            )
+        except ValueError as e:
+            errors.append((dict(zip(header, row)), e))
+
+    columns = {column: [] for column in header}
+    for column, values in zip(header, zip(*converted)):
+        columns[column] = list(values)
+    return columns, errors
+
+
+def split_chunks(csv_filename, start, processes):
+    """
+    Split a CSV file from byte offset start to its end into byte ranges (start, end) that
+    begin and end on row boundaries, for the worker processes of a parallel LOAD DATA.
+
+    Rows are assumed to end at every line break, so quoted values spanning several lines
+    are not supported in parallel.
+    """
+    size = os.path.getsize(csv_filename)
+    count = max(processes, -(-(size - start) // PARALLEL_CHUNK_SIZE))
+    boundaries = [start]
+    with open(csv_filename, "rb") as file:
+        for chunk in range(1, count):
+            offset = start + (size - start) * chunk // count
+            # move to the start of the next row
+            file.seek(max(offset - 1, boundaries[-1]))
+            file.readline()
+            if boundaries[-1] < file.tell() < size:
+                boundaries.append(file.tell())
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def convert_chunk(csv_filename, header, schema, chunk):
+    # read and convert the rows of a byte range in a worker process, see convert_batch
+    start, end = chunk
+    with open(csv_filename, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode("utf-8")
+    converters = {
+        column: ColumnConverter.from_schema(schema[column]) for column in header
+    }
+    reader = csv.reader(io.StringIO(text, newline=""))
+
+    # convert in batches, so that an invalid row only slows down the conversion of its batch
+    columns, errors = {column: [] for column in header}, []
+    for rows in read_batches(reader, LOAD_BATCH_SIZE):
+        batch_columns, batch_errors = convert_batch(rows, header, converters)
+        for column, values in batch_columns.items():
+            columns[column] += values
+        errors += batch_errors
+    return columns, errors
@@ -1,29 +1,242 @@
-from sqlglot.executor.python import PythonExecutor
-from sqlglot.executor.table import Table, ensure_tables
+import math
+
+from sqlglot import exp, planner
+from sqlglot.executor.python import Python, PythonExecutor
+from sqlglot.executor.table import RowReader, Table, ensure_tables
+
+import vectorized
+from cost_model import CostModel
+from vectorized import SelectedRows, Unsupported
+
+# join algorithms in order of preference when their estimated costs are equal
+JOIN_ALGORITHMS = ("index", "index_source", "merge", "hash", "nested_loop")
+
+
+class ParameterPython(Python):
+    class Generator(Python.Generator):
+        # the parameters of a prepared statement, :1, :2, ..., are read from the PARAMETERS
+        # tuple of the executor environment, so a plan is compiled without their values
+        TRANSFORMS = {
+            **Python.Generator.TRANSFORMS,
+            exp.Placeholder: lambda self, e: f"PARAMETERS[{int(e.name) - 1}]",
+        }
+
+
+class IndexedScan(Table):
+    """
+    Scan of a base table that is not materialized.
+
+    The rows of the scan are fetched one key at a time by probing the primary key B-tree of the
+    table, so a join against it only reads the rows matching the keys of the other side.
+    """
+
+    def __init__(self, columns, probe):
+        super().__init__(columns)
+        self.probe = probe
+
+
+def base_scan(step, name):
+    # the scan reading the base table behind the side name of a join step, None if the side
+    # is not a base table (e.g. a subquery)
+    scan = next((d for d in step.dependencies if d.name == name), None)
+    # follow the scans that only pass the rows of a CTE through
+    while (
+        isinstance(scan, planner.Scan)
+        and len(scan.dependencies) == 1
+        and not scan.projections
+        and not scan.condition
+    ):
+        scan = next(iter(scan.dependencies))
+    if (
+        not isinstance(scan, planner.Scan)
+        or scan.dependencies
+        or not isinstance(scan.source, exp.Table)
+    ):
+        return None
+    return scan
+
+
+def base_column(scan, column):
+    # the column of the base table a column of the scan output is projected from
+    if not scan.projections:
+        return column
+    for projection in scan.projections:
+        if projection.alias_or_name == column:
+            expression = projection.unalias()
+            return expression.name if isinstance(expression, exp.Column) else None
+    return None
+
+
+def primary_key_scan(step, name, key, indexes):
+    # the base table scan feeding the side name of a join step if key is the single attribute
+    # primary key of that table, None otherwise
+    if len(key) != 1 or not isinstance(key[0], exp.Column):
+        return None
+    scan = base_scan(step, name)
+    if (
+        scan is None
+        or len(scan.dependents) != 1
+        or scan.limit != math.inf
+        or scan.source.name not in indexes
+    ):
+        return None
+    if base_column(scan, key[0].name) != indexes[scan.source.name][0]:
+        return None
+    return scan
+
+
+def key_tables(expression):
+    # names of the tables whose columns are referenced by expression
+    return {column.table for column in expression.find_all(exp.Column)}
+
+
+def sort_order(keys):
+    # ((table, column), ...) of a list of join or ORDER BY keys, None if a key is not a column
+    order = []
+    for key in keys:
+        if isinstance(key, exp.Ordered):
+            # only ascending orders can be satisfied by a B-tree
+            if key.args.get("desc"):
+                return None
+            key = key.this
+        if not isinstance(key, exp.Column) or not key.table:
+            return None
+        order.append((key.table, key.name))
+    return tuple(order)
+
+
+def satisfies(sorted_by, order):
+    # sorted_by lists the orders rows are known to be sorted in, an order (a, b) also
+    # satisfies its prefix (a)
+    return bool(order) and any(
+        sorted_order[: len(order)] == order for sorted_order in sorted_by
+    )
+
+
+def is_sorted(table, order):
+    return satisfies(getattr(table, "sorted_by", ()), order)
+
+
+class JoinedTable(Table):
+    """
+    One of the tables of the output of a join, which all share the joined rows and read their
+    own range of columns.
+
+    Columns added to the rows, e.g. the operands of an aggregate, are read without a table,
+    so they do not extend the column range like in Table.add_columns: the range of a table
+    would otherwise cover the first columns of the next table, and a column of that table
+    with the same name, e.g. id, would hide its own.
+    """
+
+    def add_columns(self, *columns):
+        self.columns += columns
+        self.reader = RowReader(self.columns, self.column_range)
 
 
 class MergeJoinPythonExecutor(PythonExecutor):
+    def __init__(self, env=None, tables=None, indexes=None):
+        super().__init__(env=env, tables=tables)
+        self.generator = ParameterPython().generator(identify=True, comments=False)
+        # primary key indexes of the base tables: {table name: (key column, tree, table)}
+        self.indexes = indexes or {}
+        # join order and algorithms of every join step: {step: (source, [(name, join, algorithm)])}
+        self.join_plans = {}
+        # base table scans whose rows come in key order:
+        # {scan: (key column of the scan output, True if read from the primary key B-tree)}
+        self.ordered_scans = {}
+
+    def execute(self, plan):
+        self.plan_joins(plan)
+        return super().execute(plan)
+
+    def plan_joins(self, plan):
+        self.join_plans = {
+            node: self.plan_join(node)
+            for node in plan.dag
+            if isinstance(node, planner.Join)
+        }
+        self.ordered_scans = {}
+        for step, (source, joins) in self.join_plans.items():
+            for position, (name, join, algorithm) in enumerate(joins):
+                if algorithm != "merge":
+                    continue
+                sides = [(name, join["join_key"])]
+                if position == 0:
+                    sides.append((source, join["source_key"]))
+                for side, key in sides:
+                    ordered_scan = self.ordered_scan(step, side, key)
+                    if ordered_scan:
+                        scan, from_tree = ordered_scan
+                        self.ordered_scans[scan] = (key[0].name, from_tree)
+
+    def plan_join(self, step):
+        # merge every table in the order of the query
+        return step.name, [(name, join, "merge") for name, join in step.joins.items()]
+
+    def ordered_scan(self, step, name, key):
+        # a side joined on the primary key of its table is read from the B-tree in key order
+        scan = primary_key_scan(step, name, key, self.indexes)
+        return (scan, True) if scan else None
+
+    def scan_table(self, step):
+        if not self.ordered_scans.get(step, (None, False))[1]:
+            return super().scan_table(step)
+        _, tree, table = self.indexes[step.source.name]
+        ordered = Table(self.tables.find(step.source).columns)
+        context = self.context({step.source.alias_or_name: ordered})
+
+        # stream the rows in the order of the primary key B-tree, whose values are row ids
+        def table_iter():
+            reader = ordered.reader
+            for row_id in tree.values():
+                reader.row = table.row_tuple(row_id)
+                yield reader
+
+        return context, table_iter()
+
+    def scan(self, step, context):
+        result = super().scan(step, context)
+        if step in self.ordered_scans:
+            # filtering and projecting keep the key order of the scan
+            result.table.sorted_by = [((step.name, self.ordered_scans[step][0]),)]
+        return result
+
+    def sort(self, step, context):
+        if not is_sorted(context.table, sort_order(step.key)):
+            return super().sort(step, context)
+
+        # the rows already come in the requested order, e.x. from a merge join on the key
+        projections = self.generate_tuple(step.projections)
+        sink = self.table(step.projections)
+        for reader, ctx in context:
+            if len(sink) >= step.limit:
+                break
+            sink.append(ctx.eval_tuple(projections))
+        return self.context({step.name: sink})
+
     def join(self, step, context):
-        source = step.name
+        source, joins = self.join_plans[step]
 
         source_table = context.tables[source]
         source_context = self.context({source: source_table})
         column_ranges = {source: range(0, len(source_table.columns))}
 
-        for name, join in step.joins.items():
+        for name, join, algorithm in joins:
             table = context.tables[name]
             start = max(r.stop for r in column_ranges.values())
             column_ranges[name] = range(start, len(table.columns) + start)
             join_context = self.context({name: table})
 
-            table = self.merge_join(join, source_context, join_context)
+            table = self.join_tables(algorithm, join, source_context, join_context)
 
             source_context = self.context(
                 {
-                    name: Table(table.columns, table.rows, column_range)
+                    name: JoinedTable(table.columns, table.rows, column_range)
                     for name, column_range in column_ranges.items()
                 }
             )
+            for joined_table in source_context.tables.values():
+                joined_table.sorted_by = getattr(table, "sorted_by", [])
             condition = self.generate(join["condition"])
             if condition:
                 source_context.filter(condition)
@@ -40,21 +253,34 @@ class MergeJoinPythonExecutor(PythonExecutor):
         if step.projections:
             return self.context({step.name: sink})
         else:
-            return self.context(
+            context = self.context(
                 {
-                    name: Table(table.columns, sink.rows, table.column_range)
+                    name: JoinedTable(table.columns, sink.rows, table.column_range)
                     for name, table in source_context.tables.items()
                 }
             )
+            for name, table in context.tables.items():
+                table.sorted_by = source_context.tables[name].sorted_by
+            return context
+
+    def join_tables(self, algorithm, join, source_context, join_context):
+        return self.merge_join(join, source_context, join_context)
 
     def merge_join(self, _join, source_context, join_context):
         table = Table(source_context.columns + join_context.columns)
 
         source_key = self.generate_tuple(_join["source_key"])
         join_key = self.generate_tuple(_join["join_key"])
+        source_order = sort_order(_join["source_key"])
+        join_order = sort_order(_join["join_key"])
 
-        source_context.sort(source_key)
-        join_context.sort(join_key)
+        # only sort the sides that do not already come in key order
+        if not is_sorted(source_context.table, source_order):
+            source_context.sort(source_key)
+        if not is_sorted(join_context.table, join_order):
+            join_context.sort(join_key)
+        # the joined rows are ordered by the key of either side
+        table.sorted_by = [order for order in (source_order, join_order) if order]
 
         source_iterator = iter(source_context)
         join_iterator = iter(join_context)
@@ -94,70 +320,418 @@ class MergeJoinPythonExecutor(PythonExecutor):
         return table
 
 
-class DefaultPythonExecutor(PythonExecutor):
-    def join(self, step, context):
-        source = step.name
-
-        source_table = context.tables[source]
-        source_context = self.context({source: source_table})
-        column_ranges = {source: range(0, len(source_table.columns))}
-
+class DefaultPythonExecutor(MergeJoinPythonExecutor):
+    """
+    Executor choosing the join order and a join algorithm for every join with a cost model.
+
+    The join sides are estimated from the statistics catalog before anything is scanned, since
+    an index nested loop join or a merge join reading a primary key B-tree changes how the base
+    tables are scanned. Hash and nested loop joins are compared again on the actual sizes.
+    """
+
+    def __init__(self, env=None, tables=None, indexes=None, statistics=None):
+        super().__init__(env=env, tables=tables, indexes=indexes)
+        self.cost_model = CostModel(statistics)
+        # base table scans answered by probing the primary key index
+        self.index_probes = set()
+        # ORDER BY applied to the output of a join step: {step: ((table, column), ...)}
+        self.sort_orders = {}
+
+    def plan_joins(self, plan):
+        self.sort_orders = {
+            dependency: sort_order(node.key)
+            for node in plan.dag
+            if isinstance(node, planner.Sort)
+            for dependency in node.dependencies
+            if isinstance(dependency, planner.Join)
+        }
+        super().plan_joins(plan)
+
+        self.index_probes = set()
+        for step, (source, joins) in self.join_plans.items():
+            for name, join, algorithm in joins:
+                if algorithm == "index":
+                    scan = primary_key_scan(step, name, join["join_key"], self.indexes)
+                elif algorithm == "index_source":
+                    scan = primary_key_scan(
+                        step, source, join["source_key"], self.indexes
+                    )
+                else:
+                    continue
+                self.index_probes.add(scan)
+
+    def plan_join(self, step):
+        # the cheapest of the join order of the query and the greedy join orders
+        rows = {name: self.side_rows(step, name) for name in (step.name, *step.joins)}
+        orders = [(step.name, list(step.joins.items()))]
+        if len(step.joins) > 1 and not any(
+            join.get("side") for join in step.joins.values()
+        ):
+            orders.extend(self.join_orders(step, rows))
+
+        best_cost, best_plan = None, None
+        for source, joins in orders:
+            algorithms, cost = self.plan_algorithms(step, source, joins, rows)
+            if best_cost is None or cost < best_cost:
+                best_cost = cost
+                best_plan = source, [
+                    (name, join, algorithm)
+                    for (name, join), algorithm in zip(joins, algorithms)
+                ]
+        return best_plan
+
+    def side_rows(self, step, name):
+        scan = base_scan(step, name)
+        if scan is None:
+            return self.cost_model.table_rows(None)
+        return self.cost_model.scan_rows(scan.source.name, scan.condition)
+
+    def join_orders(self, step, rows):
+        # inner joins can be done in any order, as long as every join has the tables its keys
+        # refer to; start from every table and greedily add the table with the smallest join
+        pairs = []
         for name, join in step.joins.items():
-            table = context.tables[name]
-            start = max(r.stop for r in column_ranges.values())
-            column_ranges[name] = range(start, len(table.columns) + start)
-            join_context = self.context({name: table})
+            for source_key, join_key in zip(join["source_key"], join["join_key"]):
+                if len(key_tables(source_key)) != 1 or key_tables(join_key) != {name}:
+                    return []
+                pairs.append((source_key, join_key))
+        conditions = [
+            join["condition"] for join in step.joins.values() if join["condition"]
+        ]
+
+        orders = []
+        for start in rows:
+            joined, joins, used = {start}, [], set()
+            estimate = rows[start]
+            while len(joined) < len(rows):
+                candidates = []
+                for name in rows:
+                    if name in joined:
+                        continue
+                    keys = [
+                        (a, b) if key_tables(b) == {name} else (b, a)
+                        for a, b in pairs
+                        if {*key_tables(a), *key_tables(b)} <= joined | {name}
+                        and name in key_tables(a) | key_tables(b)
+                    ]
+                    name_estimate = self.join_estimate(step, estimate, rows[name], keys)
+                    # joins without keys are cross products, so they come last
+                    candidates.append((not keys, name_estimate, name, keys))
+                _, estimate, name, keys = min(candidates, key=lambda c: c[:2])
+                joined.add(name)
+                used.update(id(key) for key in (a for a, _ in keys))
+                joins.append(
+                    (
+                        name,
+                        {
+                            "side": "",
+                            "source_key": [a for a, _ in keys],
+                            "join_key": [b for _, b in keys],
+                            "condition": None,
+                        },
+                    )
+                )
 
-            source_size = len(list(source_context))
-            join_size = len(list(join_context))
+            # the join conditions and the equalities that were not used as keys are applied
+            # as soon as all the tables they refer to have been joined
+            residuals = conditions + [
+                exp.EQ(this=a, expression=b)
+                for a, b in pairs
+                if id(a) not in used and id(b) not in used
+            ]
+            joined = {start}
+            for name, join in joins:
+                joined.add(name)
+                applicable = [c for c in residuals if key_tables(c) <= joined]
+                residuals = [c for c in residuals if not key_tables(c) <= joined]
+                if applicable:
+                    join["condition"] = exp.and_(*applicable)
+
+            if (start, [name for name, _ in joins]) != (step.name, list(step.joins)):
+                orders.append((start, joins))
+        return orders
+
+    def join_estimate(self, step, left_rows, right_rows, keys):
+        # estimated number of rows of a join on the (left key, right key) pairs
+        if not keys:
+            return left_rows * right_rows
+        # the most selective key pair bounds the size of the join
+        return min(
+            self.cost_model.join_rows(
+                left_rows,
+                right_rows,
+                self.key_distinct(step, left_key, left_rows),
+                self.key_distinct(step, right_key, right_rows),
+            )
+            for left_key, right_key in keys
+        )
 
-            smaller_size = min(source_size, join_size)
-            larger_size = max(source_size, join_size)
+    def key_column(self, step, key):
+        # (base table, column) of a join key that is a plain column, None otherwise
+        if not isinstance(key, exp.Column):
+            return None
+        scan = base_scan(step, key.table)
+        if scan is None:
+            return None
+        column = base_column(scan, key.name)
+        return (scan.source.name, column) if column else None
+
+    def key_distinct(self, step, key, rows):
+        key_column = self.key_column(step, key)
+        distinct = self.cost_model.distinct(*key_column) if key_column else None
+        return min(distinct, rows) if distinct else rows
+
+    def can_merge(self, step, source_key, join_key):
+        # merging compares the keys, so they have to be non NULL and of comparable types
+        for keys in zip(source_key, join_key):
+            types = set()
+            for key in keys:
+                key_column = self.key_column(step, key)
+                if key_column is None or self.cost_model.has_nulls(*key_column):
+                    return False
+                if key.type.this in exp.DataType.NUMERIC_TYPES:
+                    types.add("number")
+                elif key.type.this in exp.DataType.TEXT_TYPES:
+                    types.add("text")
+                else:
+                    return False
+            if len(types) != 1:
+                return False
+        return bool(source_key)
+
+    def ordered_scan(self, step, name, key):
+        # a base table stored in the order of the key is already sorted, otherwise a primary
+        # key is read from its B-tree
+        scan = base_scan(step, name)
+        if scan and len(key) == 1 and isinstance(key[0], exp.Column):
+            column = base_column(scan, key[0].name)
+            if column and self.cost_model.is_sorted(scan.source.name, column):
+                return scan, False
+        return super().ordered_scan(step, name, key)
+
+    def plan_algorithms(self, step, source, joins, rows):
+        # the cheapest algorithm of every join of a join order and the total cost
+        cost_model = self.cost_model
+        left_rows = rows[source]
+        sorted_by = []
+        algorithms, total_cost = [], 0
+
+        for position, (name, join) in enumerate(joins):
+            right_rows = rows[name]
+            source_key, join_key = join["source_key"], join["join_key"]
+            side = join.get("side")
+            estimate = self.join_estimate(
+                step, left_rows, right_rows, list(zip(source_key, join_key))
+            )
 
-            # if the size of one table is less than 100
-            # and the size of the other table is less than 10 times the size of the smaller table,
-            # then use nested loop join
+            # scanning a side is part of the cost, except for a side probed by an index join
+            left_scan = self.scan_cost(step, source) if position == 0 else 0
+            right_scan = self.scan_cost(step, name)
+            costs = {
+                "hash": (
+                    left_scan
+                    + right_scan
+                    + cost_model.hash_join_cost(left_rows, right_rows),
+                    [],
+                ),
+            }
+            if not side:
+                costs["nested_loop"] = (
+                    left_scan
+                    + right_scan
+                    + cost_model.nested_loop_cost(left_rows, right_rows),
+                    [],
+                )
+            if side in ("", "LEFT") and primary_key_scan(
+                step, name, join_key, self.indexes
+            ):
+                # the outer rows are probed in order, so their order is kept
+                costs["index"] = (
+                    left_scan + cost_model.index_join_cost(left_rows, right_scan),
+                    sorted_by,
+                )
             if (
-                smaller_size < 100
-                and larger_size < 10 * smaller_size
-                and join.get("side") != "LEFT"
-                and join.get("side") != "RIGHT"
+                position == 0
+                and not side
+                and primary_key_scan(step, source, source_key, self.indexes)
             ):
-                table = self.nested_loop_join(
-                    join, source_context, join_context, source_size, join_size
+                costs["index_source"] = (
+                    right_scan + cost_model.index_join_cost(right_rows, left_scan),
+                    [],
+                )
+            if not side and self.can_merge(step, source_key, join_key):
+                left_sorted = (
+                    self.ordered_scan(step, source, source_key) is not None
+                    if position == 0
+                    else satisfies(sorted_by, sort_order(source_key))
+                )
+                right_sorted = self.ordered_scan(step, name, join_key) is not None
+                costs["merge"] = (
+                    left_scan
+                    + right_scan
+                    + cost_model.merge_join_cost(
+                        left_rows, right_rows, left_sorted, right_sorted
+                    ),
+                    [
+                        order
+                        for order in (sort_order(source_key), sort_order(join_key))
+                        if order
+                    ],
                 )
-            # default to hash join
-            else:
-                table = self.hash_join(join, source_context, join_context)
 
-            source_context = self.context(
-                {
-                    name: Table(table.columns, table.rows, column_range)
-                    for name, column_range in column_ranges.items()
-                }
+            if position == len(joins) - 1 and step in self.sort_orders:
+                # an output already in the order of the ORDER BY does not have to be sorted
+                for algorithm, (cost, output_sorted_by) in costs.items():
+                    if not satisfies(output_sorted_by, self.sort_orders[step]):
+                        costs[algorithm] = (
+                            cost + cost_model.sort_cost(estimate),
+                            output_sorted_by,
+                        )
+
+            algorithm = min(
+                (algorithm for algorithm in JOIN_ALGORITHMS if algorithm in costs),
+                key=lambda algorithm: costs[algorithm][0],
             )
-            condition = self.generate(join["condition"])
-            if condition:
-                source_context.filter(condition)
-
-        if not step.condition and not step.projections:
-            return source_context
+            cost, sorted_by = costs[algorithm]
+            algorithms.append(algorithm)
+            total_cost += cost
+            left_rows = estimate
+        return algorithms, total_cost
+
+    def scan_cost(self, step, name):
+        # a base table is read in full, the size of other sides is only estimated
+        scan = base_scan(step, name)
+        if scan is None:
+            return self.cost_model.table_rows(None)
+        return self.cost_model.table_rows(scan.source.name)
+
+    def scan(self, step, context):
+        if step in self.index_probes:
+            return self.context({step.name: self.index_scan(step)})
+        table = self.vectorized_scan(step, context)
+        if table is not None:
+            return self.context({step.name: table})
+        return super().scan(step, context)
+
+    def vectorized_scan(self, step, context):
+        # filter and project a base table with numpy, None if it is scanned row by row
+        if (
+            not vectorized.VECTORIZED
+            or step in self.ordered_scans
+            or not isinstance(step.source, exp.Table)
+            or (step.source.name or step.source.alias) in context
+        ):
+            return None
+        source = self.tables.find(step.source)
+        selected = vectorized.executor_rows(source)
+        if selected is None:
+            return None
+        table, row_ids = selected
+        try:
+            columns, result = vectorized.scan(
+                table,
+                source.columns,
+                row_ids,
+                step.condition,
+                step.projections,
+                step.limit,
+                self.env.get("PARAMETERS", ()),
+            )
+        except (Unsupported, TypeError, ValueError, OverflowError, IndexError):
+            return None
+        if step.projections:
+            return Table(columns, result)
+        if step.dependents:
+            # the rows are only built if the next step is not vectorized as well
+            return SelectedRows(columns, table, result)
+        return Table(columns, vectorized.materialize(table, table.columns, result))
+
+    def aggregate(self, step, context):
+        values = self.vectorized_aggregate(step, context)
+        if values is None:
+            return super().aggregate(step, context)
+
+        table = self.table(list(step.group) + step.aggregations)
+        if step.limit > 0:
+            table.append(tuple(values))
+        context = self.context(
+            {step.name: table, **{name: table for name in context.tables}}
+        )
+        if step.projections or step.condition:
+            return self.scan(step, context)
+        return context
+
+    def vectorized_aggregate(self, step, context):
+        # the aggregations without GROUP BY of a vectorized scan, None if they are computed
+        # row by row
+        if step.group or len(context.tables) != 1:
+            return None
+        selected = context.table
+        if not isinstance(selected, SelectedRows):
+            return None
+        try:
+            return vectorized.aggregate(
+                selected.table,
+                selected.columns,
+                selected.row_ids,
+                step.aggregations,
+                step.operands,
+                self.env.get("PARAMETERS", ()),
+            )
+        except (Unsupported, TypeError, ValueError, OverflowError, IndexError):
+            return None
 
-        sink = self._project_and_filter(
-            source_context,
-            step,
-            (reader for reader, _ in iter(source_context)),
+    def index_scan(self, step):
+        _, tree, table = self.indexes[step.source.name]
+        scan_context = self.context(
+            {step.source.alias_or_name: Table(self.tables.find(step.source).columns)}
+        )
+        condition = self.generate(step.condition)
+        projections = self.generate_tuple(step.projections)
+
+        def probe(key):
+            try:
+                row_id = tree.get(key[0])
+            except TypeError:
+                # the key cannot be compared with the keys of the index, so nothing matches
+                return []
+            if row_id is None:
+                return []
+            row = table.row_tuple(row_id)
+            scan_context.set_row(row)
+            if condition and not scan_context.eval(condition):
+                return []
+            if projections:
+                return [scan_context.eval_tuple(projections)]
+            return [row]
+
+        return IndexedScan(
+            [projection.alias_or_name for projection in step.projections]
+            or scan_context.columns,
+            probe,
         )
 
-        if step.projections:
-            return self.context({step.name: sink})
-        else:
-            return self.context(
-                {
-                    name: Table(table.columns, sink.rows, table.column_range)
-                    for name, table in source_context.tables.items()
-                }
+    def join_tables(self, algorithm, join, source_context, join_context):
+        # probe the primary key index of one side instead of building anything
+        if algorithm == "index" and isinstance(join_context.table, IndexedScan):
+            return self.index_join(join, source_context, join_context)
+        if algorithm == "index_source" and isinstance(
+            source_context.table, IndexedScan
+        ):
+            return self.index_join(join, join_context, source_context, False)
+        if algorithm == "merge":
+            return self.merge_join(join, source_context, join_context)
+
+        # the sizes of both sides are known now, so compare the costs on the actual sizes
+        source_size = len(source_context.table.rows)
+        join_size = len(join_context.table.rows)
+        if not join.get("side") and self.cost_model.nested_loop_cost(
+            source_size, join_size
+        ) < self.cost_model.hash_join_cost(source_size, join_size):
+            return self.nested_loop_join(
+                join, source_context, join_context, source_size, join_size
             )
+        return self.hash_join(join, source_context, join_context)
 
     def nested_loop_join(
         self, _join, source_context, join_context, source_size, join_size
@@ -184,3 +758,31 @@ class DefaultPythonExecutor(PythonExecutor):
                     )
 
         return table
+
+    def index_join(self, _join, outer_context, inner_context, inner_is_join=True):
+        # index nested loop join: every row of the outer relation probes the primary key
+        # index of the inner relation, so nothing is built and the inner table is never scanned
+        inner_table = inner_context.table
+        outer_key = self.generate_tuple(
+            _join["source_key"] if inner_is_join else _join["join_key"]
+        )
+        table = Table(
+            outer_context.columns + inner_table.columns
+            if inner_is_join
+            else inner_table.columns + outer_context.columns
+        )
+        # unmatched rows of the source are kept for a left join
+        nulls = [(None,) * len(inner_table.columns)] if _join.get("side") else []
+
+        for outer_reader, outer_ctx in outer_context:
+            outer_row = outer_reader.row
+            for inner_row in (
+                inner_table.probe(outer_ctx.eval_tuple(outer_key)) or nulls
+            ):
+                table.append(
+                    outer_row + inner_row if inner_is_join else inner_row + outer_row
+                )
+
+        # the rows come in the order of the outer relation
+        table.sorted_by = getattr(outer_context.table, "sorted_by", [])
+        return table
@@ -5,14 +5,24 @@ import typing as t
 
 from mo_sql_parsing import parse
 
+from sqlglot import exp, parse_one
 from sqlglot.errors import ExecuteError
 from sqlglot.executor.table import Table, ensure_tables
 from sqlglot.helper import dict_depth
 from sqlglot.optimizer import optimize
 from sqlglot.planner import Plan
-from sqlglot.schema import ensure_schema, flatten_schema, nested_get, nested_set
+from sqlglot.schema import (
+    ensure_schema,
+    flatten_schema,
+    nested_get,
+    nested_set,
+    normalize_name,
+)
 
 from custom_python_executor import MergeJoinPythonExecutor, DefaultPythonExecutor
+from index_aggregate import plan_index_aggregate
+from index_lookup import lookup_row_ids
+from query_cache import RESULT_CACHE_MAX_ROWS, normalize_sql
 
 logger = logging.getLogger("sqlglot")
 
@@ -27,154 +37,337 @@ PYTHON_TYPE_TO_SQLGLOT = {
     "dict": "MAP",
 }
 
+# column types of Database.table_schemas mapped to sqlglot types
+# DECIMAL values are stored as float, see Database._convert_type
+SCHEMA_TYPE_TO_SQLGLOT = {
+    "int": "INT",
+    "float": "FLOAT",
+    "boolean": "BOOLEAN",
+    "varchar": "VARCHAR",
+}
 
-def execute_query(query, database):
-    parsed_query = parse(query)
 
-    # identify available indexes
-    tables = identify_available_indexes(parsed_query, database)
+class QueryPlan:
+    """
+    What planning a query produces before it is executed: the mo-sql parse tree used to find
+    the index lookups, the tables the query references and the sqlglot plan of the optimized
+    query, along with the IndexAggregate of an aggregate query the indexes can answer. None
+    of it depends on the rows of the tables, so it is cached by the database and reused until
+    a table or an index is created or dropped.
+    """
 
-    # if query joins two tables and orders by one of the joining condiiton, then use merge join
-    join_algorithm = identify_join_algorithm(parsed_query)
+    def __init__(self, parsed_query, table_names, plan, sql=None, index_aggregate=None):
+        self.parsed_query = parsed_query
+        self.table_names = table_names
+        self.plan = plan
+        # normalized text of the query, None for a prepared statement
+        self.sql = sql
+        self.index_aggregate = index_aggregate
 
-    result = sqlglot_execute(query, tables=tables, join_algorithm=join_algorithm)
 
+def execute_query(query, database):
+    query_plan = plan_query(query, database)
+    if reads_transaction(query_plan, database):
+        return execute_plan(query_plan, database)
+    with database.read_view() as read_view:
+        if database.result_cache is None:
+            return execute_plan(query_plan, database, read_view=read_view)
+
+        # a result is reused as long as none of the tables it was computed from changed
+        key = (
+            query_plan.sql,
+            tuple(
+                database.table_versions[table_name]
+                for table_name in query_plan.table_names
+            ),
+        )
+        result = database.result_cache.get(key)
+        if result is None:
+            result = execute_plan(query_plan, database, read_view=read_view)
+            # the versions of the tables a statement changed while they were read do not
+            # tell which rows the result was computed from
+            if len(result.rows) <= RESULT_CACHE_MAX_ROWS and read_view.unchanged(
+                query_plan.table_names
+            ):
+                database.result_cache.put(key, result)
+        return result
+
+
+def execute_plan(query_plan, database, parameters=(), read_view=None):
+    """
+    Execute a query on the committed version of the database, see ReadView. The query is
+    executed on the current tables and indexes, and executed again on the rows of the
+    tables as of the version of the read view if a statement changed them meanwhile, which
+    may also have made the first execution fail.
+
+    parameters are the values bound to the placeholders of a prepared statement, see
+    PreparedStatement.
+
+    A query of the thread of an open transaction reads the rows as changed by the
+    transaction instead, see Transaction.
+    """
+    if reads_transaction(query_plan, database):
+        return execute_transaction_plan(query_plan, database, parameters)
+    if read_view is None:
+        with database.read_view() as read_view:
+            return execute_plan(query_plan, database, parameters, read_view)
+    try:
+        result = execute_current_plan(query_plan, database, parameters)
+        # the rows of a vectorized scan are only built when they are first read, which has
+        # to happen before they are known to be those of the version
+        result.rows
+    except Exception:
+        if read_view.unchanged(query_plan.table_names):
+            raise
+        result = None
+    if result is None or not read_view.unchanged(query_plan.table_names):
+        result = execute_read_view_plan(query_plan, read_view, parameters)
     return result
 
 
-def identify_join_algorithm(parsed_query):
-    join_algorithm = "default"
+def execute_read_view_plan(query_plan, read_view, parameters=()):
+    # execute a query on the rows of its tables as of the version of a read view, without
+    # the indexes, the vectorized scans or the statistics, which only describe the
+    # current rows
+    tables = {
+        table_name: executor_table(
+            read_view.tables[table_name][0].columns, read_view.row_view(table_name)
+        )
+        for table_name in query_plan.table_names
+    }
+    return sqlglot_execute(query_plan.plan, tables=tables, parameters=parameters)
 
-    if "orderby" not in parsed_query or not isinstance(parsed_query.get("from"), list):
-        return join_algorithm
 
-    from_tables = parsed_query["from"]
-    orderby_clause = parsed_query["orderby"]["value"]
+def reads_transaction(query_plan, database):
+    # True if the query reads a table changed by the open transaction of the calling thread
+    transaction = database.current_transaction()
+    return transaction is not None and transaction.changes(query_plan.table_names)
 
-    # traverse from_tables to find dictionary entries.
-    for table in from_tables:
-        # In a dictionary entry, find the dictionary value at the "on" key
-        if not isinstance(table, dict) or "on" not in table:
-            continue
-        on_clause = table["on"]
 
-        # don't use merge join if join type is left or right
-        if "left join" in table or "right join" in table:
-            return join_algorithm
+def execute_transaction_plan(query_plan, database, parameters=()):
+    # execute a query on the rows as changed by the open transaction, without the indexes,
+    # the vectorized scans or the statistics, which only describe the committed rows
+    transaction = database.current_transaction()
+    tables = {
+        table_name: executor_table(
+            database.tables[table_name].columns, transaction.row_view(table_name)
+        )
+        for table_name in query_plan.table_names
+    }
+    return sqlglot_execute(query_plan.plan, tables=tables, parameters=parameters)
 
-        if not isinstance(on_clause, dict) or "eq" not in on_clause:
-            continue
-        eq_clause = on_clause["eq"]
 
-        if orderby_clause in eq_clause:
-            join_algorithm = "merge"
-            return join_algorithm
+def execute_current_plan(query_plan, database, parameters=()):
+    table_names = query_plan.table_names
+
+    # e.x. SELECT MIN(c), COUNT(*) FROM t WHERE c > 10 reads the index of c only
+    if query_plan.index_aggregate is not None:
+        result = query_plan.index_aggregate.execute(
+            query_plan.parsed_query.get("where"), database
+        )
+        if result is not None:
+            return result
 
-    # inside where clause, find the array value at the "eq" key.
-    if "where" in parsed_query:
-        where_clause = parsed_query["where"]
-        if not isinstance(where_clause, dict) or "eq" not in where_clause:
-            return join_algorithm
-        eq_clause = where_clause["eq"]
+    # identify available indexes
+    row_views = identify_available_indexes(query_plan.parsed_query, database)
 
-        # If orderby_clause is in the array, then set join_algorithm to "merge"
-        if orderby_clause in eq_clause:
-            join_algorithm = "merge"
-            return join_algorithm
+    tables = {
+        table_name: executor_table(
+            database.tables[table_name].columns,
+            row_views.get(table_name, database.tables[table_name].view),
+        )
+        for table_name in table_names
+    }
+    indexes = join_indexes(database, table_names)
+    # the join order and join algorithms are chosen by the cost model of the executor
+    statistics = executor_statistics(database, table_names)
+
+    result = sqlglot_execute(
+        query_plan.plan,
+        tables=tables,
+        indexes=indexes,
+        statistics=statistics,
+        parameters=parameters,
+    )
 
-    return join_algorithm
+    return result
+
+
+def execute_view_query(plan, database, table_names, table_name=None, row_ids=None):
+    # execute the plan of a materialized view query, see MaterializedView; if table_name is
+    # given, only its rows row_ids are read and joined with all the rows of the other tables
+    tables = {
+        name: executor_table(
+            database.tables[name].columns,
+            database.tables[name].row_view(row_ids if name == table_name else None),
+        )
+        for name in table_names
+    }
+    # the changed rows are neither probed through the index of their table nor estimated
+    # from its statistics
+    others = [name for name in table_names if name != table_name]
+    return DefaultPythonExecutor(
+        env={"PARAMETERS": ()},
+        tables=ensure_tables(tables),
+        indexes=join_indexes(database, others),
+        statistics=executor_statistics(database, others),
+    ).execute(plan)
+
+
+def plan_query(query, database):
+    # parse and optimize a query, or reuse its plan if the same query was planned for the
+    # current tables and indexes
+    sql = normalize_sql(query)
+    key = (sql, database.schema_version)
+    query_plan = database.plan_cache.get(key)
+    if query_plan is not None:
+        return query_plan
+
+    query_plan = build_query_plan(parse(query), parse_one(query), database, sql)
+    database.plan_cache.put(key, query_plan)
+    return query_plan
+
+
+def build_query_plan(parsed_query, expression, database, sql=None):
+    # only hand the tables referenced by the query over to the executor
+    table_names = referenced_tables(expression, database)
+    plan = sqlglot_plan(expression, executor_schema(database, table_names))
+    index_aggregate = plan_index_aggregate(expression, plan, database, table_names)
+    return QueryPlan(parsed_query, table_names, plan, sql, index_aggregate)
+
+
+def referenced_tables(expression, database):
+    database_tables = {
+        normalize_name(table_name, is_table=True).name: table_name
+        for table_name in database.tables
+    }
+    table_names = []
+    for table in expression.find_all(exp.Table):
+        table_name = database_tables.get(normalize_name(table.name, is_table=True).name)
+        if table_name and table_name not in table_names:
+            table_names.append(table_name)
+    return table_names
+
+
+def executor_table(columns, rows):
+    # wrap a row view in a sqlglot table without copying the rows
+    return Table(
+        columns=[normalize_name(column).name for column in columns],
+        rows=rows,
+    )
+
+
+def executor_schema(database, table_names):
+    # build the executor schema from the table schemas instead of inferring it from the rows
+    schema = {}
+    for table_name in table_names:
+        schema[table_name] = {
+            column: sqlglot_type(definition["type"])
+            for column, definition in database.table_schemas[table_name].items()
+        }
+    return schema
+
+
+def join_indexes(database, table_names):
+    # single attribute primary key indexes that a join can probe instead of building a hash table
+    indexes = {}
+    for table_name in table_names:
+        if table_name not in database.indexing_structures:
+            continue
+        primary_key_columns = database.primary_key_columns(table_name)
+        if len(primary_key_columns) != 1:
+            continue
+        indexes[normalize_name(table_name, is_table=True).name] = (
+            normalize_name(primary_key_columns[0]).name,
+            database.indexing_structures[table_name],
+            database.tables[table_name],
+        )
+    return indexes
+
+
+def executor_statistics(database, table_names):
+    # statistics catalog entries keyed by the table names used by the executor, along with
+    # the executor column names mapped to the column names of the table
+    statistics = {}
+    for table_name in table_names:
+        statistics[normalize_name(table_name, is_table=True).name] = (
+            database.statistics[table_name],
+            {
+                normalize_name(column).name: column
+                for column in database.tables[table_name].columns
+            },
+        )
+    return statistics
+
+
+def sqlglot_type(data_type):
+    if isinstance(data_type, dict):
+        if "decimal" in data_type:
+            return SCHEMA_TYPE_TO_SQLGLOT["float"]
+        return SCHEMA_TYPE_TO_SQLGLOT["varchar"]
+    return SCHEMA_TYPE_TO_SQLGLOT.get(data_type, SCHEMA_TYPE_TO_SQLGLOT["varchar"])
 
 
 def identify_available_indexes(parsed_query, database):
-    tables = database.tables
+    # returns the row views of the tables that can be narrowed down with an index
+    tables = {}
 
     # extract table name from query
     from_table = parsed_query["from"]
-    # extract table name from query and flatten it if it is a dictionary
+    # extract table name and alias from query and flatten it if it is a dictionary
+    aliases = ()
     if isinstance(from_table, dict):
         table_name = from_table["value"]
+        if "name" in from_table:
+            aliases = (from_table["name"],)
     else:
         table_name = from_table
 
     # extract where clause from query if it exists
     where_clause = parsed_query.get("where")
-    temp_table = {}
 
-    # Use indexing structure to retrieve row for single table queries with where clause
+    # Use the primary key index or a secondary index to retrieve rows for single table queries
+    # with where clause
     # e.x. SELECT * FROM sushi WHERE id = 1
     # e.x. SELECT * FROM sushi WHERE id = 1 OR id = 2
-    # if query deals with a single table, extract where clause from query if it exists
+    # e.x. SELECT * FROM sushi WHERE id > 1 AND id <= 10
+    # e.x. SELECT * FROM sushi WHERE id BETWEEN 1 AND 10
     if (
         not isinstance(from_table, list)
+        and isinstance(table_name, str)
         and where_clause is not None
-        and table_name in database.indexing_structures
+        and table_name in database.tables
     ):
-        selected_table = tables[table_name]
-        selected_schema = database.table_schemas[table_name]
-        selected_indexing_structure = database.indexing_structures[table_name]
-        if "eq" in where_clause:
-            temp_table = fetch_index(
-                where_clause["eq"],
-                selected_indexing_structure,
-                selected_schema,
-                table_name,
-            )
-        elif "or" in where_clause:
-            conjunction_clause = where_clause["or"]
-            temp_table = parse_conjunction_for_indexing(
-                conjunction_clause,
-                selected_indexing_structure,
-                selected_schema,
-                table_name,
-            )
-            # if only one side of "or" clause is in index, then set temp_table to selected_table
-            if temp_table and len(temp_table[table_name]) == 1:
-                temp_table[table_name] = selected_table
-
-        elif "and" in where_clause:
-            conjunction_clause = where_clause["and"]
-            temp_table = parse_conjunction_for_indexing(
-                conjunction_clause,
-                selected_indexing_structure,
-                selected_schema,
-                table_name,
-            )
-        else:
-            temp_table = {
-                table_name: selected_table,
-            }
-
-    # if temp_table exists, then set tables to temp_table
-    if temp_table:
-        tables = temp_table
+        row_ids = lookup_row_ids(where_clause, database, table_name, aliases)
+        # if the index can narrow down the where clause, then restrict the table to the rows found
+        if row_ids is not None:
+            tables[table_name] = database.tables[table_name].row_view(row_ids)
+
     return tables
 
 
-def sqlglot_execute(
+def sqlglot_plan(
     sql: str | Expression,
-    schema: t.Optional[t.Dict | Schema] = None,
+    schema: t.Dict | Schema,
     read: DialectType = None,
-    tables: t.Optional[t.Dict] = None,
-    join_algorithm: str = "default",
-) -> Table:
-    """
-    Run a sql query against data.
+) -> Plan:
+    # optimize a query and build its logical plan
+    schema = ensure_schema(schema, dialect=read)
+    expression = optimize(sql, schema, leave_tables_isolated=True, dialect=read)
 
-    Args:
-        sql: a sql statement.
-        schema: database schema.
-            This can either be an instance of `Schema` or a mapping in one of the following forms:
-            1. {table: {col: type}}
-            2. {db: {table: {col: type}}}
-            3. {catalog: {db: {table: {col: type}}}}
-        read: the SQL dialect to apply during parsing (eg. "spark", "hive", "presto", "mysql").
-        tables: additional tables to register.
+    # logger.debug("Optimization finished: %f", time.time() - now)
+    # logger.debug("Optimized SQL: %s", expression.sql(pretty=True))
 
-    Returns:
-        Simple columnar data structure.
-    """
-    tables_ = ensure_tables(tables, dialect=read)
+    plan = Plan(expression)
 
+    logger.debug("Logical Plan: %s", plan)
+    return plan
+
+
+def infer_schema(
+    tables_: Tables, schema: t.Optional[t.Dict | Schema], read: DialectType = None
+) -> Schema:
+    # infer the schema from the first row of every table if it is not given
     if not schema:
         schema = {}
         flattened_tables = flatten_schema(
@@ -200,89 +393,59 @@ def sqlglot_execute(
         and tables_.supported_table_args != schema.supported_table_args
     ):
         raise ExecuteError("Tables must support the same table args as schema")
+    return schema
 
-    expression = optimize(sql, schema, leave_tables_isolated=True, dialect=read)
 
-    # logger.debug("Optimization finished: %f", time.time() - now)
-    # logger.debug("Optimized SQL: %s", expression.sql(pretty=True))
+def sqlglot_execute(
+    sql: str | Expression | Plan,
+    schema: t.Optional[t.Dict | Schema] = None,
+    read: DialectType = None,
+    tables: t.Optional[t.Dict] = None,
+    join_algorithm: str = "default",
+    indexes: t.Optional[t.Dict] = None,
+    statistics: t.Optional[t.Dict] = None,
+    parameters: t.Sequence = (),
+) -> Table:
+    """
+    Run a sql query against data.
 
-    plan = Plan(expression)
+    Args:
+        sql: a sql statement, or the plan of a statement built by sqlglot_plan, which is
+            executed without parsing and optimizing it again.
+        schema: database schema.
+            This can either be an instance of `Schema` or a mapping in one of the following forms:
+            1. {table: {col: type}}
+            2. {db: {table: {col: type}}}
+            3. {catalog: {db: {table: {col: type}}}}
+        read: the SQL dialect to apply during parsing (eg. "spark", "hive", "presto", "mysql").
+        tables: additional tables to register.
+        join_algorithm: "merge" to use merge joins only, "default" to let the cost model choose.
+        indexes: primary key indexes that joins can probe, see join_indexes.
+        statistics: table statistics of the cost model, see executor_statistics.
+        parameters: the values of the placeholders :1, :2, ... of the statement.
 
-    logger.debug("Logical Plan: %s", plan)
+    Returns:
+        Simple columnar data structure.
+    """
+    # tables that are already sqlglot tables are registered as they are, without a copy
+    tables_ = ensure_tables(tables, dialect=read)
 
+    if isinstance(sql, Plan):
+        plan = sql
+    else:
+        plan = sqlglot_plan(sql, infer_schema(tables_, schema, read), read)
+
+    env = {"PARAMETERS": tuple(parameters)}
     # now = time.time()
     if join_algorithm == "merge":
-        result = MergeJoinPythonExecutor(tables=tables_).execute(plan)
+        result = MergeJoinPythonExecutor(
+            env=env, tables=tables_, indexes=indexes
+        ).execute(plan)
     else:
-        result = DefaultPythonExecutor(tables=tables_).execute(plan)
+        result = DefaultPythonExecutor(
+            env=env, tables=tables_, indexes=indexes, statistics=statistics
+        ).execute(plan)
 
     print()
 
     return result
-
-
-def parse_conjunction_for_indexing(
-    conjunction_clause, selected_indexing_structure, selected_schema, table_name
-):
-    temp_table = {}
-    # conjunction_clause is a list with two elements; remove non-eq elements
-    conjunction_clause = [eq for eq in conjunction_clause if "eq" in eq]
-    # if there is one eq element in the list, then call fetch_index with that element
-    if len(conjunction_clause) == 1:
-        temp_table = fetch_index(
-            conjunction_clause[0]["eq"],
-            selected_indexing_structure,
-            selected_schema,
-            table_name,
-        )
-    # if there are two eq elements in the list, then call fetch_index on both elements and combine the results
-    elif len(conjunction_clause) == 2:
-        temp_table1 = fetch_index(
-            conjunction_clause[0]["eq"],
-            selected_indexing_structure,
-            selected_schema,
-            table_name,
-        )
-        temp_table2 = fetch_index(
-            conjunction_clause[1]["eq"],
-            selected_indexing_structure,
-            selected_schema,
-            table_name,
-        )
-
-        if temp_table1 and temp_table2:
-            temp_table[table_name] = temp_table1[table_name] + temp_table2[table_name]
-        elif temp_table1:
-            temp_table = temp_table1
-        elif temp_table2:
-            temp_table = temp_table2
-
-    return temp_table
-
-
-def fetch_index(
-    equality_condition, selected_indexing_structure, selected_schema, table_name
-):
-    tables = {}
-
-    # extract column name from equality condition array
-    column_name = equality_condition[0]
-    # extract matching value from equality condition array
-    if isinstance(equality_condition[1], dict):
-        # if equality condition does not contain "literal" key, then return empty tables
-        if "literal" not in equality_condition[1]:
-            return tables
-        equality_condition[1] = equality_condition[1]["literal"]
-    matching_value = equality_condition[1]
-
-    # find out if table has an index, column is a primary key, and matching value is in index
-    if "primary_key" in selected_schema[
-        column_name
-    ] and selected_indexing_structure.has_key(matching_value):
-        # if matching value is in index, then use index to retrieve row
-        row = selected_indexing_structure.get(matching_value)
-        # create a temp table with the row
-        tables[table_name] = [row]
-        return tables
-
-    return tables
@@ -0,0 +1,165 @@
+# Answer aggregate queries from the indexes of a table instead of executing them.
+#
+# SELECT MIN(c), MAX(c), COUNT(*) FROM t WHERE c > 100 only needs the first and last keys
+# of the range of c in its B-tree and the number of keys in between, so it is answered in
+# O(log n) without handing a single row to the query engine.
+
+from sqlglot import exp
+from sqlglot.executor.table import Table
+from sqlglot.schema import normalize_name
+
+from index_lookup import KeyRange, column_key_range
+
+AGGREGATES = {
+    exp.Min: "min",
+    exp.Max: "max",
+    exp.Count: "count",
+}
+
+# the ungrouped aggregate queries that are answered from the indexes cannot use any of these
+UNSUPPORTED_CLAUSES = (
+    "joins",
+    "laterals",
+    "group",
+    "having",
+    "qualify",
+    "order",
+    "limit",
+    "offset",
+    "distinct",
+    "with",
+)
+
+
+class IndexAggregate:
+    """
+    Single row of MIN, MAX and COUNT aggregates of the indexed columns of a table, filtered
+    at most by a range of one indexed column, e.g.
+    SELECT MIN(c), MAX(c), COUNT(*) FROM t WHERE c BETWEEN 10 AND 20.
+
+    MIN and MAX are the first and last keys of the range in the primary key index or in a
+    secondary index, whose trees leave NULL values out. COUNT(*) of a table without WHERE
+    clause is the number of its rows, and with a range, the number of keys of the primary
+    key index in the range or the row ids of the secondary index values in the range.
+    """
+
+    def __init__(self, table_name, aliases, columns, aggregates):
+        self.table_name = table_name
+        self.aliases = aliases
+        # column names of the result
+        self.columns = columns
+        # (function, column) per column of the result, column is None for COUNT(*)
+        self.aggregates = aggregates
+
+    def execute(self, where_clause, database):
+        # the result of the query, None if the indexes cannot answer it and the query has to
+        # be executed
+        indexes = aggregate_indexes(database, self.table_name)
+        key_range = KeyRange()
+        range_column = None
+        if where_clause is not None:
+            column_range = column_key_range(
+                where_clause, indexes, {self.table_name, *self.aliases}
+            )
+            if column_range is None:
+                return None
+            range_column, key_range = column_range
+            # the range only filters the index of its own column
+            if any(column not in (None, range_column) for _, column in self.aggregates):
+                return None
+
+        row = []
+        try:
+            for function, column in self.aggregates:
+                if column is None and range_column is None:
+                    row.append(len(database.tables[self.table_name]))
+                    continue
+                kind, tree = indexes[column or range_column]
+                if function == "min":
+                    row.append(key_range.first_key(tree))
+                elif function == "max":
+                    row.append(key_range.last_key(tree))
+                else:
+                    row.append(count_keys(kind, tree, key_range))
+        except TypeError:
+            # the bounds cannot be compared with the keys of the index (e.g. a string
+            # compared with an integer key), so let the query engine evaluate them
+            return None
+        return Table(self.columns, [tuple(row)])
+
+
+def plan_index_aggregate(expression, plan, database, table_names):
+    # the IndexAggregate of a query if it only aggregates indexed columns of a single table,
+    # None otherwise
+    if (
+        not isinstance(expression, exp.Select)
+        or len(table_names) != 1
+        or any(expression.args.get(clause) for clause in UNSUPPORTED_CLAUSES)
+    ):
+        return None
+    from_ = expression.args.get("from")
+    if from_ is None or not isinstance(from_.this, exp.Table):
+        return None
+    table_name = table_names[0]
+    table = from_.this
+    aliases = (table.alias,) if table.alias else ()
+    names = {
+        normalize_name(name, is_table=True).name for name in (table_name, *aliases)
+    }
+
+    indexes = aggregate_indexes(database, table_name)
+    schema_columns = {
+        normalize_name(column).name: column
+        for column in database.table_schemas[table_name]
+    }
+    aggregates = []
+    for projection in expression.expressions:
+        value = projection.unalias()
+        function = AGGREGATES.get(type(value))
+        if function is None or value.expressions:
+            return None
+        argument = value.this
+        if function == "count" and isinstance(argument, exp.Star):
+            aggregates.append((function, None))
+            continue
+        if not isinstance(argument, exp.Column) or (
+            argument.table
+            and normalize_name(argument.table, is_table=True).name not in names
+        ):
+            return None
+        column = schema_columns.get(normalize_name(argument.this).name)
+        if column not in indexes:
+            return None
+        aggregates.append((function, column))
+
+    # the result columns are named like those of the optimized query the engine executes
+    columns = tuple(
+        projection.alias_or_name for projection in plan.expression.expressions
+    )
+    if len(columns) != len(aggregates):
+        return None
+    return IndexAggregate(table_name, aliases, columns, aggregates)
+
+
+def aggregate_indexes(database, table_name):
+    # indexed columns of a table mapped to ("primary", tree) or ("secondary", tree)
+    indexes = {}
+    primary_key_columns = database.primary_key_columns(table_name)
+    if table_name in database.indexing_structures and len(primary_key_columns) == 1:
+        indexes[primary_key_columns[0]] = (
+            "primary",
+            database.indexing_structures[table_name],
+        )
+    for index in database.secondary_indexes.get(table_name, {}).values():
+        indexes.setdefault(index.column, ("secondary", index.tree))
+    return indexes
+
+
+def count_keys(kind, tree, key_range):
+    # number of rows whose value of the indexed column is in the range
+    if key_range.empty:
+        return 0
+    if kind == "primary":
+        # counts the keys bucket by bucket without reading them
+        return len(tree.keys(**key_range.arguments()))
+    return sum(len(row_ids) for row_ids in tree.values(**key_range.arguments()))
@@ -0,0 +1,345 @@
+# Translate mo-sql-parsing WHERE clauses into B-tree lookups on the primary key index and
+# the secondary indexes of a table.
+#
+# A lookup returns the row ids of every row that may satisfy the condition, or None when
+# the index cannot narrow the condition down and the whole table has to be scanned. The
+# query engine still evaluates the complete WHERE clause on the returned rows, so a lookup
+# is allowed to return a superset of the matching rows.
+
+# comparison operators mapped to the operator obtained by swapping their operands
+FLIPPED_OPERATORS = {
+    "eq": "eq",
+    "gt": "lt",
+    "gte": "lte",
+    "lt": "gt",
+    "lte": "gte",
+}
+
+
+class KeyRange:
+    def __init__(
+        self, low=None, high=None, include_low=True, include_high=True, empty=False
+    ):
+        # a bound of None means the range is unbounded on that side
+        self.low = low
+        self.high = high
+        self.include_low = include_low
+        self.include_high = include_high
+        self.empty = empty
+
+    @classmethod
+    def from_comparison(cls, operator, value):
+        if operator == "eq":
+            return cls(value, value)
+        elif operator == "gt":
+            return cls(low=value, include_low=False)
+        elif operator == "gte":
+            return cls(low=value)
+        elif operator == "lt":
+            return cls(high=value, include_high=False)
+        elif operator == "lte":
+            return cls(high=value)
+        raise ValueError(f"Invalid comparison operator: {operator}")
+
+    def intersect(self, other):
+        low, include_low = self._tighter(
+            (self.low, self.include_low), (other.low, other.include_low), max
+        )
+        high, include_high = self._tighter(
+            (self.high, self.include_high), (other.high, other.include_high), min
+        )
+        empty = self.empty or other.empty
+        if low is not None and high is not None:
+            if low > high or (low == high and not (include_low and include_high)):
+                empty = True
+        return KeyRange(low, high, include_low, include_high, empty)
+
+    @staticmethod
+    def _tighter(bound, other_bound, pick):
+        if bound[0] is None:
+            return other_bound
+        if other_bound[0] is None:
+            return bound
+        if bound[0] == other_bound[0]:
+            return bound[0], bound[1] and other_bound[1]
+        return bound if pick(bound[0], other_bound[0]) == bound[0] else other_bound
+
+    def rank(self):
+        # expected selectivity: empty ranges first, then point lookups, then bounded ranges
+        if self.empty:
+            return 0
+        if self.low is not None and self.high is not None:
+            return 1 if self.low == self.high else 2
+        return 3
+
+    def arguments(self):
+        # keyword arguments restricting keys(), values() and items() of a B-tree to the range
+        arguments = {}
+        if self.low is not None:
+            arguments["min"] = self.low
+            arguments["excludemin"] = not self.include_low
+        if self.high is not None:
+            arguments["max"] = self.high
+            arguments["excludemax"] = not self.include_high
+        return arguments
+
+    def scan(self, tree):
+        # O(log n + k) range scan over the values of a B-tree
+        if self.empty:
+            return []
+        return list(tree.values(**self.arguments()))
+
+    def first_key(self, tree):
+        # O(log n) smallest key of a B-tree in the range, None if the range holds no key
+        if self.empty:
+            return None
+        for key in tree.keys(**self.arguments()):
+            return key
+        return None
+
+    def last_key(self, tree):
+        # O(log n) largest key of a B-tree in the range, None if the range holds no key
+        if self.empty:
+            return None
+        try:
+            key = tree.maxKey() if self.high is None else tree.maxKey(self.high)
+        except ValueError:
+            # no key at or below the upper bound
+            return None
+        if key == self.high and not self.include_high:
+            # the key before an excluded upper bound is found by walking the buckets
+            keys = tree.keys(**self.arguments())
+            return keys[-1] if len(keys) else None
+        if self.low is not None and (
+            key < self.low or (key == self.low and not self.include_low)
+        ):
+            return None
+        return key
+
+
+def lookup_row_ids(condition, database, table_name, aliases=()):
+    # row ids of the rows of table_name that may satisfy condition, None for a full scan
+    indexes = table_indexes(database, table_name)
+    if not indexes:
+        return None
+
+    names = {table_name, *aliases}
+
+    try:
+        return _lookup(condition, indexes, names)
+    except TypeError:
+        # the literal cannot be compared with the keys of the index (e.g. a string
+        # compared with an integer key), so let the query engine evaluate it
+        return None
+
+
+def column_key_range(condition, indexes, names):
+    # (column, KeyRange) if the whole condition is a range of a single indexed column, e.g.
+    # c > 10 AND c <= 20, None otherwise; unlike lookup_row_ids the range is exact, so the
+    # rows in the range are the rows satisfying the condition
+    if isinstance(condition, dict) and list(condition) == ["and"]:
+        column, key_range = None, KeyRange()
+        for operand in condition["and"]:
+            column_range = column_key_range(operand, indexes, names)
+            if column_range is None or column not in (None, column_range[0]):
+                return None
+            column = column_range[0]
+            key_range = key_range.intersect(column_range[1])
+        return (column, key_range) if column is not None else None
+    return _key_range(condition, indexes, names)
+
+
+def table_indexes(database, table_name):
+    # indexed columns of a table mapped to a function that scans a KeyRange on the column
+    # the primary key comes first so that it is preferred over secondary indexes
+    indexes = {}
+    if table_name in database.indexing_structures:
+        tree = database.indexing_structures[table_name]
+        primary_key_columns = database.primary_key_columns(table_name)
+        if len(primary_key_columns) == 1:
+            indexes[primary_key_columns[0]] = _primary_key_scan(tree)
+        else:
+            # a multi-attribute key is looked up with the tuple of all key columns, or
+            # scanned by the prefix formed by its leading column
+            indexes[tuple(primary_key_columns)] = _primary_key_scan(tree)
+            indexes[primary_key_columns[0]] = _prefix_scan(tree)
+
+    for index in database.secondary_indexes.get(table_name, {}).values():
+        indexes.setdefault(index.column, index.scan)
+    return indexes
+
+
+def _primary_key_scan(tree):
+    return lambda key_range: key_range.scan(tree)
+
+
+def _prefix_scan(tree):
+    # scan the tuple keys of a multi-attribute primary key whose leading value is in key_range
+    def scan(key_range):
+        if key_range.empty:
+            return []
+        arguments = {}
+        if key_range.low is not None:
+            # (low,) sorts before every key starting with low
+            arguments["min"] = (key_range.low,)
+
+        row_ids = []
+        for key, row_id in tree.items(**arguments):
+            leading_value = key[0]
+            if not key_range.include_low and leading_value == key_range.low:
+                continue
+            if key_range.high is not None and (
+                leading_value > key_range.high
+                or (leading_value == key_range.high and not key_range.include_high)
+            ):
+                break
+            row_ids.append(row_id)
+        return row_ids
+
+    return scan
+
+
+def _lookup(condition, indexes, names):
+    if not isinstance(condition, dict) or len(condition) != 1:
+        return None
+    operator, operands = next(iter(condition.items()))
+
+    if operator == "and":
+        return _lookup_conjunction(operands, indexes, names)
+    elif operator == "or":
+        row_ids = {}
+        for operand in operands:
+            operand_row_ids = _lookup(operand, indexes, names)
+            # if one side of "or" clause cannot use the index, then scan the whole table
+            if operand_row_ids is None:
+                return None
+            row_ids.update(dict.fromkeys(operand_row_ids))
+        return list(row_ids)
+    elif operator == "in":
+        return _lookup_in(operands, indexes, names)
+
+    column_range = _key_range(condition, indexes, names)
+    if column_range is None:
+        return None
+    column, key_range = column_range
+    return indexes[column](key_range)
+
+
+def _lookup_in(operands, indexes, names):
+    # e.x. id IN (1, 5, 9) is a point lookup per value
+    if not isinstance(operands, list) or len(operands) != 2:
+        return None
+    column = _column(operands[0], names)
+    if column not in indexes:
+        return None
+    values = operands[1]
+    if isinstance(values, dict) and "literal" in values:
+        values = values["literal"]
+        values = values if isinstance(values, list) else [values]
+    else:
+        values = values if isinstance(values, list) else [values]
+        values = [_literal(value) for value in values]
+        if None in values:
+            return None
+    row_ids = {}
+    for value in values:
+        row_ids.update(dict.fromkeys(indexes[column](KeyRange(value, value))))
+    return list(row_ids)
+
+
+def _lookup_conjunction(operands, indexes, names):
+    # fold the ranges on each indexed column into a single range so that an index is only
+    # scanned once, e.g. c > 6000 AND c < 6010 scans the 9 keys in between
+    key_ranges = {}
+    other_row_ids = None
+    for operand in operands:
+        column_range = _key_range(operand, indexes, names)
+        if column_range is not None:
+            column, key_range = column_range
+            if column in key_ranges:
+                key_range = key_ranges[column].intersect(key_range)
+            key_ranges[column] = key_range
+            continue
+        # nested "or"/"and" clauses are looked up separately and intersected
+        operand_row_ids = _lookup(operand, indexes, names)
+        if operand_row_ids is None:
+            continue
+        if other_row_ids is None:
+            other_row_ids = operand_row_ids
+        else:
+            operand_row_ids = set(operand_row_ids)
+            other_row_ids = [r for r in other_row_ids if r in operand_row_ids]
+
+    # equality on every column of a multi-attribute primary key is a single key lookup
+    for key_columns in indexes:
+        if isinstance(key_columns, tuple) and all(
+            column in key_ranges and key_ranges[column].rank() <= 1
+            for column in key_columns
+        ):
+            key_ranges[key_columns] = KeyRange(
+                tuple(key_ranges[column].low for column in key_columns),
+                tuple(key_ranges[column].high for column in key_columns),
+                empty=any(key_ranges[column].empty for column in key_columns),
+            )
+
+    if not key_ranges:
+        return other_row_ids
+    # only scan the most selective range, the query engine filters the rest
+    ranks = list(indexes)
+    column = min(
+        key_ranges,
+        key=lambda column: (key_ranges[column].rank(), ranks.index(column)),
+    )
+    row_ids = indexes[column](key_ranges[column])
+    if other_row_ids is not None:
+        other_row_ids = set(other_row_ids)
+        row_ids = [row_id for row_id in row_ids if row_id in other_row_ids]
+    return row_ids
+
+
+def _key_range(condition, indexes, names):
+    # (column, KeyRange) for a single comparison on an indexed column, None otherwise
+    if not isinstance(condition, dict) or len(condition) != 1:
+        return None
+    operator, operands = next(iter(condition.items()))
+
+    if operator == "between":
+        if len(operands) != 3:
+            return None
+        column = _column(operands[0], names)
+        low, high = _literal(operands[1]), _literal(operands[2])
+        if column not in indexes or low is None or high is None:
+            return None
+        return column, KeyRange(low, high)
+
+    if operator not in FLIPPED_OPERATORS or len(operands) != 2:
+        return None
+    column, value = operands
+    # e.x. 6000 < c is the same as c > 6000
+    if _column(column, names) not in indexes:
+        column, value = value, column
+        operator = FLIPPED_OPERATORS[operator]
+    column = _column(column, names)
+    value = _literal(value)
+    if column not in indexes or value is None:
+        return None
+    return column, KeyRange.from_comparison(operator, value)
+
+
+def _column(operand, names):
+    # mo-sql-parsing represents column references as strings, optionally qualified
+    if not isinstance(operand, str):
+        return None
+    qualifier, _, column = operand.rpartition(".")
+    if qualifier and qualifier not in names:
+        return None
+    return column
+
+
+def _literal(operand):
+    # numbers are plain values and strings are wrapped in {"literal": ...}
+    if isinstance(operand, dict):
+        return operand.get("literal") if len(operand) == 1 else None
+    if isinstance(operand, (int, float)) and not isinstance(operand, bool):
+        return operand
+    return None
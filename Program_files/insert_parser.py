@@ -0,0 +1,73 @@
+# Parse INSERT INTO t [(a, b, ...)] VALUES (...), (...) statements whose values are all
+# literals without going through mo-sql-parsing, which needs seconds for the thousands of
+# rows of a single batch. Any other INSERT statement, e.g. with an expression in its values
+# or INSERT ... SELECT, is left to mo-sql-parsing.
+
+import re
+
+INSERT_HEAD = re.compile(
+    r"\s*insert\s+into\s+(\w+)\s*(?:\(\s*(\w+(?:\s*,\s*\w+)*)\s*\))?\s*values\s*",
+    re.I,
+)
+
+# a single token of the VALUES list: a string, a number, a keyword or a punctuation mark
+VALUE_TOKENS = re.compile(
+    r"\s*(?:'((?:[^']|'')*)'|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|(\w+)|([(),;]))"
+)
+
+KEYWORDS = {"null": None, "true": True, "false": False}
+
+
+def parse_insert_values(sql):
+    # (table name, column names or None, list of rows) of a literal VALUES insert, None if
+    # sql is any other statement
+    head = INSERT_HEAD.match(sql)
+    if head is None:
+        return None
+    table_name, columns = head.groups()
+    if columns is not None:
+        columns = [column.strip() for column in columns.split(",")]
+
+    rows = []
+    row = None
+    position = head.end()
+    # the token that is expected next: "(" opening a row, a value, "," or ")" after a value,
+    # and "," or the end after a row
+    expected = "row"
+    for match in VALUE_TOKENS.finditer(sql, position):
+        if match.start() != position:
+            return None
+        position = match.end()
+        string, number, keyword, symbol = match.groups()
+        if expected == "row":
+            if symbol != "(":
+                return None
+            row = []
+            expected = "value"
+        elif expected == "value":
+            if string is not None:
+                row.append(string.replace("''", "'"))
+            elif number is not None:
+                row.append(
+                    int(number) if number.lstrip("+-").isdigit() else float(number)
+                )
+            elif keyword is not None and keyword.lower() in KEYWORDS:
+                row.append(KEYWORDS[keyword.lower()])
+            else:
+                return None
+            expected = "separator"
+        elif expected == "separator":
+            if symbol == ",":
+                expected = "value"
+            elif symbol == ")":
+                rows.append(row)
+                expected = "end"
+            else:
+                return None
+        elif expected == "end" and symbol in (",", ";"):
+            expected = "row" if symbol == "," else "done"
+        else:
+            return None
+    if sql[position:].strip() or expected not in ("end", "done") or not rows:
+        return None
+    return table_name, columns, rows
@@ -0,0 +1,316 @@
+from collections import Counter
+
+from sqlglot import exp, parse_one
+from sqlglot.optimizer import optimize
+from sqlglot.schema import normalize_name
+
+from executor import executor_schema, sqlglot_plan
+
+# aggregate functions that can be maintained incrementally
+AGGREGATES = {
+    exp.Count: "count",
+    exp.Sum: "sum",
+    exp.Avg: "avg",
+    exp.Min: "min",
+    exp.Max: "max",
+}
+
+SUPPORTED_FORMAT = "CREATE MATERIALIZED VIEW spending AS SELECT o.user_id, SUM(s.price) AS total FROM orders o JOIN order_items oi ON o.id = oi.order_id JOIN sushi s ON s.id = oi.sushi_id GROUP BY o.user_id"
+
+# positions in the state of a group: the row id of the group in the view table and the
+# number of rows of the query in the group, followed by the state of every aggregate
+ROW_ID = 0
+ROWS = 1
+
+
+class MaterializedView:
+    """
+    Result of a query with SUM/COUNT/MIN/MAX/AVG aggregates and an optional GROUP BY,
+    created with CREATE MATERIALIZED VIEW and stored as a regular table of the database,
+    which SELECT reads like any other table.
+
+    The view is not computed again when its tables change. The query without its GROUP BY,
+    which returns the group values and the aggregate arguments of every row, is run over
+    the rows that were inserted, deleted or updated only, joined with the current rows of
+    the other tables, and its rows are added to or subtracted from the running state of
+    their groups (see apply). Reading the view costs O(groups) however big its tables are.
+
+    The state of a group is its number of rows and, per aggregate, the count of non NULL
+    values for COUNT, their sum and count for SUM and AVG, and the multiset of the values
+    with the current extreme for MIN and MAX, so that deleting the minimum finds the next
+    one without reading the table.
+    """
+
+    def __init__(self, name, sql, database):
+        self.name = name
+        self.sql = sql
+        expression = parse_one(sql)
+        self.table_names = view_tables(expression, database)
+        groups = group_expressions(expression)
+
+        # what every column of the view holds: ("group", position) or ("aggregate", position)
+        self.outputs = []
+        self.functions = []
+        arguments = []
+        for projection in expression.expressions:
+            value = projection.unalias()
+            if type(value) in AGGREGATES:
+                if isinstance(value.this, exp.Distinct) or value.this.find(exp.AggFunc):
+                    raise ValueError(
+                        f"Invalid aggregate: {value.sql()}. Currently supported format: {SUPPORTED_FORMAT}"
+                    )
+                self.outputs.append(("aggregate", len(self.functions)))
+                self.functions.append(AGGREGATES[type(value)])
+                # COUNT(*) counts the rows, which are never NULL
+                arguments.append(
+                    exp.Literal.number(1)
+                    if isinstance(value.this, exp.Star)
+                    else value.this.copy()
+                )
+            elif value in groups:
+                self.outputs.append(("group", groups.index(value)))
+            else:
+                raise ValueError(
+                    f"{projection.sql()} is neither grouped nor aggregated. Currently supported format: {SUPPORTED_FORMAT}"
+                )
+        if not self.functions:
+            raise ValueError(
+                f"A materialized view needs an aggregate. Currently supported format: {SUPPORTED_FORMAT}"
+            )
+        self.group_count = len(groups)
+
+        schema = executor_schema(database, self.table_names)
+        optimized = optimize(expression.copy(), schema, leave_tables_isolated=True)
+        self.schema = {}
+        for projection, (output, position) in zip(optimized.expressions, self.outputs):
+            if projection.alias_or_name in self.schema:
+                raise ValueError(f"Duplicate column name: {projection.alias_or_name}")
+            function = self.functions[position] if output == "aggregate" else None
+            self.schema[projection.alias_or_name] = {
+                "type": view_column_type(function, projection)
+            }
+        self.columns_read = columns_read(optimized, database, self.table_names)
+
+        # the query without its GROUP BY: the group values, then the aggregate arguments
+        delta = expression.copy()
+        delta.set("group", None)
+        delta.set(
+            "expressions",
+            [
+                exp.alias_(group.copy(), f"_g_{position}")
+                for position, group in enumerate(groups)
+            ]
+            + [
+                exp.alias_(argument, f"_a_{position}")
+                for position, argument in enumerate(arguments)
+            ],
+        )
+        self.plan = sqlglot_plan(delta, schema)
+
+        # key: tuple of group values, value: state of the group
+        self.groups = {}
+
+    def reads(self, table_name, column):
+        # True if changing the column of the table can change the view
+        return column in self.columns_read.get(table_name, ())
+
+    def apply(self, rows, sign):
+        # add (sign 1) or subtract (sign -1) rows of the query without GROUP BY to the state
+        # of their groups, returns the keys of the changed groups
+        changed = set()
+        for row in rows:
+            key = tuple(row[: self.group_count])
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = self.new_group()
+            group[ROWS] += sign
+            for position, (function, value) in enumerate(
+                zip(self.functions, row[self.group_count :])
+            ):
+                if value is not None:
+                    group[2 + position] = update_state(
+                        function, group[2 + position], value, sign
+                    )
+            changed.add(key)
+        return changed
+
+    def new_group(self):
+        return [None, 0] + [initial_state(function) for function in self.functions]
+
+    def ensure_group(self):
+        # a view without GROUP BY always has its single row, even over no rows
+        if not self.group_count and () not in self.groups:
+            self.groups[()] = self.new_group()
+
+    def is_empty(self, key):
+        # a group without rows is removed from the view
+        return self.group_count > 0 and self.groups[key][ROWS] <= 0
+
+    def row(self, key):
+        # the row of the view of a group
+        group = self.groups[key]
+        row = {}
+        for column, (output, position) in zip(self.schema, self.outputs):
+            if output == "group":
+                row[column] = key[position]
+            else:
+                row[column] = state_value(self.functions[position], group[2 + position])
+        return row
+
+
+def view_tables(expression, database):
+    # the tables of a view query, which may only join tables of the database with inner
+    # joins and read no subquery
+    if not isinstance(expression, exp.Select) or any(
+        expression.args.get(clause)
+        for clause in ("distinct", "having", "order", "limit", "offset", "with")
+    ):
+        raise ValueError(
+            f"Invalid view query: {expression.sql()}. Currently supported format: {SUPPORTED_FORMAT}"
+        )
+    if len(list(expression.find_all(exp.Select))) > 1 or expression.find(exp.Subquery):
+        raise ValueError(
+            f"Subqueries are not supported in materialized views: {expression.sql()}"
+        )
+    for join in expression.args.get("joins") or []:
+        if join.side or join.kind not in ("", "INNER", "CROSS"):
+            raise ValueError(
+                f"Only inner joins are supported in materialized views: {join.sql()}"
+            )
+
+    database_tables = {
+        normalize_name(table_name, is_table=True).name: table_name
+        for table_name in database.tables
+    }
+    table_names = []
+    for table in expression.find_all(exp.Table):
+        table_name = database_tables.get(normalize_name(table.name, is_table=True).name)
+        if table_name is None:
+            raise ValueError(f"Table {table.name} does not exist!")
+        if table_name in database.views:
+            raise ValueError(
+                f"{table_name} is a materialized view, a view can only read tables"
+            )
+        # a change of a table joined with itself would have to be joined with itself too
+        if table_name in table_names:
+            raise ValueError(
+                f"Table {table_name} is read twice, which materialized views do not support"
+            )
+        table_names.append(table_name)
+    return table_names
+
+
+def group_expressions(expression):
+    # the GROUP BY expressions, with positions and aliases of the select list replaced by
+    # the expressions they refer to
+    group = expression.args.get("group")
+    if group is None:
+        return []
+    projections = expression.expressions
+    aliases = {
+        projection.alias: projection.unalias()
+        for projection in projections
+        if isinstance(projection, exp.Alias)
+    }
+    groups = []
+    for value in group.expressions:
+        if isinstance(value, exp.Literal) and value.is_int:
+            value = projections[int(value.this) - 1].unalias()
+        elif (
+            isinstance(value, exp.Column) and not value.table and value.name in aliases
+        ):
+            value = aliases[value.name]
+        groups.append(value)
+    return groups
+
+
+def view_column_type(function, projection):
+    # column type of the view table for a column of the view query, see
+    # Database._parse_columns
+    data_type = projection.type
+    if function == "count":
+        return "int"
+    if function == "avg":
+        return "float"
+    if function == "sum" and not data_type.is_type(
+        *exp.DataType.NUMERIC_TYPES, exp.DataType.Type.BOOLEAN
+    ):
+        raise ValueError(f"Cannot sum non numeric values: {projection.sql()}")
+    if data_type.is_type(*exp.DataType.INTEGER_TYPES):
+        return "int"
+    if data_type.is_type(*exp.DataType.NUMERIC_TYPES):
+        return "float"
+    if data_type.is_type(exp.DataType.Type.BOOLEAN):
+        # a sum of booleans counts the true values
+        return "int" if function == "sum" else "boolean"
+    return "varchar"
+
+
+def columns_read(optimized, database, table_names):
+    # key: table name, value: the columns of the table the optimized view query reads
+    tables = {
+        normalize_name(table_name, is_table=True).name: table_name
+        for table_name in table_names
+    }
+    aliases = {
+        table.alias_or_name: tables[table.name]
+        for table in optimized.find_all(exp.Table)
+        if table.name in tables
+    }
+    result = {table_name: set() for table_name in table_names}
+    for column in optimized.find_all(exp.Column):
+        table_name = aliases.get(column.table)
+        if table_name is None:
+            continue
+        for name in database.table_schemas[table_name]:
+            if normalize_name(name).name == column.name:
+                result[table_name].add(name)
+    return result
+
+
+def initial_state(function):
+    if function == "count":
+        return 0
+    if function in ("sum", "avg"):
+        # sum and count of the values
+        return [0, 0]
+    # multiset of the values and the current extreme
+    return [Counter(), None]
+
+
+def update_state(function, state, value, sign):
+    if function == "count":
+        return state + sign
+    if function in ("sum", "avg"):
+        state[1] += sign
+        # adding and subtracting floats leaves rounding errors behind, so a sum without
+        # values starts over from zero
+        state[0] = state[0] + sign * value if state[1] else 0
+        return state
+
+    values, extreme = state
+    if sign > 0:
+        values[value] += 1
+        if extreme is None or (
+            value < extreme if function == "min" else value > extreme
+        ):
+            state[1] = value
+        return state
+    values[value] -= 1
+    if values[value] <= 0:
+        del values[value]
+        if value == extreme:
+            # the next extreme is only searched for when the current one is gone
+            state[1] = (min if function == "min" else max)(values) if values else None
+    return state
+
+
+def state_value(function, state):
+    # the value of an aggregate, NULL over no values like the query engine
+    if function == "count":
+        return state
+    if function == "sum":
+        return state[0] if state[1] else None
+    if function == "avg":
+        return state[0] / state[1] if state[1] else None
+    return state[1]
@@ -0,0 +1,159 @@
+import re
+
+from mo_sql_parsing import parse
+from sqlglot import parse_one
+
+from executor import QueryPlan, build_query_plan, execute_plan
+
+# quoted strings and identifiers, which are kept as they are, and parameter markers
+PARAMETER_TOKENS = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|`[^`]*`|\?")
+# parameter markers after numbering, as mo-sql-parsing reads them: column names $1, $2, ...
+PARAMETER_NAME = re.compile(r"\$([1-9][0-9]*)")
+
+
+class PreparedStatement:
+    """
+    SELECT or INSERT statement with ? parameter markers that is parsed and planned once and
+    then executed any number of times with different values, e.g.
+
+        statement = PreparedStatement(database, "SELECT * FROM sushi WHERE id = ?")
+        statement.execute(1)
+
+    A SELECT keeps its QueryPlan: executing it only binds the values into the WHERE clause
+    used for the index lookups (see identify_available_indexes) and hands them to the
+    executor, whose compiled expressions read them from its environment. An INSERT keeps
+    the values of its row that are not parameters. A statement is planned again if a table
+    or an index was created or dropped since it was prepared.
+    """
+
+    def __init__(self, database, sql):
+        self.database = database
+        self.sql = sql
+        self.prepare()
+
+    def prepare(self):
+        # mo-sql-parsing reads $1, $2, ... as column names and sqlglot reads :1, :2, ... as
+        # placeholders
+        parsed = parse(number_parameters(self.sql, "$"))
+        self.parameter_count = count_parameters(self.sql)
+        self.schema_version = self.database.schema_version
+
+        if "insert" in parsed:
+            self.table_name = parsed["insert"]
+            if self.table_name not in self.database.tables:
+                raise ValueError(f"Table {self.table_name} does not exist!")
+            if "select" not in parsed.get("query", {}):
+                raise ValueError(
+                    f"Invalid statement: {self.sql}. Currently supported format: INSERT INTO EMPLOYEE VALUES (?, ?, ?, ?)"
+                )
+            values = parsed["query"]["select"]
+            if isinstance(values, dict):
+                values = [values]
+            self.values = [literal_value(value["value"]) for value in values]
+            self.query_plan = None
+        elif "select" in parsed:
+            self.query_plan = build_query_plan(
+                parsed, parse_one(number_parameters(self.sql, ":")), self.database
+            )
+        else:
+            raise ValueError(
+                f"Invalid statement: {self.sql}. Only SELECT and INSERT statements can be prepared"
+            )
+
+    def execute(self, *parameters):
+        # returns the result of a SELECT, None for an INSERT
+        if len(parameters) != self.parameter_count:
+            raise ValueError(
+                f"Expected {self.parameter_count} parameters, found {len(parameters)}"
+            )
+        if self.schema_version != self.database.schema_version:
+            self.prepare()
+
+        if self.query_plan is None:
+            self.database.insert_values(
+                self.table_name,
+                [
+                    bound_value(value, parameters) if is_parameter(value) else value
+                    for value in self.values
+                ],
+            )
+            return None
+
+        query_plan = self.query_plan
+        if "where" in query_plan.parsed_query:
+            # only the WHERE clause is read by the index lookups
+            parsed_query = dict(query_plan.parsed_query)
+            parsed_query["where"] = bind_parameters(parsed_query["where"], parameters)
+            query_plan = QueryPlan(
+                parsed_query,
+                query_plan.table_names,
+                query_plan.plan,
+                index_aggregate=query_plan.index_aggregate,
+            )
+        return execute_plan(query_plan, self.database, parameters)
+
+
+def number_parameters(sql, prefix):
+    # replace the ? markers outside of quotes with prefix1, prefix2, ...
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group() != "?":
+            return match.group()
+        count += 1
+        return f"{prefix}{count}"
+
+    return PARAMETER_TOKENS.sub(replace, sql)
+
+
+def count_parameters(sql):
+    return sum(token == "?" for token in PARAMETER_TOKENS.findall(sql))
+
+
+def is_parameter(value):
+    return isinstance(value, str) and PARAMETER_NAME.fullmatch(value) is not None
+
+
+def bound_value(name, parameters):
+    return parameters[int(name[1:]) - 1]
+
+
+def bind_parameters(clause, parameters):
+    # copy of a mo-sql-parsing clause with the parameters replaced by their values, written
+    # the way mo-sql-parsing writes literals
+    if is_parameter(clause):
+        value = bound_value(clause, parameters)
+        return {"literal": value} if isinstance(value, str) else value
+    if isinstance(clause, dict):
+        return {
+            key: bind_parameters(value, parameters) for key, value in clause.items()
+        }
+    if isinstance(clause, list):
+        return [bind_parameters(value, parameters) for value in clause]
+    return clause
+
+
+def parse_arguments(text):
+    # values of the argument list of EXECUTE, e.g. 1, 'sushi', NULL
+    if not text.strip():
+        return []
+    values = parse(f"SELECT {text}")["select"]
+    if isinstance(values, dict):
+        values = [values]
+    arguments = []
+    for value in values:
+        value = literal_value(value["value"])
+        if value is not None and not isinstance(value, (int, float, str)):
+            raise ValueError(f"Invalid argument: {value}")
+        arguments.append(value)
+    return arguments
+
+
+def literal_value(value):
+    # the value of a mo-sql-parsing literal, which wraps strings and NULL in a dictionary
+    if isinstance(value, dict) and "literal" in value:
+        return value["literal"]
+    if isinstance(value, dict) and "null" in value:
+        return None
+    return value
@@ -0,0 +1,65 @@
+import re
+import threading
+from collections import OrderedDict
+
+# number of query plans kept by every database, see execute_query
+PLAN_CACHE_SIZE = 128
+# number of query results kept by every database, see execute_query
+RESULT_CACHE_SIZE = 64
+# results of more rows are not cached
+RESULT_CACHE_MAX_ROWS = 10000
+
+# quoted strings and identifiers, which are kept as they are, and runs of whitespace
+SQL_TOKENS = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|`[^`]*`|\s+")
+
+
+def normalize_sql(query):
+    # collapse the whitespace outside of quotes and drop the trailing semicolon, so that the
+    # same query typed differently shares its cache entries
+    if "'" in query or '"' in query or "`" in query:
+        query = SQL_TOKENS.sub(
+            lambda match: " " if match.group().isspace() else match.group(), query
+        )
+    else:
+        query = " ".join(query.split())
+    return query.strip().rstrip(";").rstrip()
+
+
+class LRUCache:
+    """
+    Mapping of at most size entries that evicts the least recently used entry, with counts
+    of its hits and misses. The queries of several threads read and fill it at once, see
+    ReadView, so every operation holds a lock.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        # returns None on a miss
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
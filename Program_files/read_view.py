@@ -0,0 +1,58 @@
+# Snapshot isolation for the queries of a database.
+#
+# The statements changing a database run one at a time and change the tables in place, and
+# every statement that returns makes its version of the database the committed one. A query
+# reads the committed version as of when it started, whatever statement runs meanwhile: it
+# is first executed on the current tables, with their indexes, which gives the committed
+# rows as long as no statement changed the tables it reads by the time it ends. Otherwise it
+# is executed again on the rows of the tables as of its version, which the tables rebuild
+# from the previous values they remember (see ColumnarTable.history). A query therefore
+# never waits for a statement and a statement never waits for a query.
+
+from table_storage import SnapshotRowView
+
+
+class ReadView:
+    """
+    The committed version of a database when the view was created, along with the tables
+    and their number of rows at that version.
+
+    The previous values of the rows changed after the version are kept by the tables as
+    long as the view is open; they are discarded by Database.collect_garbage once no open
+    view reads them. A view is a context manager that closes itself.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        with database.read_view_lock:
+            # key: table name, value: (ColumnarTable, number of rows)
+            self.version, self.tables = database.committed
+            database.read_views[self] = self.version
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        with self.database.read_view_lock:
+            self.database.read_views.pop(self, None)
+        # a query does not wait for a running statement, which collects when it returns
+        self.database.collect_garbage(blocking=False)
+
+    def unchanged(self, table_names):
+        # True if no statement changed the tables since the version, so their current rows
+        # and indexes are those of the version
+        for table_name in table_names:
+            table, _ = self.tables.get(table_name, (None, 0))
+            if (
+                table is not self.database.tables.get(table_name)
+                or table.version > self.version
+            ):
+                return False
+        return True
+
+    def row_view(self, table_name):
+        table, size = self.tables[table_name]
+        return SnapshotRowView(table, self.version, size)
@@ -0,0 +1,221 @@
+# Compile the mo-sql-parsing expressions of DELETE and UPDATE statements into functions that
+# evaluate them on a single row of a ColumnarTable, given by its row id.
+#
+# Column references are strings, optionally qualified by the table name, and literals are
+# numbers, booleans or {"literal": ...}. Conditions follow the three-valued logic of SQL:
+# a comparison with NULL is unknown (None), and a row only matches a WHERE clause that is
+# true, so e.g. DELETE FROM t WHERE a <> 1 keeps the rows where a is NULL.
+
+import operator
+import re
+
+COMPARISONS = {
+    "eq": operator.eq,
+    "neq": operator.ne,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+ARITHMETIC = {
+    "add": operator.add,
+    "sub": operator.sub,
+    "mul": operator.mul,
+    "div": operator.truediv,
+    "mod": operator.mod,
+}
+
+
+def compile_condition(condition, table_name, columns):
+    # function of (table, row_ids) returning the row ids of the rows satisfying the condition
+    evaluate = compile_expression(condition, table_name, columns)
+    return lambda table, row_ids: [
+        row_id for row_id in row_ids if evaluate(table, row_id) is True
+    ]
+
+
+def compile_expression(expression, table_name, columns):
+    # function of (table, row_id) returning the value of the expression, None for NULL
+    if isinstance(expression, str):
+        column = _column(expression, table_name, columns)
+        return lambda table, row_id: table.value(row_id, column)
+    if isinstance(expression, (bool, int, float)):
+        return lambda table, row_id: expression
+    if not isinstance(expression, dict) or len(expression) != 1:
+        raise ValueError(f"Invalid expression: {expression}")
+
+    name, operands = next(iter(expression.items()))
+    if name == "literal":
+        return lambda table, row_id: operands
+    if name == "null":
+        return lambda table, row_id: None
+
+    if name in ("and", "or"):
+        return _logical(
+            name, [compile_expression(o, table_name, columns) for o in operands]
+        )
+    if name in ("missing", "exists", "not", "neg"):
+        evaluate = compile_expression(operands, table_name, columns)
+        if name == "missing":
+            return lambda table, row_id: evaluate(table, row_id) is None
+        if name == "exists":
+            return lambda table, row_id: evaluate(table, row_id) is not None
+        if name == "not":
+            return lambda table, row_id: _not(evaluate(table, row_id))
+        return lambda table, row_id: _null_or(operator.neg, evaluate(table, row_id))
+
+    if not isinstance(operands, list):
+        raise ValueError(f"Invalid expression: {expression}")
+    if name in ("in", "nin"):
+        return _membership(name, operands, table_name, columns)
+    if name in ("like", "not_like"):
+        return _like(name, operands, table_name, columns)
+
+    evaluators = [compile_expression(o, table_name, columns) for o in operands]
+    if name in ("between", "not_between") and len(evaluators) == 3:
+        value, low, high = evaluators
+
+        def between(table, row_id):
+            result = _and(
+                [
+                    _null_or(operator.ge, value(table, row_id), low(table, row_id)),
+                    _null_or(operator.le, value(table, row_id), high(table, row_id)),
+                ]
+            )
+            return result if name == "between" else _not(result)
+
+        return between
+
+    function = COMPARISONS.get(name) or ARITHMETIC.get(name)
+    if function is None or len(evaluators) != 2:
+        raise ValueError(f"Unsupported expression: {expression}")
+    return _binary(function, operands, evaluators, table_name, columns)
+
+
+def _binary(function, operands, evaluators, table_name, columns):
+    # the common comparison of a column with a constant reads the column directly, since
+    # the condition of a full table scan is evaluated on every row
+    left, right = evaluators
+    if isinstance(operands[0], str) and (
+        isinstance(operands[1], (bool, int, float))
+        or (isinstance(operands[1], dict) and list(operands[1]) == ["literal"])
+    ):
+        column = _column(operands[0], table_name, columns)
+        constant = _literal_value(operands[1])
+
+        def compare(table, row_id):
+            value = table.value(row_id, column)
+            return None if value is None else function(value, constant)
+
+        return compare
+
+    def binary(table, row_id):
+        value = left(table, row_id)
+        if value is None:
+            return None
+        other = right(table, row_id)
+        return None if other is None else function(value, other)
+
+    return binary
+
+
+def _column(name, table_name, columns):
+    qualifier, _, column = name.rpartition(".")
+    if (qualifier and qualifier != table_name) or column not in columns:
+        raise ValueError(f"Column {name} does not exist in table {table_name}!")
+    return column
+
+
+def _literal_value(operand):
+    # value of a literal of an IN list or a LIKE pattern, which cannot refer to columns
+    if isinstance(operand, (bool, int, float)):
+        return operand
+    if isinstance(operand, dict) and len(operand) == 1:
+        if "literal" in operand:
+            return operand["literal"]
+        if "null" in operand:
+            return None
+    raise ValueError(f"Invalid literal: {operand}")
+
+
+def _null_or(function, *values):
+    # the result of an operator is NULL if any of its operands is
+    if any(value is None for value in values):
+        return None
+    return function(*values)
+
+
+def _not(value):
+    return None if value is None else not value
+
+
+def _and(values):
+    if any(value is False for value in values):
+        return False
+    return None if any(value is None for value in values) else True
+
+
+def _or(values):
+    if any(value is True for value in values):
+        return True
+    return None if any(value is None for value in values) else False
+
+
+def _logical(name, evaluators):
+    combine = _and if name == "and" else _or
+    return lambda table, row_id: combine(
+        [evaluate(table, row_id) for evaluate in evaluators]
+    )
+
+
+def _membership(name, operands, table_name, columns):
+    # IN and NOT IN a list of literals
+    if len(operands) != 2:
+        raise ValueError(f"Invalid expression: {{{name!r}: {operands}}}")
+    evaluate = compile_expression(operands[0], table_name, columns)
+    values = operands[1]
+    if isinstance(values, dict) and "literal" in values:
+        # a list of strings is a single literal, e.g. {"literal": ["x", "y"]}
+        values = values["literal"]
+        values = values if isinstance(values, list) else [values]
+    else:
+        values = values if isinstance(values, list) else [values]
+        values = [_literal_value(value) for value in values]
+    has_null = None in values
+    values = [value for value in values if value is not None]
+
+    def membership(table, row_id):
+        value = evaluate(table, row_id)
+        if value is None:
+            return None
+        # x IN (1, NULL) is unknown unless x = 1
+        result = True if value in values else (None if has_null else False)
+        return result if name == "in" else _not(result)
+
+    return membership
+
+
+def _like(name, operands, table_name, columns):
+    if len(operands) != 2:
+        raise ValueError(f"Invalid expression: {{{name!r}: {operands}}}")
+    evaluate = compile_expression(operands[0], table_name, columns)
+    pattern = _literal_value(operands[1])
+    if not isinstance(pattern, str):
+        raise ValueError(f"Invalid LIKE pattern: {operands[1]}")
+    # % matches any sequence of characters and _ a single character
+    regex = re.compile(
+        "".join(
+            ".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern
+        ),
+        re.DOTALL,
+    )
+
+    def like(table, row_id):
+        value = evaluate(table, row_id)
+        if value is None:
+            return None
+        matched = regex.fullmatch(str(value)) is not None
+        return matched if name == "like" else not matched
+
+    return like
@@ -0,0 +1,63 @@
+from BTrees.OOBTree import OOBTree
+
+
+class SecondaryIndex:
+    """
+    B-tree index on a non-key column, created with CREATE INDEX.
+
+    The tree maps every value of the column to the set of row ids holding that value. NULL
+    values are not indexed since they never satisfy a comparison.
+    """
+
+    def __init__(self, name, table_name, column):
+        self.name = name
+        self.table_name = table_name
+        self.column = column
+        self.tree = OOBTree()
+
+    def __len__(self):
+        return len(self.tree)
+
+    def build(self, table):
+        self.tree.clear()
+        for row_id in table.row_ids():
+            self.insert(table.value(row_id, self.column), row_id)
+
+    def insert(self, value, row_id):
+        if value is None:
+            return
+        row_ids = self.tree.get(value)
+        if row_ids is None:
+            self.tree[value] = {row_id}
+        else:
+            row_ids.add(row_id)
+
+    def remove(self, value, row_id):
+        if value is None:
+            return
+        row_ids = self.tree.get(value)
+        if row_ids is None:
+            return
+        row_ids.discard(row_id)
+        # drop empty entries so that minKey/maxKey stay meaningful
+        if not row_ids:
+            del self.tree[value]
+
+    def clear(self):
+        self.tree.clear()
+
+    def renumber(self, new_ids):
+        # map the row ids to those of the compacted table, see ColumnarTable.compact
+        self.tree.update(
+            [
+                (value, {new_ids[row_id] for row_id in row_ids})
+                for value, row_ids in self.tree.items()
+            ]
+        )
+
+    def scan(self, key_range):
+        # row ids of the rows whose value falls into key_range
+        row_ids = []
+        for value_row_ids in key_range.scan(self.tree):
+            row_ids.extend(value_row_ids)
+        return row_ids
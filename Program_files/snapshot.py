@@ -0,0 +1,125 @@
+import json
+import os
+import re
+import struct
+import zlib
+
+# start of every snapshot file: magic bytes, format version and length of the header
+SNAPSHOT_HEADER = struct.Struct("<8sIQ")
+SNAPSHOT_MAGIC = b"NUSQLSNP"
+SNAPSHOT_VERSION = 1
+# size of the blocks copied between a snapshot and the table files
+COPY_BLOCK_SIZE = 1 << 20
+
+
+def write_snapshot(path, catalog, table_directories):
+    """
+    Pack the files of the tables of a database into a single snapshot file.
+
+    The snapshot starts with a JSON header holding the catalog, in which every table lists
+    its files with their size and CRC-32, followed by the contents of the files in that
+    order. The files are the ones a file-backed database keeps in tables/ (see
+    Database.flush), so they are copied as is and restoring a snapshot does not convert
+    any value or build any index again.
+    """
+    tables = {}
+    for table_name, entry in catalog["tables"].items():
+        directory = table_directories[table_name]
+        files = []
+        for file_name in sorted(os.listdir(directory)):
+            file_path = os.path.join(directory, file_name)
+            files.append([file_name, os.path.getsize(file_path), _checksum(file_path)])
+        tables[table_name] = dict(entry, files=files)
+    header = json.dumps({"tables": tables}).encode("utf-8")
+
+    with open(path + ".tmp", "wb") as snapshot:
+        snapshot.write(
+            SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header))
+        )
+        snapshot.write(header)
+        for table_name, entry in tables.items():
+            for file_name, _, _ in entry["files"]:
+                with open(
+                    os.path.join(table_directories[table_name], file_name), "rb"
+                ) as file:
+                    while block := file.read(COPY_BLOCK_SIZE):
+                        snapshot.write(block)
+    os.replace(path + ".tmp", path)
+
+
+def read_snapshot(path, table_directory):
+    """
+    Unpack the table files of a snapshot written by write_snapshot, the files of every table
+    go to the directory returned by table_directory(table name). Returns the catalog.
+
+    Raises ValueError if the file is not a snapshot or a file of the snapshot is damaged.
+    """
+    with open(path, "rb") as snapshot:
+        start = snapshot.read(SNAPSHOT_HEADER.size)
+        if len(start) < SNAPSHOT_HEADER.size:
+            raise ValueError(f"{path} is not a database snapshot")
+        magic, version, length = SNAPSHOT_HEADER.unpack(start)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a database snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {version}")
+        try:
+            catalog = json.loads(snapshot.read(length).decode("utf-8"))
+        except ValueError:
+            raise ValueError(f"{path} is not a database snapshot") from None
+        # nothing is written before the whole header is known to be valid
+        _check_header(path, catalog)
+
+        for table_name, entry in catalog["tables"].items():
+            directory = table_directory(table_name)
+            os.makedirs(directory)
+            for file_name, size, checksum in entry.pop("files"):
+                crc = 0
+                with open(os.path.join(directory, file_name), "wb") as file:
+                    remaining = size
+                    while remaining:
+                        block = snapshot.read(min(remaining, COPY_BLOCK_SIZE))
+                        if not block:
+                            raise ValueError(f"Snapshot {path} is truncated")
+                        crc = zlib.crc32(block, crc)
+                        file.write(block)
+                        remaining -= len(block)
+                if crc != checksum:
+                    raise ValueError(
+                        f"Snapshot {path} is damaged: {table_name}/{file_name}"
+                    )
+    return catalog
+
+
+def _check_header(path, catalog):
+    # the table and file names of the header become paths, so they must stay inside the
+    # directory of their table
+    if not isinstance(catalog, dict) or not isinstance(catalog.get("tables"), dict):
+        raise ValueError(f"{path} is not a database snapshot")
+    for table_name, entry in catalog["tables"].items():
+        if not re.fullmatch(r"\w+", table_name) or not isinstance(entry, dict):
+            raise ValueError(f"{path} is not a database snapshot")
+        files = entry.get("files")
+        if not isinstance(files, list):
+            raise ValueError(f"Snapshot {path} is damaged: {table_name}")
+        for file in files:
+            if (
+                not isinstance(file, list)
+                or len(file) != 3
+                or not isinstance(file[0], str)
+                or not all(isinstance(number, int) for number in file[1:])
+                or file[1] < 0
+                or file[0] in ("", ".")
+                or ".." in file[0]
+                or "/" in file[0]
+                or "\\" in file[0]
+            ):
+                raise ValueError(f"Snapshot {path} is damaged: {table_name}")
+
+
+def _checksum(path):
+    crc = 0
+    with open(path, "rb") as file:
+        while block := file.read(COPY_BLOCK_SIZE):
+            crc = zlib.crc32(block, crc)
+    return crc
@@ -0,0 +1,122 @@
+import pickle
+import shutil
+
+from BTrees.OOBTree import OOBTree, OOBucket
+
+
+def save_tree(tree, path):
+    """
+    Save an OOBTree by its node and bucket layout, so that load_tree restores it without
+    inserting the keys again.
+
+    BTrees pickle a bucket together with the next bucket, which overflows the stack for
+    large trees, so the buckets are saved as a list of their items and the nodes refer to
+    them by position.
+    """
+    if isinstance(tree, StoredTree):
+        if tree.loaded is None:
+            # the tree has not been loaded, so its file is still up to date
+            shutil.copyfile(tree.path, path)
+            return
+        tree = tree.loaded
+
+    state = tree.__getstate__()
+    buckets = []
+    # an empty tree or a tree of a single bucket has no node to walk
+    if state is not None and len(state) > 1:
+        state = _node_layout(state[0], buckets)
+    with open(path, "wb") as file:
+        pickle.dump((state, buckets), file, pickle.HIGHEST_PROTOCOL)
+
+
+def _node_layout(children, buckets):
+    # children alternate between child nodes and the keys separating them
+    layout = []
+    for position, child in enumerate(children):
+        if position % 2:
+            layout.append(child)
+        elif isinstance(child, OOBucket):
+            buckets.append(child.__getstate__()[0])
+            layout.append(len(buckets) - 1)
+        else:
+            layout.append(_node_layout(child.__getstate__()[0], buckets))
+    return layout
+
+
+def load_tree(path):
+    with open(path, "rb") as file:
+        state, items = pickle.load(file)
+    tree = OOBTree()
+    if not items:
+        if state is not None:
+            tree.__setstate__(state)
+        return tree
+
+    # every bucket links to the next one, so they are created from the last one
+    buckets = [OOBucket() for _ in items]
+    buckets[-1].__setstate__((items[-1],))
+    for position in range(len(items) - 2, -1, -1):
+        buckets[position].__setstate__((items[position], buckets[position + 1]))
+    return _node(state, buckets)[0]
+
+
+def _node(layout, buckets):
+    # rebuild a node and return it with the first bucket below it
+    children, first_bucket = [], None
+    for position, child in enumerate(layout):
+        if position % 2:
+            children.append(child)
+            continue
+        if isinstance(child, int):
+            child, child_first_bucket = buckets[child], buckets[child]
+        else:
+            child, child_first_bucket = _node(child, buckets)
+        if first_bucket is None:
+            first_bucket = child_first_bucket
+        children.append(child)
+    node = OOBTree()
+    node.__setstate__((tuple(children), first_bucket))
+    return node, first_bucket
+
+
+class StoredTree:
+    """
+    B-tree saved by save_tree that is only loaded the first time it is used, so opening a
+    database does not rebuild the indexes of the tables that are not queried.
+
+    Behaves like the OOBTree it loads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.loaded = None
+
+    @property
+    def tree(self):
+        if self.loaded is None:
+            self.loaded = load_tree(self.path)
+        return self.loaded
+
+    def __getattr__(self, name):
+        return getattr(self.tree, name)
+
+    def __len__(self):
+        return len(self.tree)
+
+    def __bool__(self):
+        return bool(self.tree)
+
+    def __iter__(self):
+        return iter(self.tree)
+
+    def __contains__(self, key):
+        return key in self.tree
+
+    def __getitem__(self, key):
+        return self.tree[key]
+
+    def __setitem__(self, key, value):
+        self.tree[key] = value
+
+    def __delitem__(self, key):
+        del self.tree[key]
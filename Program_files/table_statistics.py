@@ -0,0 +1,169 @@
+from itertools import islice
+from operator import gt
+
+# share of the rows that may change before the distinct counts of a table are recomputed
+STALE_FRACTION = 0.1
+
+
+class ColumnStatistics:
+    def __init__(self):
+        self.min = None
+        self.max = None
+        self.nulls = 0
+        # True while the live rows, in row id order, are sorted by the column
+        self.sorted = True
+        # the last value appended to the column, used to keep track of sortedness
+        self.last = None
+        # min and max have to be recomputed after the current minimum or maximum is removed
+        self.stale_bounds = False
+        # cached number of distinct values, and the modification count it was computed at
+        self.distinct = None
+        self.distinct_at = 0
+
+    def __repr__(self):
+        return (
+            f"ColumnStatistics(min={self.min}, max={self.max}, nulls={self.nulls}, "
+            f"distinct={self.distinct}, sorted={self.sorted})"
+        )
+
+    def add(self, value):
+        if value is None:
+            self.nulls += 1
+            return
+        if self.last is not None and value < self.last:
+            self.sorted = False
+        self.last = value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def extend(self, values):
+        # add a batch of values at once
+        if None in values:
+            self.nulls += values.count(None)
+            values = [value for value in values if value is not None]
+        if not values:
+            return
+        if self.sorted and (
+            (self.last is not None and values[0] < self.last)
+            or any(map(gt, values, islice(values, 1, None)))
+        ):
+            self.sorted = False
+        self.last = values[-1]
+        low, high = min(values), max(values)
+        if self.min is None or low < self.min:
+            self.min = low
+        if self.max is None or high > self.max:
+            self.max = high
+
+    def remove(self, value):
+        # removing rows keeps the remaining rows sorted, but may shrink the bounds
+        if value is None:
+            self.nulls -= 1
+        elif value == self.min or value == self.max:
+            self.stale_bounds = True
+
+
+class TableStatistics:
+    """
+    Statistics catalog entry of a table, used by the cost model of the query engine.
+
+    The row count, NULL counts, bounds and sortedness of every column are updated as rows are
+    loaded, inserted, updated and deleted. Distinct counts need a pass over the column, so they
+    are computed on demand and recomputed once more than STALE_FRACTION of the rows changed.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.row_count = 0
+        self.columns = {column: ColumnStatistics() for column in table.columns}
+        # number of rows added, removed or updated since the table was created
+        self.modifications = 0
+
+    def __repr__(self):
+        return f"TableStatistics(row_count={self.row_count}, columns={self.columns})"
+
+    def add(self, row):
+        self.row_count += 1
+        self.modifications += 1
+        for column, statistics in self.columns.items():
+            statistics.add(row[column])
+
+    def extend(self, columns, count):
+        # add a batch of count rows given as {column: list of values}
+        self.row_count += count
+        self.modifications += count
+        for column, statistics in self.columns.items():
+            statistics.extend(columns[column])
+
+    def remove(self, row):
+        self.row_count -= 1
+        self.modifications += 1
+        for column, statistics in self.columns.items():
+            statistics.remove(row[column])
+
+    def update(self, column, old_value, new_value):
+        self.modifications += 1
+        statistics = self.columns[column]
+        statistics.remove(old_value)
+        statistics.add(new_value)
+        # the updated row keeps its position, so the column may no longer be sorted
+        statistics.sorted = False
+
+    def clear(self):
+        self.row_count = 0
+        self.modifications += 1
+        self.columns = {column: ColumnStatistics() for column in self.table.columns}
+
+    def dump(self):
+        # the statistics as a dictionary of plain values, see restore
+        return {
+            "row_count": self.row_count,
+            "modifications": self.modifications,
+            "columns": {
+                column: vars(statistics) for column, statistics in self.columns.items()
+            },
+        }
+
+    @classmethod
+    def restore(cls, table, state):
+        statistics = cls(table)
+        statistics.row_count = state["row_count"]
+        statistics.modifications = state["modifications"]
+        for column, column_state in state["columns"].items():
+            vars(statistics.columns[column]).update(column_state)
+        return statistics
+
+    def bounds(self, column):
+        statistics = self.columns[column]
+        if statistics.stale_bounds:
+            values = self._values(column)
+            statistics.min = min(values, default=None)
+            statistics.max = max(values, default=None)
+            statistics.stale_bounds = False
+        return statistics.min, statistics.max
+
+    def distinct(self, column):
+        # number of distinct non-NULL values of the column
+        statistics = self.columns[column]
+        changed = self.modifications - statistics.distinct_at
+        if statistics.distinct is None or changed > STALE_FRACTION * self.row_count:
+            statistics.distinct = len(set(self._values(column)))
+            statistics.distinct_at = self.modifications
+        # the cached count can be off by the rows changed since, but never exceed the rows
+        return max(min(statistics.distinct, self.row_count - statistics.nulls), 1)
+
+    def is_sorted(self, column):
+        # sorted in row id order, with no NULL that would break the order
+        statistics = self.columns[column]
+        return statistics.sorted and statistics.nulls == 0
+
+    def _values(self, column):
+        return [
+            value
+            for value in (
+                self.table.value(row_id, column) for row_id in self.table.row_ids()
+            )
+            if value is not None
+        ]
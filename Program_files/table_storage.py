@@ -0,0 +1,572 @@
+import copy
+import mmap
+import os
+import pickle
+from array import array
+from itertools import accumulate
+
+# array typecodes for the column types that have a fixed-width representation
+# DECIMAL is converted to float on load, so it shares the FLOAT buffer type
+TYPECODES = {
+    "int": "q",
+    "float": "d",
+    "boolean": "b",
+}
+
+
+def column_typecode(data_type):
+    if isinstance(data_type, dict) and "decimal" in data_type:
+        return TYPECODES["float"]
+    if isinstance(data_type, str):
+        return TYPECODES.get(data_type)
+    return None
+
+
+def _map(path, typecode=None):
+    # read-only memory map of a file, as a memoryview of the given array typecode
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # an empty file cannot be mapped
+            view = memoryview(b"")
+        else:
+            view = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+    return view.cast(typecode) if typecode else view
+
+
+def _write(path, data):
+    if isinstance(data, memoryview):
+        # a mapped column, only a view of bytes can be written
+        data = data.cast("B")
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+def _write_row_ids(path, row_ids):
+    _write(path, array("q", sorted(row_ids)))
+
+
+def _read_row_ids(path):
+    if not os.path.exists(path):
+        return set()
+    return set(_map(path, "q"))
+
+
+class ColumnarTable:
+    """
+    Column oriented storage for the rows of a single table.
+
+    INT, FLOAT, DECIMAL and BOOLEAN columns are stored in typed array buffers, every other
+    column is stored in a list of interned strings. A row is addressed by its row id, which
+    is its position in the column buffers. Deleted rows are tombstoned rather than removed
+    so the row ids stored in the indexing structures stay valid.
+
+    Iterating over the table yields the live rows as dictionaries, so code written against
+    the previous list-of-dictionaries storage keeps working.
+
+    A table can be saved to a directory of column files and opened again without reading
+    them: the columns of an opened table are memory-mapped, so only the pages holding the
+    rows that are read are loaded, and a column is copied into memory when it is first
+    changed.
+
+    Values are changed and rows deleted in place, but the table remembers the previous
+    value of every change in its history, tagged with the version of the statement that
+    made it, so that the queries reading an older version of the database can still read
+    the rows as they were (see ReadView). Compacting a table copies its live rows to a new
+    table and leaves this one as it is.
+    """
+
+    def __init__(self, schema):
+        self.columns = tuple(schema)
+        self.data = {}
+        self.typecodes = {}
+        self.booleans = set()
+        # row ids holding NULL, tracked per column for the typed buffers only
+        self.nulls = {}
+        # row ids of deleted rows
+        self.deleted = set()
+        self.size = 0
+        self._strings = {}
+        # cached list of live row ids, only needed once rows have been deleted
+        self._live_row_ids = None
+        # columns that are still read from their memory-mapped file, see open
+        self._mapped = set()
+        # version of the statement that changed the table last, set by the database before
+        # the statement changes it
+        self.version = 0
+        # previous values of the rows changed by the statements after the oldest version
+        # that is still read, see row_tuple_at
+        # key: row id, value: list of (version, column, previous value) in version order,
+        # column is None when the row was deleted
+        self.history = {}
+
+        for column in self.columns:
+            typecode = column_typecode(schema[column]["type"])
+            self.typecodes[column] = typecode
+            if typecode:
+                self.data[column] = array(typecode)
+                self.nulls[column] = set()
+            else:
+                self.data[column] = []
+            if typecode == TYPECODES["boolean"]:
+                self.booleans.add(column)
+
+        self._readers = self._build_readers()
+        # long-lived executor view over all live rows, see RowView
+        self.view = RowView(self)
+
+    def __len__(self):
+        return self.size - len(self.deleted)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        for row_id in self.row_ids():
+            yield self.row(row_id)
+
+    def __getitem__(self, row_id):
+        return self.row(row_id)
+
+    def __contains__(self, row_id):
+        return 0 <= row_id < self.size and row_id not in self.deleted
+
+    def __repr__(self):
+        return f"ColumnarTable(columns={self.columns}, rows={len(self)})"
+
+    def row_ids(self):
+        if not self.deleted:
+            return iter(range(self.size))
+        return (row_id for row_id in range(self.size) if row_id not in self.deleted)
+
+    def live_row_ids(self):
+        if self._live_row_ids is None:
+            self._live_row_ids = list(self.row_ids())
+        return self._live_row_ids
+
+    def row_view(self, row_ids=None):
+        if row_ids is None:
+            return self.view
+        return RowView(self, row_ids)
+
+    def value(self, row_id, column):
+        nulls = self.nulls.get(column)
+        if nulls and row_id in nulls:
+            return None
+        value = self.data[column][row_id]
+        if column in self.booleans and value is not None:
+            return bool(value)
+        return value
+
+    def row(self, row_id):
+        return {column: self.value(row_id, column) for column in self.columns}
+
+    def row_tuple(self, row_id):
+        return tuple(
+            [
+                (
+                    None
+                    if nulls and row_id in nulls
+                    else (bool(buffer[row_id]) if boolean else buffer[row_id])
+                )
+                for buffer, nulls, boolean in self._readers
+            ]
+        )
+
+    def append(self, row):
+        row_id = self.size
+        for column in self.columns:
+            self._store(column, row_id, row[column])
+        self.size += 1
+        if self.deleted:
+            self._live_row_ids = None
+        return row_id
+
+    def extend(self, columns):
+        # append a batch of rows given as {column: list of values} one column at a time,
+        # returns the range of their row ids
+        start = self.size
+        for column in self.columns:
+            self._store_column(column, start, columns[column])
+        self.size += len(columns[self.columns[0]])
+        if self.deleted:
+            self._live_row_ids = None
+        return range(start, self.size)
+
+    def set_value(self, row_id, column, value):
+        if row_id not in self:
+            raise IndexError(f"Row {row_id} does not exist!")
+        # the previous value is remembered before it is overwritten, so a query that reads
+        # the new value also finds the previous one
+        self._remember(row_id, column, self.value(row_id, column))
+        self._store(column, row_id, value)
+
+    def delete(self, row_id):
+        if row_id not in self:
+            raise IndexError(f"Row {row_id} does not exist!")
+        self._remember(row_id, None, None)
+        self.deleted.add(row_id)
+        self._live_row_ids = None
+
+    def _remember(self, row_id, column, value):
+        changes = self.history.get(row_id)
+        if changes is None:
+            self.history[row_id] = [(self.version, column, value)]
+        else:
+            changes.append((self.version, column, value))
+
+    def row_ids_at(self, version, size):
+        # ids of the rows of the table as of a version, when it had size rows
+        history = self.history
+        return [
+            row_id
+            for row_id in range(size)
+            if row_id not in self.deleted
+            or any(
+                column is None and change_version > version
+                for change_version, column, _ in history.get(row_id, ())
+            )
+        ]
+
+    def row_tuple_at(self, row_id, version):
+        # the values of a row as of a version: its current values are read first, and the
+        # changes made after the version are then undone, latest first
+        values = self.row_tuple(row_id)
+        changes = self.history.get(row_id)
+        if not changes:
+            return values
+        values = list(values)
+        for change_version, column, value in reversed(changes):
+            if change_version <= version:
+                break
+            if column is not None:
+                values[self.columns.index(column)] = value
+        return tuple(values)
+
+    def discard_history(self, version):
+        # forget the previous values that no query reads any more: those of the changes
+        # made up to a version
+        if self.version <= version:
+            self.history = {}
+            return
+        for row_id, changes in list(self.history.items()):
+            if changes[-1][0] <= version:
+                del self.history[row_id]
+            elif changes[0][0] <= version:
+                self.history[row_id] = [
+                    change for change in changes if change[0] > version
+                ]
+
+    def compact(self):
+        """
+        Copy the live rows to a new table without the deleted rows, which is returned along
+        with an array mapping every row id of this table to its row id in the new table, or
+        -1 for a deleted row. The live rows keep their order and are numbered from 0 again,
+        so the row ids held elsewhere, e.g. by the indexes, have to be renumbered with it.
+        This table is left as it is for the queries still reading it.
+        """
+        live = self.live_row_ids()
+        new_ids = array("q", [-1]) * self.size
+        for new_id, row_id in enumerate(live):
+            new_ids[row_id] = new_id
+
+        table = copy.copy(self)
+        table.data = {}
+        table.nulls = {}
+        table.booleans = set(self.booleans)
+        table._strings = {}
+        for column in self.columns:
+            buffer = self.data[column]
+            nulls = self.nulls.get(column)
+            if nulls is not None:
+                table.data[column] = array(
+                    self.typecodes[column], map(buffer.__getitem__, live)
+                )
+                table.nulls[column] = {
+                    new_ids[row_id] for row_id in nulls if new_ids[row_id] >= 0
+                }
+            else:
+                table.data[column] = [
+                    value if value is None else table._strings.setdefault(value, value)
+                    for value in map(buffer.__getitem__, live)
+                ]
+        table._mapped = set()
+        table._readers = table._build_readers()
+        table.deleted = set()
+        table._live_row_ids = None
+        table.size = len(live)
+        table.history = {}
+        table.view = RowView(table)
+        return table, new_ids
+
+    def _store(self, column, row_id, value):
+        if column in self._mapped:
+            self._writable(column)
+        buffer = self.data[column]
+        nulls = self.nulls.get(column)
+
+        if nulls is not None:
+            if value is None:
+                nulls.add(row_id)
+                value = 0
+            else:
+                nulls.discard(row_id)
+        elif isinstance(value, str):
+            value = self._strings.setdefault(value, value)
+
+        try:
+            if row_id == len(buffer):
+                buffer.append(value)
+            else:
+                buffer[row_id] = value
+        except (OverflowError, TypeError):
+            # the value does not fit the typed buffer (e.g. an integer wider than 64 bits),
+            # so fall back to a plain list for this column
+            self._degrade(column)
+            self._store(column, row_id, value)
+        except BufferError:
+            # see _copy_exported
+            self._copy_exported(column)
+            self._store(column, row_id, value)
+
+    def _store_column(self, column, start, values):
+        if column in self._mapped:
+            self._writable(column)
+        buffer = self.data[column]
+        nulls = self.nulls.get(column)
+
+        stored = values
+        has_nulls = nulls is not None and None in values
+        if has_nulls:
+            stored = [0 if value is None else value for value in values]
+        elif nulls is None:
+            # interning a value that is not a string is harmless
+            stored = list(map(self._strings.setdefault, values, values))
+
+        try:
+            buffer.extend(stored)
+        except (OverflowError, TypeError):
+            # see _store
+            del buffer[start:]
+            self._degrade(column)
+            self.data[column].extend(values)
+            return
+        except BufferError:
+            self._copy_exported(column)
+            self.data[column].extend(stored)
+
+        if has_nulls:
+            nulls.update(
+                start + position
+                for position, value in enumerate(values)
+                if value is None
+            )
+
+    def _degrade(self, column):
+        nulls = self.nulls.pop(column)
+        values = [
+            self.value(row_id, column) for row_id in range(len(self.data[column]))
+        ]
+        for row_id in nulls:
+            values[row_id] = None
+        self.data[column] = values
+        self.booleans.discard(column)
+        self._readers = self._build_readers()
+
+    def _copy_exported(self, column):
+        # a typed buffer cannot grow while a query reads it through numpy (see
+        # vectorized.column_vector), so the table goes on with a copy of it and the query
+        # keeps the buffer it reads
+        self.data[column] = array(self.typecodes[column], self.data[column])
+        self._readers = self._build_readers()
+
+    def _writable(self, column):
+        # copy a column that is read from its file into memory before it is changed
+        buffer = self.data[column]
+        if column in self.nulls:
+            self.data[column] = array(self.typecodes[column])
+            self.data[column].frombytes(buffer.cast("B"))
+        else:
+            self.data[column] = [
+                value if value is None else self._strings.setdefault(value, value)
+                for value in buffer
+            ]
+        self._mapped.discard(column)
+        self._readers = self._build_readers()
+
+    def save(self, directory):
+        """
+        Write the table to a directory, one file per column, and return the description of
+        the files that open needs. The directory must not be the one the table was opened
+        from, since its files may still be mapped.
+
+        Typed columns are written as the raw bytes of their array buffer and string columns
+        as their UTF-8 encoded values followed by the offset of every value. Columns that
+        hold other values, e.g. integers too wide for a typed buffer, are pickled.
+        """
+        columns = []
+        for position, column in enumerate(self.columns):
+            path = os.path.join(directory, str(position))
+            buffer = self.data[column]
+            if column in self.nulls:
+                _write(path + ".data", buffer)
+                _write_row_ids(path + ".nulls", self.nulls[column])
+                columns.append("array")
+            elif isinstance(buffer, StringColumn):
+                _write(path + ".data", buffer.data)
+                _write(path + ".offsets", buffer.offsets)
+                _write_row_ids(path + ".nulls", buffer.nulls)
+                columns.append("strings")
+            elif self._save_strings(path, buffer):
+                columns.append("strings")
+            else:
+                with open(path + ".pickle", "wb") as file:
+                    pickle.dump(buffer, file, pickle.HIGHEST_PROTOCOL)
+                columns.append("pickle")
+        _write_row_ids(os.path.join(directory, "deleted"), self.deleted)
+        return {"size": self.size, "columns": columns}
+
+    @staticmethod
+    def _save_strings(path, values):
+        try:
+            encoded = [b"" if value is None else value.encode() for value in values]
+        except AttributeError:
+            # not a string column
+            return False
+        offsets = array("q", [0])
+        offsets.extend(accumulate(map(len, encoded)))
+        _write(path + ".data", b"".join(encoded))
+        _write(path + ".offsets", offsets)
+        _write_row_ids(
+            path + ".nulls",
+            [row_id for row_id, value in enumerate(values) if value is None],
+        )
+        return True
+
+    @classmethod
+    def open(cls, schema, directory, storage):
+        # open a table written by save, storage is the description returned by save
+        table = cls(schema)
+        table.size = storage["size"]
+        table.deleted = _read_row_ids(os.path.join(directory, "deleted"))
+        for position, (column, column_format) in enumerate(
+            zip(table.columns, storage["columns"])
+        ):
+            path = os.path.join(directory, str(position))
+            if column_format == "pickle":
+                with open(path + ".pickle", "rb") as file:
+                    table.data[column] = pickle.load(file)
+                # the column was degraded from a typed buffer, see _degrade
+                table.nulls.pop(column, None)
+                table.booleans.discard(column)
+                continue
+            if column_format == "strings":
+                table.data[column] = StringColumn(
+                    _map(path + ".offsets", "q"),
+                    _map(path + ".data"),
+                    _read_row_ids(path + ".nulls"),
+                )
+            else:
+                table.data[column] = _map(path + ".data", table.typecodes[column])
+                table.nulls[column] = _read_row_ids(path + ".nulls")
+            table._mapped.add(column)
+        table._readers = table._build_readers()
+        return table
+
+    def _build_readers(self):
+        return [
+            (self.data[column], self.nulls.get(column), column in self.booleans)
+            for column in self.columns
+        ]
+
+
+class StringColumn:
+    """
+    Read-only sequence of the values of a string column saved by ColumnarTable.save.
+
+    data holds the UTF-8 encoded values one after the other and offsets the position of
+    every value in data, followed by the end of the last value. Both are memory-mapped, so
+    reading a value only loads the pages holding it.
+    """
+
+    def __init__(self, offsets, data, nulls):
+        self.offsets = offsets
+        self.data = data
+        self.nulls = nulls
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row_id):
+        if row_id in self.nulls:
+            return None
+        return str(self.data[self.offsets[row_id] : self.offsets[row_id + 1]], "utf-8")
+
+    def __iter__(self):
+        for row_id in range(len(self)):
+            yield self[row_id]
+
+
+class RowView:
+    """
+    Read-only sequence of row tuples over a ColumnarTable.
+
+    The sqlglot executor only needs len() and positional access to the rows of a table, so a
+    view lets it read straight from the column buffers without copying. A view over the whole
+    table always reflects the current content of the table; a view can also be restricted to
+    a list of row ids, e.g. the rows returned by an index lookup.
+    """
+
+    def __init__(self, table, row_ids=None):
+        self.table = table
+        self.row_ids = row_ids
+
+    def _ids(self):
+        if self.row_ids is not None:
+            return self.row_ids
+        if self.table.deleted:
+            return self.table.live_row_ids()
+        return None
+
+    def __len__(self):
+        row_ids = self._ids()
+        return self.table.size if row_ids is None else len(row_ids)
+
+    def __getitem__(self, index):
+        row_ids = self._ids()
+        if row_ids is None:
+            if not -self.table.size <= index < self.table.size:
+                raise IndexError("row index out of range")
+            return self.table.row_tuple(index % self.table.size)
+        return self.table.row_tuple(row_ids[index])
+
+    def __iter__(self):
+        row_ids = self._ids()
+        row_tuple = self.table.row_tuple
+        for row_id in range(self.table.size) if row_ids is None else row_ids:
+            yield row_tuple(row_id)
+
+
+class SnapshotRowView:
+    """
+    Read-only sequence of the row tuples of a ColumnarTable as of a version of the database,
+    when the table had size rows, see ReadView.
+
+    Unlike a RowView, it is not read by the vectorized scans or probed through the indexes,
+    which only hold the current rows.
+    """
+
+    def __init__(self, table, version, size):
+        self.table = table
+        self.version = version
+        self.row_ids = table.row_ids_at(version, size)
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def __getitem__(self, index):
+        return self.table.row_tuple_at(self.row_ids[index], self.version)
+
+    def __iter__(self):
+        row_tuple_at = self.table.row_tuple_at
+        for row_id in self.row_ids:
+            yield row_tuple_at(row_id, self.version)
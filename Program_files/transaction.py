@@ -0,0 +1,198 @@
+# Transactions of a database, from BEGIN to COMMIT or ROLLBACK.
+#
+# The statements of a transaction do not change the tables: their changes are kept in a
+# delta per table, which the statements and queries of the transaction read in place of the
+# table. COMMIT checks the final rows for duplicates once and applies the deltas with one
+# batch of index and storage updates per table, see Database.commit. ROLLBACK drops them.
+
+import threading
+
+
+class Transaction:
+    """
+    The changes of the statements of a transaction, opened by Database.begin in the thread
+    that runs them. The queries of that thread read the rows as changed by the
+    transaction, those of the other threads read the committed rows.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.thread = threading.get_ident()
+        # key: table name, value: TableDelta
+        self.deltas = {}
+
+    def delta(self, table_name):
+        if table_name not in self.deltas:
+            self.deltas[table_name] = TableDelta(self.database.tables[table_name])
+        return self.deltas[table_name]
+
+    def changes(self, table_names):
+        # True if the transaction changed any of the tables
+        return any(
+            self.deltas[table_name].changed()
+            for table_name in table_names
+            if table_name in self.deltas
+        )
+
+    def row_view(self, table_name):
+        if table_name not in self.deltas:
+            return self.database.tables[table_name].view
+        return DeltaRowView(self.deltas[table_name])
+
+
+class TableDelta:
+    """
+    The rows of a ColumnarTable as changed by a transaction, read like the table itself by
+    the statements of the transaction (value, row, row_tuple, row_ids).
+
+    Only the changes are kept: the new values of the updated rows, the row ids of the
+    deleted rows and the columns of the inserted rows, which get the row ids following
+    those of the table. The values the transaction did not change are read from the table.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.columns = table.columns
+        # row id of the first row inserted by the transaction
+        self.start = table.size
+        self.size = table.size
+        # key: row id of a row of the table, value: {column: new value}
+        self.updated = {}
+        # row ids of the deleted rows, rows of the table or inserted by the transaction
+        self.removed = set()
+        # key: column, value: list of the values of the inserted rows in row id order
+        self.inserted = {column: [] for column in self.columns}
+        self._live_row_ids = None
+
+    def __len__(self):
+        return len(self.table) + self.size - self.start - len(self.removed)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def changed(self):
+        return bool(self.updated or self.removed or self.size > self.start)
+
+    def value(self, row_id, column):
+        if row_id >= self.start:
+            return self.inserted[column][row_id - self.start]
+        values = self.updated.get(row_id)
+        if values is not None and column in values:
+            return values[column]
+        return self.table.value(row_id, column)
+
+    def row(self, row_id):
+        return {column: self.value(row_id, column) for column in self.columns}
+
+    def row_tuple(self, row_id):
+        if row_id < self.start and row_id not in self.updated:
+            return self.table.row_tuple(row_id)
+        return tuple([self.value(row_id, column) for column in self.columns])
+
+    def row_ids(self):
+        removed = self.removed
+        for row_id in self.table.row_ids():
+            if row_id not in removed:
+                yield row_id
+        for row_id in range(self.start, self.size):
+            if row_id not in removed:
+                yield row_id
+
+    def live_row_ids(self):
+        if self._live_row_ids is None:
+            self._live_row_ids = list(self.row_ids())
+        return self._live_row_ids
+
+    def candidates(self, row_ids):
+        # the rows that may satisfy a WHERE clause, given the rows of the table that an
+        # index found for it: the index holds neither the values the transaction changed
+        # nor the rows it inserted
+        candidates = [
+            row_id
+            for row_id in row_ids
+            if row_id not in self.removed and row_id not in self.updated
+        ]
+        candidates.extend(self.updated)
+        candidates.extend(
+            row_id
+            for row_id in range(self.start, self.size)
+            if row_id not in self.removed
+        )
+        return candidates
+
+    def extend(self, columns):
+        # insert a batch of rows given as {column: list of values}
+        for column, values in columns.items():
+            self.inserted[column].extend(values)
+        self.size += len(columns[self.columns[0]])
+        self._live_row_ids = None
+
+    def update(self, changes):
+        # changes: list of (row id, {column: new value})
+        for row_id, values in changes:
+            if row_id >= self.start:
+                for column, value in values.items():
+                    self.inserted[column][row_id - self.start] = value
+            else:
+                self.updated.setdefault(row_id, {}).update(values)
+
+    def delete(self, row_ids):
+        for row_id in row_ids:
+            self.removed.add(row_id)
+            self.updated.pop(row_id, None)
+        self._live_row_ids = None
+
+    def deleted_rows(self):
+        # row ids of the rows of the table the transaction deleted
+        return sorted(row_id for row_id in self.removed if row_id < self.start)
+
+    def updated_rows(self):
+        # the changes of the rows of the table as (row id, {column: new value}), without
+        # the values set to what they already were
+        changes = []
+        for row_id, values in self.updated.items():
+            values = {
+                column: value
+                for column, value in values.items()
+                if self.table.value(row_id, column) != value
+            }
+            if values:
+                changes.append((row_id, values))
+        return changes
+
+    def inserted_columns(self):
+        # the inserted rows that were not deleted, as {column: list of values}
+        positions = [
+            position
+            for position in range(self.size - self.start)
+            if self.start + position not in self.removed
+        ]
+        if len(positions) == self.size - self.start:
+            return self.inserted
+        return {
+            column: [values[position] for position in positions]
+            for column, values in self.inserted.items()
+        }
+
+
+class DeltaRowView:
+    """
+    Read-only sequence of the row tuples of a TableDelta. Like a SnapshotRowView, it is not
+    read by the vectorized scans or probed through the indexes, which only hold the
+    committed rows.
+    """
+
+    def __init__(self, delta):
+        self.delta = delta
+        self.row_ids = delta.live_row_ids()
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def __getitem__(self, index):
+        return self.delta.row_tuple(self.row_ids[index])
+
+    def __iter__(self):
+        row_tuple = self.delta.row_tuple
+        for row_id in self.row_ids:
+            yield row_tuple(row_id)
@@ -0,0 +1,414 @@
+import statistics
+from array import array
+
+from sqlglot import exp
+from sqlglot.executor.table import Table
+
+from table_storage import RowView, StringColumn
+
+try:
+    import numpy as np
+except ImportError:
+    # scans and aggregates are evaluated row by row
+    np = None
+
+# whether the executor evaluates scans and aggregates with numpy
+VECTORIZED = np is not None
+
+# numpy types of the array typecodes of ColumnarTable
+DTYPES = {
+    "q": "int64",
+    "d": "float64",
+    "b": "int8",
+}
+
+COMPARISONS = {
+    exp.EQ: lambda left, right: left == right,
+    exp.NEQ: lambda left, right: left != right,
+    exp.GT: lambda left, right: left > right,
+    exp.GTE: lambda left, right: left >= right,
+    exp.LT: lambda left, right: left < right,
+    exp.LTE: lambda left, right: left <= right,
+}
+
+ARITHMETIC = {
+    exp.Add: lambda left, right: left + right,
+    exp.Sub: lambda left, right: left - right,
+    exp.Mul: lambda left, right: left * right,
+}
+
+# integer results beyond this bound may have overflowed the 64-bit arrays
+INTEGER_BOUND = 2**62
+
+
+class Unsupported(Exception):
+    # raised for an expression that is left to the row by row executor
+    pass
+
+
+class Vector:
+    """
+    Values of an expression for the selected rows of a table: a numpy array, or a Python
+    value that is the same for every row, along with the mask of the rows where it is not
+    NULL (None if it is never NULL).
+
+    kind is "number", "boolean", "string" or "object"; only numbers and booleans are
+    compared with each other and used in arithmetic.
+    """
+
+    def __init__(self, values, valid, kind):
+        self.values = values
+        self.valid = valid
+        self.kind = kind
+
+
+class SelectedRows(Table):
+    """
+    Rows of a ColumnarTable selected by a vectorized scan, as a sqlglot table.
+
+    The rows are only built if a step that is not vectorized reads them, so an aggregate
+    over the scan reads the column buffers directly.
+    """
+
+    def __init__(self, columns, table, row_ids):
+        super().__init__(columns)
+        self.table = table
+        self.row_ids = row_ids
+        self._rows = None
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            self._rows = materialize(self.table, self.table.columns, self.row_ids)
+        return self._rows
+
+    @rows.setter
+    def rows(self, rows):
+        # set to an empty list by Table
+        self._rows = rows or None
+
+    def __len__(self):
+        return len(self.row_ids)
+
+
+def executor_rows(table):
+    # the ColumnarTable and row ids behind a sqlglot table built by executor_table
+    rows = table.rows
+    if not isinstance(rows, RowView):
+        return None
+    if rows.row_ids is not None:
+        return rows.table, np.array(rows.row_ids, dtype="int64")
+    row_ids = np.arange(rows.table.size, dtype="int64")
+    if rows.table.deleted:
+        row_ids = row_ids[~mask(rows.table.deleted, rows.table.size)]
+    return rows.table, row_ids
+
+
+def scan(table, columns, row_ids, condition, projections, limit, parameters):
+    """
+    Filter and project the rows of a ColumnarTable with numpy. columns are the executor
+    names of the columns of the table.
+
+    Returns the output columns and either the selected row ids, if there are no
+    projections, or the projected rows. Raises Unsupported for an expression numpy cannot
+    evaluate like the row by row executor.
+    """
+    if condition is not None:
+        true = Evaluator(table, columns, row_ids, parameters).truth(condition)
+        row_ids = row_ids[true]
+    if limit < len(row_ids):
+        row_ids = row_ids[: int(limit)]
+    if not projections:
+        return columns, row_ids
+
+    evaluator = Evaluator(table, columns, row_ids, parameters)
+    values = [
+        evaluator.python_values(evaluator.value(projection.unalias()))
+        for projection in projections
+    ]
+    return [projection.alias_or_name for projection in projections], list(zip(*values))
+
+
+def aggregate(table, columns, row_ids, aggregations, operands, parameters):
+    # the values of aggregations without GROUP BY over the selected rows, see scan
+    evaluator = Evaluator(table, columns, row_ids, parameters)
+    evaluator.operands = {
+        operand.alias: (
+            None
+            if isinstance(operand.this, exp.Star)
+            else evaluator.value(operand.this)
+        )
+        for operand in operands
+    }
+    return [evaluator.aggregate(aggregation.unalias()) for aggregation in aggregations]
+
+
+class Evaluator:
+    def __init__(self, table, columns, row_ids, parameters):
+        self.table = table
+        self.positions = {column: position for position, column in enumerate(columns)}
+        self.row_ids = row_ids
+        self.parameters = parameters
+        # aliases of the aggregate operands mapped to their values, None for COUNT(*)
+        self.operands = {}
+        self.vectors = {}
+
+    def truth(self, expression):
+        # mask of the rows where a predicate is true; like in the row by row executor, a
+        # comparison with NULL is false rather than unknown, so NOT of it is true
+        if isinstance(expression, exp.Paren):
+            return self.truth(expression.this)
+        if isinstance(expression, exp.And):
+            return self.truth(expression.this) & self.truth(expression.expression)
+        if isinstance(expression, exp.Or):
+            return self.truth(expression.this) | self.truth(expression.expression)
+        if isinstance(expression, exp.Not):
+            return ~self.truth(expression.this)
+        if isinstance(expression, exp.Is) and isinstance(
+            expression.expression, exp.Null
+        ):
+            return ~self.valid(self.value(expression.this))
+        if type(expression) in COMPARISONS:
+            left = self.value(expression.this)
+            right = self.value(expression.expression)
+            if (left.kind == "string") != (right.kind == "string"):
+                raise Unsupported()
+            if "object" in (left.kind, right.kind):
+                raise Unsupported()
+            if self.is_null(left) or self.is_null(right):
+                return np.zeros(len(self.row_ids), dtype=bool)
+            result = self.broadcast(
+                COMPARISONS[type(expression)](left.values, right.values)
+            )
+            return result & self.valid(left) & self.valid(right)
+        if isinstance(expression, exp.In) and not expression.args.get("query"):
+            vector = self.number(self.value(expression.this))
+            values = [
+                self.number(self.value(value)) for value in expression.expressions
+            ]
+            if not isinstance(vector.values, np.ndarray) or any(
+                isinstance(value.values, np.ndarray) for value in values
+            ):
+                raise Unsupported()
+            listed = [value.values for value in values if value.values is not None]
+            result = np.isin(vector.values, listed) & self.valid(vector)
+            if len(listed) < len(values):
+                # the row by row executor tests membership with Python's in, so a NULL
+                # is in a list holding NULL
+                result |= ~self.valid(vector)
+            return result
+
+        vector = self.value(expression)
+        if vector.kind not in ("number", "boolean") or self.is_null(vector):
+            raise Unsupported()
+        return self.broadcast(vector.values != 0) & self.valid(vector)
+
+    def value(self, expression):
+        if isinstance(expression, exp.Paren):
+            return self.value(expression.this)
+        if isinstance(expression, exp.Column):
+            return self.column(expression)
+        if isinstance(expression, exp.Literal):
+            if expression.is_string:
+                return Vector(expression.this, None, "string")
+            try:
+                return Vector(int(expression.this), None, "number")
+            except ValueError:
+                return Vector(float(expression.this), None, "number")
+        if isinstance(expression, exp.Boolean):
+            return Vector(expression.this, None, "boolean")
+        if isinstance(expression, exp.Null):
+            return Vector(None, None, "number")
+        if isinstance(expression, exp.Placeholder):
+            # a parameter of a prepared statement, see PreparedStatement
+            return self.parameter(self.parameters[int(expression.name) - 1])
+        if isinstance(expression, exp.Neg):
+            vector = self.number(self.value(expression.this))
+            return self.checked(Vector(-vector.values, vector.valid, "number"))
+        if type(expression) in ARITHMETIC:
+            left = self.number(self.value(expression.this))
+            right = self.number(self.value(expression.expression))
+            if self.is_null(left) or self.is_null(right):
+                return Vector(None, None, "number")
+            operation = ARITHMETIC[type(expression)]
+            values = operation(left.values, right.values)
+            if np.asarray(values).dtype.kind == "i":
+                # a product may wrap around to a small value, so the bound is checked on
+                # the floating point result
+                bound = np.abs(
+                    operation(
+                        np.asarray(left.values, dtype=np.float64),
+                        np.asarray(right.values, dtype=np.float64),
+                    )
+                )
+                if bound.size and bound.max() >= INTEGER_BOUND:
+                    raise Unsupported()
+            return self.checked(Vector(values, self.valid_both(left, right), "number"))
+        raise Unsupported()
+
+    def column(self, expression):
+        name = expression.name
+        if name in self.operands and not expression.table:
+            return self.operands[name]
+        if name not in self.positions:
+            raise Unsupported()
+        if name not in self.vectors:
+            self.vectors[name] = column_vector(
+                self.table, self.table.columns[self.positions[name]], self.row_ids
+            )
+        return self.vectors[name]
+
+    @staticmethod
+    def parameter(value):
+        if value is None:
+            return Vector(None, None, "number")
+        if isinstance(value, bool):
+            return Vector(value, None, "boolean")
+        if isinstance(value, (int, float)):
+            return Vector(value, None, "number")
+        if isinstance(value, str):
+            return Vector(value, None, "string")
+        raise Unsupported()
+
+    @staticmethod
+    def number(vector):
+        if vector.kind not in ("number", "boolean"):
+            raise Unsupported()
+        if isinstance(vector.values, np.ndarray) and vector.values.dtype == np.int8:
+            return Vector(vector.values.astype(np.int64), vector.valid, "number")
+        return vector
+
+    @staticmethod
+    def checked(vector):
+        # Python integers do not overflow, so neither may the 64-bit results
+        values = vector.values
+        if isinstance(values, np.ndarray):
+            if values.dtype.kind == "i" and len(values):
+                if max(-int(values.min()), int(values.max())) >= INTEGER_BOUND:
+                    raise Unsupported()
+        elif isinstance(values, int) and abs(values) >= INTEGER_BOUND:
+            raise Unsupported()
+        return vector
+
+    @staticmethod
+    def is_null(vector):
+        return vector.values is None
+
+    def valid(self, vector):
+        if vector.valid is None:
+            return np.ones(len(self.row_ids), dtype=bool)
+        return vector.valid
+
+    def valid_both(self, left, right):
+        if left.valid is None:
+            return right.valid
+        if right.valid is None:
+            return left.valid
+        return left.valid & right.valid
+
+    def broadcast(self, result):
+        # a comparison of two constants is the same for every row
+        if isinstance(result, np.ndarray):
+            return result
+        return np.full(len(self.row_ids), bool(result))
+
+    def python_values(self, vector):
+        # the values as the row by row executor returns them
+        if not isinstance(vector.values, np.ndarray):
+            return [vector.values] * len(self.row_ids)
+        values = vector.values.tolist()
+        if vector.kind == "boolean":
+            values = [bool(value) for value in values]
+        if vector.valid is not None:
+            for position in np.flatnonzero(~vector.valid).tolist():
+                values[position] = None
+        return values
+
+    def aggregate(self, expression):
+        if type(expression) not in (exp.Count, exp.Sum, exp.Min, exp.Max, exp.Avg):
+            raise Unsupported()
+        argument = expression.this
+        if isinstance(argument, exp.Star) or (
+            isinstance(argument, exp.Column)
+            and argument.name in self.operands
+            and self.operands[argument.name] is None
+        ):
+            # COUNT(*)
+            if not isinstance(expression, exp.Count):
+                raise Unsupported()
+            return len(self.row_ids)
+        if isinstance(argument, exp.Distinct):
+            raise Unsupported()
+
+        vector = self.value(argument)
+        if vector.kind == "object" or not isinstance(vector.values, np.ndarray):
+            raise Unsupported()
+        values = vector.values
+        if vector.valid is not None:
+            values = values[vector.valid]
+        if isinstance(expression, exp.Count):
+            return len(values)
+        if not len(values):
+            return None
+        if vector.kind == "string":
+            if isinstance(expression, exp.Min):
+                return min(values.tolist())
+            if isinstance(expression, exp.Max):
+                return max(values.tolist())
+            raise Unsupported()
+        if isinstance(expression, exp.Min):
+            value = values.min().item()
+        elif isinstance(expression, exp.Max):
+            value = values.max().item()
+        elif isinstance(expression, exp.Sum):
+            # summed in Python, so that integers do not overflow and floats are added in
+            # the same order as by the row by row executor
+            return sum(values.tolist())
+        else:
+            return statistics.fmean(values.tolist())
+        return bool(value) if vector.kind == "boolean" else value
+
+
+def column_vector(table, column, row_ids):
+    buffer = table.data[column]
+    if isinstance(buffer, (array, memoryview)):
+        kind = "boolean" if column in table.booleans else "number"
+        if len(row_ids):
+            values = np.frombuffer(buffer, dtype=DTYPES[table.typecodes[column]])[
+                row_ids
+            ]
+        else:
+            values = np.zeros(0, dtype=DTYPES[table.typecodes[column]])
+        nulls = table.nulls.get(column)
+        valid = ~mask(nulls, table.size)[row_ids] if nulls else None
+        return Vector(values, valid, kind)
+
+    if isinstance(buffer, StringColumn):
+        values = np.array([buffer[row_id] for row_id in row_ids.tolist()], dtype=object)
+    else:
+        values = np.array(buffer, dtype=object)[row_ids]
+    # a degraded typed column holds Python values of any type, see ColumnarTable._degrade
+    kind = "string" if table.typecodes[column] is None else "object"
+    valid = np.not_equal(values, None)
+    if valid.all():
+        return Vector(values, None, kind)
+    values[~valid] = ""
+    return Vector(values, valid, kind)
+
+
+def mask(row_ids, size):
+    # boolean array of a table's size that is True at the given row ids
+    result = np.zeros(size, dtype=bool)
+    if row_ids:
+        result[np.fromiter(row_ids, dtype="int64", count=len(row_ids))] = True
+    return result
+
+
+def materialize(table, columns, row_ids):
+    # row tuples of the given row ids, in their order
+    evaluator = Evaluator(table, columns, row_ids, ())
+    values = [
+        evaluator.python_values(column_vector(table, column, row_ids))
+        for column in columns
+    ]
+    return list(zip(*values))
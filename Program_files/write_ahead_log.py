@@ -0,0 +1,78 @@
+import os
+import pickle
+import struct
+import zlib
+
+# length and CRC-32 of the records of a commit, written before them
+FRAME_HEADER = struct.Struct("<II")
+
+
+class WriteAheadLog:
+    """
+    Append-only log of the changes made to a file-backed database since its last checkpoint.
+
+    Every change is appended as a record before it is applied. The records of a statement
+    are committed together as a single frame with a single fsync (group commit), so a
+    statement changing many rows costs one disk flush and is replayed entirely or not at
+    all. Every frame carries a sequence number, so that replay skips the frames that the
+    last checkpoint already includes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # records appended since the last commit
+        self.pending = []
+        # sequence number of the last committed frame
+        self.sequence = 0
+        self.file = open(path, "ab")
+
+    def __len__(self):
+        # size of the log file in bytes
+        return os.fstat(self.file.fileno()).st_size
+
+    def append(self, record):
+        self.pending.append(record)
+
+    def commit(self):
+        if not self.pending:
+            return
+        self.sequence += 1
+        payload = pickle.dumps((self.sequence, self.pending), pickle.HIGHEST_PROTOCOL)
+        self.file.write(FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = []
+
+    def read(self):
+        # the committed frames as (sequence number, records), in commit order
+        with open(self.path, "rb") as file:
+            data = file.read()
+
+        frames = []
+        offset = 0
+        while offset + FRAME_HEADER.size <= len(data):
+            length, checksum = FRAME_HEADER.unpack_from(data, offset)
+            start = offset + FRAME_HEADER.size
+            payload = data[start : start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            frames.append(pickle.loads(payload))
+            offset = start + length
+
+        if offset < len(data):
+            # a frame that was being written when the process stopped was never committed
+            self.file.truncate(offset)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        if frames:
+            self.sequence = max(self.sequence, frames[-1][0])
+        return frames
+
+    def truncate(self):
+        # called once a checkpoint includes every committed frame
+        self.file.truncate(0)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()